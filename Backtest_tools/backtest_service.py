@@ -0,0 +1,298 @@
+"""
+Long-running local backtest service over HTTP.
+
+    python Backtest_tools/cli.py serve --port 8765 --workers 4 --preload Backtest_tools/config_example.toml
+
+    curl -X POST localhost:8765/jobs?wait=60 -d '{"strategy": "volatility",
+        "data": {"ticker": "ETHUSDT", "pool_address": "0x8ad5...", "start_time": "2025-01-11",
+                 "end_time": "2025-02-11", "fidelity": "hour"},
+        "pool": {"token0_decimals": 6, "token1_decimals": 18, "tick_spacing": 60},
+        "params": {"C": 5000, "ALPHA": 0.9, "INFO_TIME": 720, "INITIAL_BALANCE": 1000000}}'
+    curl localhost:8765/jobs/<job_id>
+    curl localhost:8765/status
+
+A job is a config dict of `cli.py` with one set of `params` (the pool
+token decimals are required). Observations and feature stores stay in
+memory per data section, results are cached by the canonical JSON of the
+job, and a job identical to a queued or running one is attached to it
+instead of running twice.
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Backtest_tools.registry import CliConfig, config_from_dict, configure_strategy, expand_grid, load_observations
+
+
+def data_key(config: CliConfig) -> str:
+    """
+    Cache key of the data section, dates normalized so config files and JSON jobs share it.
+    """
+    data = {key: value.isoformat() if isinstance(value, datetime) else value for key, value in config.data.items()}
+    return json.dumps(data, sort_keys=True)
+
+
+def job_key(config: CliConfig) -> str:
+    """
+    Result cache key of a job: hash of the canonical JSON of its strategy, data, pool and params.
+    """
+    canonical = json.dumps([config.strategy, data_key(config), config.pool, config.params], sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+@dataclass
+class Job:
+    """
+    A backtest job of the service.
+
+    Attributes:
+        job_id (str): The job id.
+        key (str): The result cache key (`job_key`).
+        request (Dict[str, Any]): The job config (strategy, data, pool, params).
+        status (str): queued, running, done or failed.
+        result (Optional[Dict[str, float]]): The metrics of a done job.
+        error (Optional[str]): The error of a failed job.
+        cached (bool): Whether the result came from the result cache.
+        submitted_at (float): Submission time, seconds since the epoch.
+        finished_at (Optional[float]): Completion time, seconds since the epoch.
+    """
+    job_id: str
+    key: str
+    request: Dict[str, Any]
+    status: str = 'queued'
+    result: Optional[Dict[str, float]] = None
+    error: Optional[str] = None
+    cached: bool = False
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.job_id, 'status': self.status, 'result': self.result, 'error': self.error,
+            'cached': self.cached, 'submitted_at': self.submitted_at, 'finished_at': self.finished_at,
+        }
+
+
+class ServiceBusy(Exception):
+    """
+    Raised when the job queue of the service is full.
+    """
+
+
+class BacktestService:
+    """
+    Runs backtest jobs on a thread pool over observations kept warm in memory.
+
+    Observations are loaded once per distinct data section (`loader`, the
+    CLI loader by default) together with their FeatureStore, so windowed
+    strategies read precomputed features. At most `max_workers` jobs run
+    at once and at most `max_pending` wait; results are kept in an LRU
+    cache of `max_results` entries keyed by `job_key`.
+    """
+    def __init__(self, max_workers: int = 4, max_pending: int = 256, max_results: int = 10_000,
+                 loader: Callable[[CliConfig], List] = load_observations):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='backtest')
+        self.max_pending: int = max_pending
+        self.max_results: int = max_results
+        self._loader: Callable[[CliConfig], List] = loader
+        self._lock = threading.Lock()
+        self._data_locks: Dict[str, threading.Lock] = {}
+        self._observations: Dict[str, List] = {}
+        self._feature_stores: Dict[str, Any] = {}
+        self._results: 'OrderedDict[str, Dict[str, float]]' = OrderedDict()
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._active: Dict[str, Job] = {}
+
+    def observations(self, config: CliConfig):
+        """
+        Observations and FeatureStore of a data section, loaded on first use.
+        """
+        key = data_key(config)
+        with self._lock:
+            data_lock = self._data_locks.setdefault(key, threading.Lock())
+        # other data sections keep loading and serving meanwhile
+        with data_lock:
+            if key not in self._observations:
+                from Backtest_tools.feature_store import FeatureStore
+                observations = self._loader(config)
+                self._feature_stores[key] = FeatureStore(observations)
+                self._observations[key] = observations
+        return self._observations[key], self._feature_stores[key]
+
+    def preload(self, config: CliConfig) -> int:
+        """
+        Warm the caches with the data of a config and the features of its grid.
+        """
+        observations, feature_store = self.observations(config)
+        if config.grid:
+            feature_store.precompute(expand_grid(config.grid))
+        return len(observations)
+
+    def submit(self, request: Dict[str, Any]) -> Job:
+        """
+        Queue a job, or answer it from the result cache or attach it to an identical active job.
+
+        Raises:
+            ServiceBusy: if `max_pending` jobs are already waiting
+            ValueError: if the job config is invalid
+        """
+        key = job_key(config_from_dict(request))
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                job = Job(uuid.uuid4().hex, key, request, status='done', result=self._results[key], cached=True,
+                          finished_at=time.time())
+                job.done.set()
+                self._track(job)
+                return job
+            if key in self._active:
+                return self._active[key]
+            if sum(job.status == 'queued' for job in self._active.values()) >= self.max_pending:
+                raise ServiceBusy(f"{self.max_pending} jobs are already waiting")
+            job = Job(uuid.uuid4().hex, key, request)
+            self._track(job)
+            self._active[key] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def _track(self, job: Job) -> None:
+        # finished jobs are forgotten oldest first, as the results
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.max_results and next(iter(self._jobs.values())).done.is_set():
+            self._jobs.popitem(last=False)
+
+    def job(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _run(self, job: Job) -> None:
+        job.status = 'running'
+        try:
+            job.result = self.backtest(job.request)
+            job.status = 'done'
+        except Exception as e:
+            job.error, job.status = repr(e), 'failed'
+        job.finished_at = time.time()
+        with self._lock:
+            if job.status == 'done':
+                self._results[job.key] = job.result
+                while len(self._results) > self.max_results:
+                    self._results.popitem(last=False)
+            self._active.pop(job.key, None)
+        job.done.set()
+
+    def backtest(self, request: Dict[str, Any]) -> Dict[str, float]:
+        """
+        Run one job over the warm observations and return its metrics.
+        """
+        from Backtest_tools.metrics import balance_metrics
+        from Backtest_tools.multi_runner import MultiStrategyRunner
+        config = config_from_dict(request)
+        observations, feature_store = self.observations(config)
+        # pool settings go to the instance, jobs of other pools run side by side
+        strategy_type, params_type, kwargs = configure_strategy(config)
+        if hasattr(strategy_type, 'feature_store'):
+            kwargs['feature_store'] = feature_store
+        strategy = strategy_type(params=params_type(**config.params), **kwargs)
+        start = time.perf_counter()
+        balances = np.empty(len(observations))
+        rebalances = 0
+        for t, observation in enumerate(observations):
+            balances[t], rebalanced = MultiStrategyRunner._step(strategy, observation)
+            rebalances += rebalanced
+        metrics = balance_metrics(feature_store.arrays.timestamps, balances)
+        return {
+            'final_balance': float(balances[-1]),
+            'rebalances': rebalances,
+            **{name: float(value[0]) for name, value in metrics.items()},
+            'elapsed_s': time.perf_counter() - start,
+        }
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            active = list(self._active.values())
+            return {
+                'queued': sum(job.status == 'queued' for job in active),
+                'running': sum(job.status == 'running' for job in active),
+                'jobs': len(self._jobs),
+                'cached_results': len(self._results),
+                'data_sections': len(self._observations),
+                'observations': sum(len(observations) for observations in self._observations.values()),
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service: BacktestService = None
+
+    def _reply(self, status: HTTPStatus, body: Dict[str, Any]) -> None:
+        payload = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _wait(self, job: Job, query: Dict[str, List[str]]) -> None:
+        if 'wait' in query:
+            job.done.wait(float(query['wait'][0]))
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        if parts == ['status']:
+            self._reply(HTTPStatus.OK, self.service.status())
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self.service.job(parts[1])
+            if job is None:
+                self._reply(HTTPStatus.NOT_FOUND, {'error': f'unknown job {parts[1]}'})
+                return
+            self._wait(job, parse_qs(url.query))
+            self._reply(HTTPStatus.OK, job.to_dict())
+        else:
+            self._reply(HTTPStatus.NOT_FOUND, {'error': f'unknown path {url.path}'})
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/jobs':
+            self._reply(HTTPStatus.NOT_FOUND, {'error': f'unknown path {url.path}'})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            job = self.service.submit(request)
+        except ServiceBusy as e:
+            self._reply(HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)})
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(HTTPStatus.BAD_REQUEST, {'error': repr(e)})
+            return
+        self._wait(job, parse_qs(url.query))
+        self._reply(HTTPStatus.OK if job.done.is_set() else HTTPStatus.ACCEPTED, job.to_dict())
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def make_server(service: BacktestService, host: str = '127.0.0.1', port: int = 8765) -> ThreadingHTTPServer:
+    """
+    HTTP server of the service: POST /jobs[?wait=seconds], GET /jobs/<job_id>[?wait=seconds], GET /status.
+    """
+    handler = type('BacktestHandler', (_Handler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
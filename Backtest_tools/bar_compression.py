@@ -0,0 +1,129 @@
+from typing import List, Optional
+
+import numpy as np
+
+from fractal.core.base import Observation
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Modified_entity.compact_states import CompactBarState
+from Modified_entity.tick_math import get_sqrt_price_table, pool_sqrt_price, pool_tick
+from Backtest_tools.observations import ObservationArrays
+
+
+def tick_levels(price: np.ndarray, tick_spacing: int, token0_decimals: int, token1_decimals: int) -> np.ndarray:
+    """
+    Entity prices of the usable on-chain ticks around the prices, computed as the
+    bounds of tick-aligned positions (`UniswapV3LPEntity.tick_sqrt_prices`).
+    """
+    ticks = pool_tick(price, token0_decimals, token1_decimals)
+    first = (int(ticks.min()) // tick_spacing - 1) * tick_spacing
+    last = (int(ticks.max()) // tick_spacing + 2) * tick_spacing
+    sqrt_ratio = get_sqrt_price_table(tick_spacing).sqrt_price_at(np.arange(first, last + 1, tick_spacing))
+    return pool_sqrt_price(sqrt_ratio, token0_decimals, token1_decimals)**2
+
+
+def exit_keys(price: np.ndarray, tick_spacing: Optional[int] = None, price_levels: Optional[np.ndarray] = None,
+              token0_decimals: Optional[int] = None, token1_decimals: Optional[int] = None) -> np.ndarray:
+    """
+    Key of the position of each price relative to the range bound levels.
+
+    Two prices with the same key compare the same (`<`, `<=`, `>`, `>=`) with
+    every level, so no range check against those levels can tell them apart.
+    The levels are either the usable on-chain ticks of `tick_spacing` for the
+    token decimals (bounds of strategies with `align_ticks`) or explicit `price_levels`.
+
+    Returns:
+        np.ndarray: int64 keys, 2 * interval + 1 for prices lying exactly on a level
+    """
+    if price_levels is None:
+        if tick_spacing is None or token0_decimals is None or token1_decimals is None:
+            raise ValueError("Either tick_spacing with the token decimals or price_levels must be given.")
+        price_levels = tick_levels(price, tick_spacing, token0_decimals, token1_decimals)
+    levels = np.sort(np.asarray(price_levels, dtype=np.float64))
+    at_or_below = np.searchsorted(levels, price, side='right')
+    below = np.searchsorted(levels, price, side='left')
+    return 2 * below + (at_or_below != below)
+
+
+def compress_observations(observations: List[Observation], tick_spacing: Optional[int] = None,
+                          price_levels: Optional[np.ndarray] = None, max_bar: Optional[int] = None,
+                          keep_first: int = 2, exact_fees: bool = True, token0_decimals: Optional[int] = None,
+                          token1_decimals: Optional[int] = None, entity_name: str = 'UNISWAP_V3') -> List[Observation]:
+    """
+    Merge consecutive observations that no range check can tell apart into bars.
+
+    A run of observations with the same `exit_keys` is emitted as its first
+    observation alone, where a range exit (and the rebalance at that price)
+    can happen, followed by one bar merging the rest of the run: fees and
+    volume are summed, the close price, liquidity and tvl are kept and the
+    open and min/max prices recorded. No merged observation changes the in-range or
+    exit status, so a window-free strategy whose bounds lie on the levels (the
+    tick-aligned classic strategy with the same `tick_spacing` and token
+    decimals) rebalances at the same observations and prices. This does not
+    hold for strategies with a window counted in observations (INFO_TIME of
+    the distributed, volatility and merged strategies): the window counts
+    bars instead, so their ranges and results differ from the uncompressed run.
+
+    Fees of a bar are accrued once, as `fees * delta / (liquidity + delta)`
+    with the summed fees and the close liquidity. With `exact_fees` bars
+    also break where the pool liquidity changes, so this is the sum of the
+    per-step accruals and the results match the uncompressed run (up to
+    float rounding). Without it bars merge across liquidity changes and the
+    fees are an approximation (lossy), for fewer steps.
+
+    Args:
+        observations (List[Observation]): single-entity observations
+        tick_spacing (Optional[int]): tick spacing of the strategy bounds
+        price_levels (Optional[np.ndarray]): explicit bound levels instead of the tick grid
+        max_bar (Optional[int]): maximum number of observations in a bar
+        keep_first (int): leading observations kept as they are (deposit and first open)
+        exact_fees (bool): break bars where the pool liquidity changes, for exact fee accrual
+        token0_decimals (Optional[int]): token0 decimals, mapping the prices to on-chain ticks
+        token1_decimals (Optional[int]): token1 decimals, mapping the prices to on-chain ticks
+        entity_name (str): name of the pool entity
+
+    Returns:
+        List[Observation]: observations with `CompactBarState` states
+    """
+    if observations and len(observations[0].states) != 1:
+        raise ValueError("Only single-entity observations can be compressed.")
+    arrays = ObservationArrays.from_observations(observations, entity_name)
+    n = len(arrays)
+    if n == 0:
+        return []
+    keys = exit_keys(arrays.price, tick_spacing, price_levels, token0_decimals, token1_decimals)
+
+    run_start = np.ones(n, dtype=bool)
+    run_start[1:] = keys[1:] != keys[:-1]
+    run_start[:keep_first] = True
+    # the second observation of each run opens the merged bar
+    starts = run_start.copy()
+    starts[1:] |= run_start[:-1]
+    if exact_fees:
+        starts[1:] |= arrays.liquidity[1:] != arrays.liquidity[:-1]
+    if max_bar is not None:
+        bar_ids = np.cumsum(starts) - 1
+        first = np.flatnonzero(starts)
+        starts |= (np.arange(n) - first[bar_ids]) % max_bar == 0
+    first = np.flatnonzero(starts)
+    last = np.append(first[1:], n) - 1
+
+    fees = np.add.reduceat(arrays.fees, first)
+    volume = np.add.reduceat(arrays.volume, first)
+    price_min = np.minimum.reduceat(arrays.price, first)
+    price_max = np.maximum.reduceat(arrays.price, first)
+    counts = last - first + 1
+    return [
+        Observation(
+            timestamp=observations[end].timestamp,
+            states={entity_name: CompactBarState(
+                tvl=tvl, volume=bar_volume, fees=bar_fees, liquidity=liquidity, price=price,
+                price_min=low, price_max=high, count=count, price_open=open_)}
+        ) for end, tvl, bar_volume, bar_fees, liquidity, price, low, high, count, open_ in zip(
+            last.tolist(), arrays.tvl[last].tolist(), volume.tolist(), fees.tolist(),
+            arrays.liquidity[last].tolist(), arrays.price[last].tolist(),
+            price_min.tolist(), price_max.tolist(), counts.tolist(), arrays.price[first].tolist())
+    ]
+
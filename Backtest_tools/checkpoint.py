@@ -0,0 +1,158 @@
+import os
+import pickle
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from fractal.core.base import BaseStrategy, Observation
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Backtest_tools.metrics import balance_metrics
+from Backtest_tools.multi_runner import MultiStrategyRunner
+
+
+CHECKPOINT_VERSION = 3
+# references to shared or process-bound objects, kept from the instance a checkpoint is restored into
+TRANSIENT_ATTRIBUTES = ('feature_store', 'observations_storage', '_logger', 'debug')
+
+
+def _timestamps_ns(observations: List[Observation]) -> np.ndarray:
+    timestamps = pd.DatetimeIndex([observation.timestamp for observation in observations]).as_unit('ns')
+    if timestamps.tz is not None:
+        timestamps = timestamps.tz_convert(None)
+    return timestamps.asi8
+
+
+def _params_dict(params) -> Dict[str, Any]:
+    return dict(params) if isinstance(params, dict) else dict(vars(params))
+
+
+@dataclass
+class Checkpoint:
+    """
+    Full state of a strategy run after its first `len(self)` observations.
+
+    Attributes:
+        strategy (str): The class name of the strategy.
+        params (Dict[str, Any]): The strategy parameters.
+        state (Dict[str, Any]): The strategy instance attributes: entities (positions, cash,
+            history ring buffers), windows, counters and tau, without TRANSIENT_ATTRIBUTES.
+        timestamps (np.ndarray): The simulated observation timestamps, int64 nanoseconds (UTC).
+        balances (np.ndarray): The net balance after each simulated observation.
+        rebalanced (np.ndarray): Whether the strategy rebalanced on each simulated observation.
+        version (int): The checkpoint format version.
+    """
+    strategy: str
+    params: Dict[str, Any]
+    state: Dict[str, Any]
+    timestamps: np.ndarray
+    balances: np.ndarray
+    rebalanced: np.ndarray
+    version: int = CHECKPOINT_VERSION
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def capture(cls, strategy: BaseStrategy, timestamps: np.ndarray, balances: np.ndarray,
+                rebalanced: np.ndarray) -> 'Checkpoint':
+        state = {name: value for name, value in vars(strategy).items() if name not in TRANSIENT_ATTRIBUTES}
+        return cls(type(strategy).__name__, _params_dict(strategy._params), state,
+                   np.asarray(timestamps, dtype=np.int64), np.asarray(balances, dtype=np.float64),
+                   np.asarray(rebalanced, dtype=bool))
+
+    def restore(self, strategy: BaseStrategy) -> BaseStrategy:
+        """
+        Load the checkpointed state into a fresh instance of the same strategy and parameters.
+        """
+        if type(strategy).__name__ != self.strategy or _params_dict(strategy._params) != self.params:
+            raise ValueError(f"Checkpoint of {self.strategy}{self.params} does not match "
+                             f"{type(strategy).__name__}{_params_dict(strategy._params)}")
+        # a copy, the checkpoint can be restored again
+        vars(strategy).update(pickle.loads(pickle.dumps(self.state, protocol=pickle.HIGHEST_PROTOCOL)))
+        return strategy
+
+    def save(self, path: str) -> None:
+        # write then rename, a crash never leaves a half-written checkpoint
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'Checkpoint':
+        with open(path, 'rb') as f:
+            checkpoint = pickle.load(f)
+        if checkpoint.version != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {checkpoint.version} in {path}")
+        return checkpoint
+
+
+class IncrementalRunner:
+    """
+    Runs a strategy over observations that only grow at the end, resuming from a checkpoint file.
+
+    The first run simulates all the observations; later runs with appended
+    observations restore the strategy from the checkpoint and simulate only
+    the observations after its last timestamp. With `every` the checkpoint
+    is also written during the run, so a crashed (minute-fidelity) run
+    resumes from its last checkpoint. Results are those of one full run
+    as long as the already simulated observations do not change.
+    """
+    def __init__(self, strategy_factory: Callable[[], BaseStrategy], path: str, every: Optional[int] = None):
+        self.strategy_factory: Callable[[], BaseStrategy] = strategy_factory
+        self.path: str = path
+        self.every: Optional[int] = every
+        self.strategy: Optional[BaseStrategy] = None
+        self.resumed_from: int = 0
+
+    def _resume(self, timestamps: np.ndarray) -> Optional[Checkpoint]:
+        self.strategy = self.strategy_factory()
+        if not os.path.exists(self.path):
+            return None
+        checkpoint = Checkpoint.load(self.path)
+        n = len(checkpoint)
+        if n > len(timestamps) or not np.array_equal(timestamps[:n], checkpoint.timestamps):
+            raise ValueError(f"Observations do not extend the checkpointed run of {n} observations ({self.path})")
+        checkpoint.restore(self.strategy)
+        return checkpoint
+
+    def run(self, observations: List[Observation]) -> pd.DataFrame:
+        """
+        Simulate the observations after the checkpoint and save the new checkpoint.
+
+        Returns:
+            pd.DataFrame: net balance and rebalance flag of every observation, the checkpointed ones included
+        """
+        timestamps = _timestamps_ns(observations)
+        balances = np.zeros(len(observations))
+        rebalanced = np.zeros(len(observations), dtype=bool)
+        checkpoint = self._resume(timestamps)
+        self.resumed_from = start = 0 if checkpoint is None else len(checkpoint)
+        if checkpoint is not None:
+            balances[:start], rebalanced[:start] = checkpoint.balances, checkpoint.rebalanced
+        for t in range(start, len(observations)):
+            balances[t], rebalanced[t] = MultiStrategyRunner._step(self.strategy, observations[t])
+            if self.every and (t + 1 - start) % self.every == 0:
+                Checkpoint.capture(self.strategy, timestamps[:t + 1], balances[:t + 1], rebalanced[:t + 1]).save(self.path)
+        if start < len(observations):
+            Checkpoint.capture(self.strategy, timestamps, balances, rebalanced).save(self.path)
+        index = pd.DatetimeIndex(timestamps.astype('datetime64[ns]')).tz_localize('UTC')
+        return pd.DataFrame({'balance': balances, 'rebalanced': rebalanced}, index=index)
+
+    @staticmethod
+    def metrics(history: pd.DataFrame) -> Dict[str, float]:
+        """
+        Default metrics and rebalance count of a `run` result.
+        """
+        timestamps = history.index.tz_convert(None).to_numpy()
+        metrics = balance_metrics(timestamps, history['balance'].to_numpy())
+        return {
+            'final_balance': float(history['balance'].iloc[-1]),
+            'rebalances': int(history['rebalanced'].sum()),
+            **{name: float(value[0]) for name, value in metrics.items()},
+        }
@@ -0,0 +1,518 @@
+"""
+Single entry point for running, sweeping and benchmarking the tau strategies.
+
+    python Backtest_tools/cli.py run config.toml
+    python Backtest_tools/cli.py run config.toml --checkpoint run.ckpt   # only simulates data added since
+    python Backtest_tools/cli.py run config.toml --journal run.npz
+    python Backtest_tools/cli.py reprice config.toml --journal run.npz --trading-fee 0.001 0.003 --fees-rate 0.0005 0.003
+    python Backtest_tools/cli.py sweep config.toml --output sweep.csv
+    python Backtest_tools/cli.py bench config.toml --repeat 5
+    python Backtest_tools/cli.py walk-forward config.toml --output walk_forward.csv
+
+    python Backtest_tools/cli.py submit config.toml --queue /shared/sweep.db --sweep-id merged-2024
+    python Backtest_tools/cli.py work --queue /shared/sweep.db     # on every worker machine
+    python Backtest_tools/cli.py collect --queue /shared/sweep.db --sweep-id merged-2024 --output sweep.csv
+
+    python Backtest_tools/cli.py serve --port 8765 --workers 4 --preload config.toml
+
+    python Backtest_tools/cli.py sweep config.toml --results-db results.db
+    python Backtest_tools/cli.py results results.db top --metric sharpe -k 20 --where BINS=3
+    python Backtest_tools/cli.py results results.db marginals --param INFO_TIME --metric sharpe
+    python Backtest_tools/cli.py results results.db heatmap --x C --y INFO_TIME --metric sharpe
+
+The strategy, data, pool and parameters come from a TOML or JSON config
+(see config_example.toml). Only the standard library is imported at start-up:
+fractal/pandas are imported by the commands that run a backtest and mlflow
+only by a sweep logged to an mlflow server.
+"""
+import argparse
+import itertools
+import json
+import sys
+import time
+from dataclasses import replace
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.append(str(Path(__file__).parent.parent))
+from Backtest_tools.registry import (CliConfig, config_from_dict, configure_strategy, expand_grid, load_config,
+                                     load_observations, with_defaults)
+
+
+def run_command(config: CliConfig, observations, output: Optional[str] = None, debug: bool = False,
+                checkpoint: Optional[str] = None, checkpoint_every: Optional[int] = None,
+                journal: Optional[str] = None):
+    """
+    Run one strategy with `config.params` and print its metrics.
+
+    With `checkpoint` the run resumes from the checkpoint file and simulates
+    only the observations appended since it was written (IncrementalRunner),
+    the output is then the balance history. With `journal` the actions of
+    the run are saved to that file for `reprice`.
+    """
+    strategy_type, params_type, kwargs = configure_strategy(config)
+    if checkpoint is not None:
+        from Backtest_tools.checkpoint import IncrementalRunner
+        runner = IncrementalRunner(lambda: strategy_type(debug=debug, params=params_type(**config.params), **kwargs),
+                                   checkpoint, checkpoint_every)
+        history = runner.run(observations)
+        print(f"resumed after {runner.resumed_from} observations, simulated {len(history) - runner.resumed_from}")
+        print(IncrementalRunner.metrics(history))
+        if output is not None:
+            history.to_csv(output)
+        return history
+    strategy = strategy_type(debug=debug, params=params_type(**config.params), **kwargs)
+    if journal is not None:
+        from Modified_entity.action_journal import ActionJournal
+        ActionJournal.attach(strategy.get_entity('UNISWAP_V3'))
+    result = strategy.run(observations)
+    print(result.get_default_metrics())
+    if output is not None:
+        result.to_dataframe().to_csv(output)
+    if journal is not None:
+        strategy.get_entity('UNISWAP_V3').journal.save(journal)
+    return result
+
+
+def reprice_command(observations, journal: str, trading_fees: List[float], fees_rates: List[Optional[float]],
+                    fee_models: List[str], output: Optional[str] = None):
+    """
+    Reprice a recorded run (`run --journal`) under every combination of the cost settings and print the report.
+    """
+    from Backtest_tools.repricing import CostSettings, RepricingEngine
+    from Modified_entity.action_journal import ActionJournal
+    engine = RepricingEngine.from_observations(ActionJournal.load(journal), observations)
+    settings = [CostSettings(trading_fee, fees_rate, fee_model) for trading_fee, fees_rate, fee_model
+                in itertools.product(trading_fees, fees_rates, fee_models)]
+    start = time.perf_counter()
+    report = engine.report(settings)
+    print(f"repriced {len(settings)} settings in {time.perf_counter() - start:.2f}s")
+    print(report.to_string())
+    if output is not None:
+        report.to_csv(output, index=False)
+    return report
+
+
+def stop_rules(config: CliConfig):
+    """
+    Early-stopping rules of the `sweep.stop` section, None without it.
+    """
+    if not config.sweep.get('stop'):
+        return None
+    from Backtest_tools.early_stopping import StopRules
+    return StopRules.from_dict(config.sweep['stop'])
+
+
+def grid_report(config: CliConfig, strategy_type, grid: List[Dict[str, Any]], observations, feature_store=None):
+    """
+    Comparative report of the grid points: SweepPlanner with `sweep.planner`, a thread
+    pool with `sweep.threads`, otherwise one lockstep MultiStrategyRunner pass.
+    The stepping runners prune grid points by the `sweep.stop` rules; the planner
+    replays whole schedules and ignores them.
+    """
+    if config.sweep.get('planner'):
+        from Backtest_tools.sweep_planner import SweepPlanner
+        return SweepPlanner(config.strategy, observations, config.pool, feature_store).run(grid)
+    from Backtest_tools.multi_runner import MultiStrategyRunner, StrategySpec, ThreadedStrategyRunner
+    specs = [StrategySpec(json.dumps(params, sort_keys=True), strategy_type, params) for params in grid]
+    _, _, kwargs = configure_strategy(config)
+    if config.sweep.get('threads'):
+        runner = ThreadedStrategyRunner(specs, max_workers=config.sweep['threads'], stop_rules=stop_rules(config),
+                                        feature_store=feature_store, **kwargs)
+    else:
+        runner = MultiStrategyRunner(specs, stop_rules=stop_rules(config), feature_store=feature_store, **kwargs)
+    return runner.run(observations)
+
+
+def screen_grid(config: CliConfig, strategy_type, grid: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Keep the `sweep.screen.top` best grid points by `sweep.screen.metric` on the
+    coarser `sweep.screen.fidelity` bars (served by the `data.pyramid` cache).
+    INFO_TIME counts bars, so the screen is coarse for the windowed strategies.
+    """
+    screen = config.sweep['screen']
+    coarse = load_observations(replace(config, data={**config.data, 'fidelity': screen['fidelity']}))
+    report = grid_report(config, strategy_type, grid, coarse).drop(index='MARKET')
+    best = set(report[screen.get('metric', 'sharpe')].astype(float).nlargest(screen.get('top', 10)).index)
+    print(f"screened {len(grid)} grid points on {screen['fidelity']} bars, keeping {len(best)}")
+    return [params for params in grid if json.dumps(params, sort_keys=True) in best]
+
+
+def sweep_command(config: CliConfig, observations, output: Optional[str] = None,
+                  results_db: Optional[str] = None, sweep_id: str = 'sweep'):
+    """
+    Run the strategy for every point of `config.grid`.
+
+    With `sweep.mlflow_uri` the grid goes through fractal's DefaultPipeline and
+    is logged to mlflow, otherwise all the grid points are stepped in one pass
+    by MultiStrategyRunner (or replayed from shared rebalance schedules by the
+    SweepPlanner with `sweep.planner`) and the comparative report is printed
+    (and saved, and recorded in the `results_db` ResultsDB under `sweep_id`).
+    With `sweep.screen` only the best points of a coarse-bar run are swept.
+    With `sweep.stop` runs are aborted early by the stop rules and reported as pruned.
+    Grid points the strategy declares equivalent are run once and reported
+    for every member, unless `sweep.canonical` is false.
+    """
+    from Backtest_tools.grid_canonical import EquivalenceClass, canonicalize, fan_out, params_label
+    strategy_type, _, kwargs = configure_strategy(config)
+    grid = expand_grid(config.grid)
+    if config.sweep.get('canonical', True):
+        classes = canonicalize(strategy_type, grid, len(observations))
+        print(f"{len(grid)} grid points in {len(classes)} equivalence classes")
+    else:
+        classes = [EquivalenceClass(params, [params], ()) for params in grid]
+    runs = [equivalence.params for equivalence in classes]
+    if config.sweep.get('screen'):
+        runs = screen_grid(config, strategy_type, runs)
+        kept = {params_label(params) for params in runs}
+        classes = [equivalence for equivalence in classes if params_label(equivalence.params) in kept]
+        grid = [params for equivalence in classes for params in equivalence.members]
+    feature_store = None
+    if hasattr(strategy_type, 'feature_store'):
+        from Backtest_tools.feature_store import FeatureStore
+        feature_store = FeatureStore(observations)
+        feature_store.precompute(runs)
+        kwargs['feature_store'] = feature_store
+
+    if config.monte_carlo:
+        monte_carlo_command(config, observations, grid, output)
+
+    if config.sweep.get('mlflow_uri'):
+        from fractal.core.pipeline import DefaultPipeline, MLFlowConfig, ExperimentConfig
+        from Backtest_tools.early_stopping import BestCurve, run_pipeline, with_early_stopping
+        rules = stop_rules(config)
+        strategy_type = with_defaults(strategy_type, **kwargs)
+        if rules is not None:
+            strategy_type = with_early_stopping(strategy_type, rules, BestCurve(), observations)
+        pipeline = DefaultPipeline(
+            experiment_config=ExperimentConfig(
+                strategy_type=strategy_type,
+                backtest_observations=observations,
+                window_size=config.sweep.get('window_size', 24),
+                params_grid=runs,
+                debug=True,
+            ),
+            mlflow_config=MLFlowConfig(
+                mlflow_uri=config.sweep['mlflow_uri'],
+                experiment_name=config.sweep.get('experiment_name', f'{config.strategy}_tau_exp'),
+            ),
+        )
+        equivalents = {params_label(equivalence.params): equivalence.members[1:] for equivalence in classes}
+        pruned = run_pipeline(pipeline, runs, equivalents)
+        print(f"{len(runs) - len(pruned)} runs finished, {len(pruned)} pruned")
+        return None
+
+    report = grid_report(config, strategy_type, runs, observations, feature_store)
+    report = fan_out(report, classes, grid)
+    print(report.sort_values('final_balance', ascending=False))
+    if output is not None:
+        report.to_csv(output)
+    if results_db is not None:
+        from Backtest_tools.results_db import ResultsDB, runs_from_report
+        ResultsDB(results_db).record_many(sweep_id, config.strategy, runs_from_report(report, grid))
+    return report
+
+
+def monte_carlo_command(config: CliConfig, observations, grid: List[Dict[str, Any]], output: Optional[str] = None):
+    """
+    Metric quantiles of every grid point over bootstrapped (or GBM) paths of the observations.
+    """
+    from Backtest_tools.monte_carlo import MonteCarloEngine, block_bootstrap_paths, gbm_paths
+    from Backtest_tools.observations import ObservationArrays
+    options = dict(config.monte_carlo)
+    generate = gbm_paths if options.pop('model', 'bootstrap') == 'gbm' else block_bootstrap_paths
+    paths = generate(ObservationArrays.from_observations(observations), **options)
+    engine = MonteCarloEngine(paths, config.pool['token0_decimals'], config.pool['token1_decimals'],
+                              config.pool.get('tick_spacing', 60), align_ticks=config.pool.get('align_ticks', False))
+    report = engine.evaluate(config.strategy, grid)
+    print(report)
+    if output is not None:
+        report.to_csv(Path(output).with_suffix('.monte_carlo.csv'), index=False)
+    return report
+
+
+def walk_forward_command(config: CliConfig, observations, output: Optional[str] = None):
+    """
+    Walk-forward optimization of `config.grid`, prints the folds and the out-of-sample metrics.
+    """
+    from Backtest_tools.walk_forward import WalkForwardOptimizer, make_folds
+    configure_strategy(config)
+    options = config.walk_forward
+    folds = make_folds(len(observations), options['train_size'], options['test_size'],
+                       options.get('step'), options.get('anchored', False))
+    optimizer = WalkForwardOptimizer(config.strategy, config.pool, config.grid, options.get('metric', 'sharpe'),
+                                     options.get('warmup', 0), options.get('max_workers'))
+    result = optimizer.run(observations, folds)
+    print(result.folds)
+    print(result.metrics)
+    if output is not None:
+        result.folds.to_csv(output, index=False)
+        result.equity.to_csv(Path(output).with_suffix('.equity.csv'))
+    return result
+
+
+def task_payloads(config: CliConfig) -> List[Dict[str, Any]]:
+    """
+    One self-contained work queue payload per grid point, workers need no config file.
+    """
+    data = {key: value.isoformat() if isinstance(value, datetime) else value for key, value in config.data.items()}
+    stop = {'stop': config.sweep['stop']} if config.sweep.get('stop') else {}
+    return [{'strategy': config.strategy, 'data': data, 'pool': config.pool, 'params': params, **stop}
+            for params in expand_grid(config.grid)]
+
+
+class TaskRunner:
+    """
+    Work queue handler: runs the backtest of a payload over the full observations.
+
+    Observations are loaded once per distinct data section and kept for the
+    next tasks of the worker. Payloads with `stop` rules are pruned early
+    (dominance against the best run of this worker) and reported with
+    pruned = 1 and the balance and observation where they stopped.
+    """
+    def __init__(self):
+        self._observations: Dict[str, List] = {}
+        self._best_curves: Dict[str, Any] = {}
+
+    def __call__(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        config = config_from_dict(payload)
+        key = json.dumps(payload['data'], sort_keys=True)
+        if key not in self._observations:
+            self._observations[key] = load_observations(config)
+        observations = self._observations[key]
+        strategy_type, params_type, kwargs = configure_strategy(config)
+        if payload.get('stop'):
+            from Backtest_tools.early_stopping import BestCurve, RunPruned, StopRules, with_early_stopping
+            best = self._best_curves.setdefault(key, BestCurve())
+            strategy_type = with_early_stopping(strategy_type, StopRules.from_dict(payload['stop']), best)
+        strategy = strategy_type(params=params_type(**config.params), **kwargs)
+        start = time.perf_counter()
+        if payload.get('stop'):
+            try:
+                result = strategy.run(observations)
+            except RunPruned as pruned:
+                return {'final_balance': pruned.balance, 'pruned': 1.0, 'stopped_at': float(pruned.t),
+                        'elapsed_s': time.perf_counter() - start}
+        else:
+            result = strategy.run(observations)
+        metrics = result.get_default_metrics()
+        return {
+            'final_balance': float(sum(result.balances[-1].values())),
+            **{name: float(value) for name, value in metrics.__dict__.items()},
+            **({'pruned': 0.0} if payload.get('stop') else {}),
+            'elapsed_s': time.perf_counter() - start,
+        }
+
+
+def bench_command(config: CliConfig, observations, repeat: int = 3) -> Dict[str, float]:
+    """
+    Time `repeat` runs of the strategy with `config.params`.
+    """
+    strategy_type, params_type, kwargs = configure_strategy(config)
+    timings = []
+    for _ in range(repeat):
+        strategy = strategy_type(params=params_type(**config.params), **kwargs)
+        start = time.perf_counter()
+        strategy.run(observations)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    stats = {
+        'observations': len(observations),
+        'best_s': best,
+        'mean_s': sum(timings) / len(timings),
+        'steps_per_s': len(observations) / best,
+    }
+    print(' '.join(f"{name}={value:.4g}" for name, value in stats.items()))
+    return stats
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Run, sweep and benchmark the tau-reset strategies.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run one strategy with the config params')
+    run.add_argument('config', help='TOML or JSON config file')
+    run.add_argument('--output', help='CSV file for the strategy states')
+    run.add_argument('--debug', action='store_true')
+    run.add_argument('--checkpoint', help='checkpoint file to resume from and update')
+    run.add_argument('--checkpoint-every', type=int, help='also checkpoint every N simulated observations')
+    run.add_argument('--journal', help='file to save the action journal of the run to, for reprice')
+
+    reprice = commands.add_parser('reprice', help='replay a recorded run under other trading and pool fees')
+    reprice.add_argument('config', help='TOML or JSON config file of the recorded run')
+    reprice.add_argument('--journal', required=True, help='action journal saved by run --journal')
+    reprice.add_argument('--trading-fee', type=float, nargs='+', default=[0.003])
+    reprice.add_argument('--fees-rate', type=float, nargs='+', default=[None],
+                         help='pool fee rates, the pool fees are scaled by their ratio to the recorded one')
+    reprice.add_argument('--fee-model', nargs='+', default=['share'], choices=['share', 'first_order'])
+    reprice.add_argument('--output', help='CSV file for the report')
+
+    sweep = commands.add_parser('sweep', help='run the strategy over the config grid')
+    sweep.add_argument('config', help='TOML or JSON config file')
+    sweep.add_argument('--output', help='CSV file for the sweep report')
+    sweep.add_argument('--results-db', help='ResultsDB file to record the runs in')
+    sweep.add_argument('--sweep-id', help='sweep name in the results db, the config file name by default')
+
+    bench = commands.add_parser('bench', help='time the strategy with the config params')
+    bench.add_argument('config', help='TOML or JSON config file')
+    bench.add_argument('--repeat', type=int, default=3)
+
+    walk_forward = commands.add_parser('walk-forward', help='walk-forward optimization of the config grid')
+    walk_forward.add_argument('config', help='TOML or JSON config file')
+    walk_forward.add_argument('--output', help='CSV file for the folds, the equity curve goes next to it')
+
+    submit = commands.add_parser('submit', help='write the config grid into a shared work queue')
+    submit.add_argument('config', help='TOML or JSON config file')
+    submit.add_argument('--queue', required=True, help='SQLite queue file on shared storage')
+    submit.add_argument('--sweep-id', help='sweep name, the config file name by default')
+
+    work = commands.add_parser('work', help='lease and run tasks of a shared work queue')
+    work.add_argument('--queue', required=True, help='SQLite queue file on shared storage')
+    work.add_argument('--sweep-id', help='only run tasks of this sweep')
+    work.add_argument('--worker-id', help='worker name, host:pid by default')
+    work.add_argument('--max-tasks', type=int)
+    work.add_argument('--lease', type=float, default=1800.0, help='lease duration, seconds')
+    work.add_argument('--wait', action='store_true', help='poll for new tasks instead of exiting when idle')
+
+    collect = commands.add_parser('collect', help='print (and save) the results of a queued sweep')
+    collect.add_argument('--queue', required=True, help='SQLite queue file on shared storage')
+    collect.add_argument('--sweep-id', required=True)
+    collect.add_argument('--output', help='CSV file for the sweep results')
+    collect.add_argument('--results-db', help='ResultsDB file to record the runs in')
+
+    serve = commands.add_parser('serve', help='local HTTP backtest service with warm caches')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--workers', type=int, default=4, help='jobs running at once')
+    serve.add_argument('--max-pending', type=int, default=256, help='jobs waiting at most, more are refused')
+    serve.add_argument('--preload', nargs='*', default=[], metavar='CONFIG',
+                       help='configs whose data (and grid features) are loaded at start-up')
+
+    results = commands.add_parser('results', help='query a results db')
+    results.add_argument('db', help='ResultsDB file')
+    queries = results.add_subparsers(dest='query', required=True)
+    queries.add_parser('sweeps', help='recorded sweeps')
+    top = queries.add_parser('top', help='best runs by a metric')
+    top.add_argument('--metric', required=True)
+    top.add_argument('-k', type=int, default=10)
+    top.add_argument('--ascending', action='store_true', help='smallest values first')
+    marginals = queries.add_parser('marginals', help='metric aggregates per value of a parameter')
+    marginals.add_argument('--param', required=True)
+    marginals.add_argument('--metric', required=True)
+    heatmap = queries.add_parser('heatmap', help='metric over a two-parameter slice')
+    heatmap.add_argument('--x', required=True)
+    heatmap.add_argument('--y', required=True)
+    heatmap.add_argument('--metric', required=True)
+    heatmap.add_argument('--aggregate', default='max', choices=['max', 'min', 'mean', 'count'])
+    for query in (top, marginals, heatmap):
+        query.add_argument('--sweep-id')
+        query.add_argument('--where', nargs='*', default=[], metavar='PARAM=VALUE', help='fix parameters')
+    return parser
+
+
+def queue_command(args: argparse.Namespace) -> None:
+    from Backtest_tools.work_queue import SQLiteWorkQueue, run_worker
+    if args.command == 'submit':
+        queue = SQLiteWorkQueue(args.queue)
+        sweep_id = args.sweep_id or Path(args.config).stem
+        added = queue.submit(sweep_id, task_payloads(load_config(args.config)))
+        print(f"{sweep_id}: {added} new tasks, {queue.progress(sweep_id)}")
+    elif args.command == 'work':
+        queue = SQLiteWorkQueue(args.queue, lease_seconds=args.lease)
+        done = run_worker(queue, TaskRunner(), args.worker_id, args.sweep_id, args.max_tasks,
+                          idle_exit=not args.wait)
+        print(f"completed {done} tasks, {queue.progress(args.sweep_id)}")
+    elif args.command == 'collect':
+        import pandas as pd
+        queue = SQLiteWorkQueue(args.queue)
+        report = pd.DataFrame(queue.results(args.sweep_id))
+        print(queue.progress(args.sweep_id))
+        if len(report):
+            print(report.sort_values('final_balance', ascending=False))
+        if args.output is not None:
+            report.to_csv(args.output, index=False)
+        if args.results_db is not None:
+            from Backtest_tools.results_db import ResultsDB
+            runs = queue.runs(args.sweep_id)
+            if runs:
+                ResultsDB(args.results_db).record_many(args.sweep_id, runs[0]['meta']['strategy'], runs)
+
+
+def _parse_where(items: List[str]) -> Dict[str, Any]:
+    where = {}
+    for item in items:
+        name, _, value = item.partition('=')
+        try:
+            where[name] = json.loads(value)
+        except json.JSONDecodeError:
+            where[name] = value
+    return where
+
+
+def results_command(args: argparse.Namespace) -> None:
+    import pandas as pd
+    from Backtest_tools.results_db import ResultsDB
+    db = ResultsDB(args.db)
+    start = time.perf_counter()
+    if args.query == 'sweeps':
+        table = db.sweeps()
+    elif args.query == 'top':
+        table = db.top_k(args.metric, args.k, args.sweep_id, _parse_where(args.where), args.ascending)
+    elif args.query == 'marginals':
+        table = db.marginals(args.param, args.metric, args.sweep_id, _parse_where(args.where))
+    else:
+        table = db.heatmap(args.x, args.y, args.metric, args.sweep_id, _parse_where(args.where), args.aggregate)
+    with pd.option_context('display.width', 200, 'display.max_columns', 50):
+        print(table)
+    print(f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def serve_command(args: argparse.Namespace) -> None:
+    from Backtest_tools.backtest_service import BacktestService, make_server
+    service = BacktestService(max_workers=args.workers, max_pending=args.max_pending)
+    for path in args.preload:
+        start = time.perf_counter()
+        loaded = service.preload(load_config(path))
+        print(f"preloaded {loaded} observations of {path} in {time.perf_counter() - start:.2f}s")
+    server = make_server(service, args.host, args.port)
+    print(f"serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    if args.command == 'serve':
+        serve_command(args)
+        return
+    if args.command in ('submit', 'work', 'collect'):
+        queue_command(args)
+        return
+    if args.command == 'results':
+        results_command(args)
+        return
+    config = load_config(args.config)
+    start = time.perf_counter()
+    observations = load_observations(config)
+    print(f"loaded {len(observations)} observations in {time.perf_counter() - start:.2f}s")
+    if args.command == 'run':
+        run_command(config, observations, args.output, args.debug, args.checkpoint, args.checkpoint_every,
+                    args.journal)
+    elif args.command == 'reprice':
+        reprice_command(observations, args.journal, args.trading_fee, args.fees_rate, args.fee_model, args.output)
+    elif args.command == 'sweep':
+        sweep_command(config, observations, args.output, args.results_db, args.sweep_id or Path(args.config).stem)
+    elif args.command == 'bench':
+        bench_command(config, observations, args.repeat)
+    elif args.command == 'walk-forward':
+        walk_forward_command(config, observations, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+import threading
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional, Type
+
+import numpy as np
+
+from fractal.core.base import ActionToTake, BaseStrategy, Observation
+from fractal.core.base.strategy import StrategyResult
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Backtest_tools.execution import REBALANCE_ACTIONS
+from Backtest_tools.grid_canonical import log_equivalent_runs, params_label
+
+
+SECONDS_IN_DAY: float = 60 * 60 * 24
+
+
+@dataclass
+class StopRules:
+    """
+    Conditions that abort a run of a sweep early, checked after every step.
+
+    Attributes:
+        max_drawdown (Optional[float]): Stop when the balance falls this fraction below its running peak.
+        max_rebalances_per_day (Optional[float]): Stop when the rebalances per day since the start exceed this.
+        balance_floor (Optional[float]): Stop when the balance falls below this fraction of the starting balance.
+        dominated_margin (Optional[float]): Stop when the balance is this fraction below the best run
+            of the sweep at the same timestamp.
+        grace_days (float): The rebalance rate and dominance are only checked after this many days.
+    """
+    max_drawdown: Optional[float] = None
+    max_rebalances_per_day: Optional[float] = None
+    balance_floor: Optional[float] = None
+    dominated_margin: Optional[float] = None
+    grace_days: float = 7.0
+
+    @classmethod
+    def from_dict(cls, options: Dict[str, Any]) -> 'StopRules':
+        names = {field.name for field in fields(cls)}
+        unknown = set(options) - names
+        if unknown:
+            raise ValueError(f"Unknown stop rules {sorted(unknown)}, expected some of {sorted(names)}")
+        return cls(**options)
+
+
+class RunPruned(Exception):
+    """
+    Raised from `step` when a stop rule fires, aborting `strategy.run`.
+    """
+    def __init__(self, reason: str, t: int, timestamp, balance: float, balances: List[float]):
+        super().__init__(f"{reason} at observation {t} ({timestamp}), balance {balance:.2f}")
+        self.reason: str = reason
+        self.t: int = t
+        self.timestamp = timestamp
+        self.balance: float = balance
+        self.balances: List[float] = balances
+
+
+class BestCurve:
+    """
+    Balance curve of the best finished run of a sweep (by final balance),
+    the reference of the dominance rule for runs that are not stepped in
+    lockstep. Only runs with the same start timestamp are compared.
+    Thread-safe.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start = None
+        self.balances: Optional[np.ndarray] = None
+
+    def offer(self, start, balances) -> bool:
+        balances = np.asarray(balances, dtype=np.float64)
+        with self._lock:
+            if self.balances is not None and (self.start != start or balances[-1] <= self.balances[-1]):
+                return False
+            self.start, self.balances = start, balances
+            return True
+
+    def at(self, start, t: int) -> Optional[float]:
+        balances = self.balances
+        if balances is None or self.start != start or t >= len(balances):
+            return None
+        return float(balances[t])
+
+
+class EarlyStopGuard:
+    """
+    Online state of the stop rules for one run: peak balance, rebalance count, start.
+    """
+    def __init__(self, rules: StopRules, best: Optional[BestCurve] = None):
+        self.rules: StopRules = rules
+        self.best: Optional[BestCurve] = best
+        self.start = None
+        self.start_balance: float = 0.0
+        self.peak: float = 0.0
+        self.rebalances: int = 0
+        self.balances: List[float] = []
+
+    def check(self, timestamp, balance: float, rebalanced: bool, best_balance: Optional[float] = None) -> Optional[str]:
+        """
+        Record one step of the run.
+
+        Args:
+            timestamp: The observation timestamp.
+            balance (float): The net balance after the step.
+            rebalanced (bool): Whether the strategy rebalanced on the step.
+            best_balance (Optional[float]): The best balance of the sweep at this timestamp,
+                read from the `BestCurve` when not given.
+
+        Returns:
+            Optional[str]: the name of the fired rule, None to continue
+        """
+        rules = self.rules
+        t = len(self.balances)
+        self.balances.append(balance)
+        self.rebalances += rebalanced
+        if self.start is None:
+            self.start, self.start_balance = timestamp, balance
+        self.peak = max(self.peak, balance)
+
+        if rules.balance_floor is not None and balance < rules.balance_floor * self.start_balance:
+            return 'balance_floor'
+        if rules.max_drawdown is not None and balance < (1 - rules.max_drawdown) * self.peak:
+            return 'max_drawdown'
+        days = (timestamp - self.start).total_seconds() / SECONDS_IN_DAY
+        if days < rules.grace_days:
+            return None
+        if rules.max_rebalances_per_day is not None and self.rebalances > rules.max_rebalances_per_day * days:
+            return 'max_rebalances_per_day'
+        if rules.dominated_margin is not None:
+            if best_balance is None and self.best is not None:
+                best_balance = self.best.at(self.start, t)
+            if best_balance is not None and balance < (1 - rules.dominated_margin) * best_balance:
+                return 'dominated'
+        return None
+
+
+class EarlyStoppingMixin:
+    """
+    Checks `stop_rules` after every step of `run` and raises `RunPruned` when one fires.
+
+    Mixed in front of a strategy class by `with_early_stopping`; finished
+    runs are offered to the shared `best_curve`. When `guarded_observations`
+    is set only the runs over that list are checked, so the window and
+    trajectory runs of a pipeline's scenario stages are never pruned.
+    """
+    stop_rules: Optional[StopRules] = None
+    best_curve: Optional[BestCurve] = None
+    guarded_observations: Optional[List[Observation]] = None
+    stop_guard: Optional[EarlyStopGuard] = None
+    _rebalanced: bool = False
+
+    def run(self, observations: List[Observation]) -> StrategyResult:
+        guarded = self.guarded_observations is None or observations is self.guarded_observations
+        if self.stop_rules is not None and guarded:
+            self.stop_guard = EarlyStopGuard(self.stop_rules, self.best_curve)
+        result = super().run(observations)
+        if self.stop_guard is not None and self.best_curve is not None:
+            self.best_curve.offer(self.stop_guard.start, self.stop_guard.balances)
+        return result
+
+    def predict(self) -> List[ActionToTake]:
+        actions = super().predict()
+        self._rebalanced = any(action.action.action in REBALANCE_ACTIONS for action in actions)
+        return actions
+
+    def step(self, observation: Observation):
+        self._rebalanced = False
+        super().step(observation)
+        guard = self.stop_guard
+        if guard is None:
+            return
+        balance = sum(entity.balance for entity in self.get_all_available_entities().values())
+        reason = guard.check(observation.timestamp, balance, self._rebalanced)
+        if reason is not None:
+            raise RunPruned(reason, len(guard.balances) - 1, observation.timestamp, balance, guard.balances)
+
+
+def with_early_stopping(strategy_type: Type[BaseStrategy], rules: StopRules, best: Optional[BestCurve] = None,
+                        observations: Optional[List[Observation]] = None) -> Type[BaseStrategy]:
+    """
+    Subclass of the strategy that is pruned by `rules` during `run`, the
+    pool and feature store class attributes are inherited.
+
+    Args:
+        strategy_type (Type[BaseStrategy]): The strategy class.
+        rules (StopRules): The stop rules.
+        best (Optional[BestCurve]): The best curve of the sweep shared by the runs.
+        observations (Optional[List[Observation]]): Only guard the runs over this list,
+            the backtest observations of a pipeline; every run is guarded when None.
+
+    Returns:
+        Type[BaseStrategy]: the guarded strategy class
+    """
+    return type(strategy_type.__name__, (EarlyStoppingMixin, strategy_type),
+                {'stop_rules': rules, 'best_curve': best, 'guarded_observations': observations,
+                 '__module__': strategy_type.__module__})
+
+
+def run_pipeline(pipeline, params_grid, equivalents: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> List[RunPruned]:
+    """
+    Run fractal's pipeline over the grid step by step, the way `pipeline.run`
+    does, keeping going past pruned runs. The strategy type should be
+    guarded with the pipeline's backtest observations (`with_early_stopping`),
+    a pruned window run would otherwise abort the grid point. A pruned run stays in mlflow with
+    the tags pruned=true and stop_reason and the final_balance and
+    stopped_at metrics of its partial backtest. The grid points equivalent
+    to a run (`equivalents`, by `params_label`) are logged as copies of it.
+
+    Returns:
+        List[RunPruned]: the pruned runs
+    """
+    import mlflow
+    pruned_runs = []
+    for params in params_grid:
+        try:
+            pipeline.grid_step(params)
+        except RunPruned as pruned:
+            # the failed run was ended by the exception, reopen it to record the stop
+            with mlflow.start_run(run_id=mlflow.last_active_run().info.run_id):
+                mlflow.set_tags({'pruned': 'true', 'stop_reason': pruned.reason})
+                mlflow.log_metrics({'final_balance': pruned.balance, 'stopped_at': pruned.t})
+            pruned_runs.append(pruned)
+        if equivalents and equivalents.get(params_label(params)):
+            log_equivalent_runs(mlflow.last_active_run().info.run_id, equivalents[params_label(params)])
+    return pruned_runs
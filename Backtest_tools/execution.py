@@ -0,0 +1,26 @@
+from typing import List
+
+from fractal.core.base import Action, ActionToTake, BaseStrategy
+
+
+# actions that (re)open a position, counted as rebalances in the reports
+REBALANCE_ACTIONS = ('open_position', 'rebalance')
+
+
+def execute_actions(strategy: BaseStrategy, actions: List[ActionToTake]) -> None:
+    """
+    Execute actions on the strategy entities the same way `BaseStrategy.step` does.
+
+    Delegated (callable) args are resolved right before each action is executed.
+
+    Args:
+        strategy (BaseStrategy): strategy owning the entities
+        actions (List[ActionToTake]): actions returned by `predict`
+    """
+    for action in actions:
+        entity = strategy.get_entity(action.entity_name)
+        args = {
+            arg_name: arg_value(strategy) if callable(arg_value) else arg_value
+            for arg_name, arg_value in action.action.args.items()
+        }
+        entity.execute(Action(action=action.action.action, args=args))
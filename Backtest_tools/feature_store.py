@@ -0,0 +1,133 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from fractal.core.base import Observation
+from fractal.core.base.entity import GlobalState
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Backtest_tools.observations import ObservationArrays
+
+
+@dataclass
+class WindowStats:
+    """
+    Rolling statistics of the returns window ending at each observation.
+
+    Values are NaN where the window would start before the first observation.
+
+    Attributes:
+        std (np.ndarray): Standard deviation, ddof=0.
+        std_ddof1 (np.ndarray): Standard deviation, ddof=1.
+        iqr (np.ndarray): Interquartile range (75th - 25th percentile).
+    """
+    std: np.ndarray
+    std_ddof1: np.ndarray
+    iqr: np.ndarray
+
+
+def _histograms(values: np.ndarray, bins: int) -> np.ndarray:
+    """
+    Row-wise `np.histogram(row, bins=bins)[0]` with the same binning rules.
+    """
+    first = values.min(axis=1)
+    last = values.max(axis=1)
+    degenerate = first == last
+    first = np.where(degenerate, first - 0.5, first)
+    last = np.where(degenerate, last + 0.5, last)
+    edges = np.linspace(first, last, bins + 1, axis=1)
+
+    norm = bins / (last - first)
+    indices = ((values - first[:, None]) * norm[:, None]).astype(np.intp)
+    indices[indices == bins] -= 1
+    rows = np.arange(len(values))[:, None]
+    indices[values < edges[rows, indices]] -= 1
+    increment = (values >= edges[rows, indices + 1]) & (indices != bins - 1)
+    indices[increment] += 1
+
+    counts = np.bincount((rows * bins + indices).ravel(), minlength=len(values) * bins)
+    return counts.reshape(len(values), bins)
+
+
+class FeatureStore:
+    """
+    Shared precomputed window features of one observation list.
+
+    Tau-reset strategies recompute returns, percentiles, std and histograms
+    of the last `INFO_TIME + 1` prices. These only depend on the price series,
+    `INFO_TIME`, `U` and `BINS`, so they are computed here once per sweep for
+    every observation index and read by strategies through `index_of`.
+    """
+    def __init__(self, observations: List[Observation], entity_name: str = 'UNISWAP_V3', chunk_size: int = 4096):
+        self.arrays: ObservationArrays = ObservationArrays.from_observations(observations, entity_name)
+        self._chunk_size: int = chunk_size
+        # global states are shared by reference with the entities, so they identify the step
+        self._observations: List[Observation] = observations
+        self._index: Dict[int, int] = {
+            id(observation.states[entity_name]): i for i, observation in enumerate(observations)
+        }
+        self._stats: Dict[Tuple[int, int], WindowStats] = {}
+        self._histograms: Dict[Tuple[int, int, int], np.ndarray] = {}
+
+    def index_of(self, state: GlobalState) -> Optional[int]:
+        """
+        Returns the observation index of the global state or None if it is not from this store.
+        """
+        return self._index.get(id(state))
+
+    def _series(self, u: int) -> Tuple[np.ndarray, bool]:
+        if u == 1:
+            return self.arrays.log_returns, True
+        if u == 0:
+            return self.arrays.diff_returns, True
+        return self.arrays.price, False
+
+    def _rolling(self, info_time: int, u: int, func, width_out: Tuple[int, ...] = ()) -> np.ndarray:
+        """
+        Apply `func` to every window of the `u` series ending at each observation, in chunks.
+        """
+        series, is_returns = self._series(u)
+        start = 1 if is_returns else 0
+        width = info_time if is_returns else info_time + 1
+        n = len(series)
+        out = np.full((n,) + width_out, np.nan)
+        if n - start < width:
+            return out
+        windows = sliding_window_view(series[start:], width)
+        first_end = start + width - 1
+        for i in range(0, len(windows), self._chunk_size):
+            chunk = windows[i:i + self._chunk_size]
+            out[first_end + i:first_end + i + len(chunk)] = func(chunk)
+        return out
+
+    def window_stats(self, info_time: int, u: int = 1) -> WindowStats:
+        key = (info_time, u)
+        if key not in self._stats:
+            std = self._rolling(info_time, u, lambda chunk: np.std(chunk, axis=1))
+            std_ddof1 = self._rolling(info_time, u, lambda chunk: np.std(chunk, axis=1, ddof=1))
+            iqr = self._rolling(
+                info_time, u, lambda chunk: np.subtract(*np.percentile(chunk, [75, 25], axis=1)))
+            self._stats[key] = WindowStats(std=std, std_ddof1=std_ddof1, iqr=iqr)
+        return self._stats[key]
+
+    def histogram(self, info_time: int, u: int, bins: int) -> np.ndarray:
+        key = (info_time, u, bins)
+        if key not in self._histograms:
+            self._histograms[key] = self._rolling(info_time, u, lambda chunk: _histograms(chunk, bins), (bins,))
+        return self._histograms[key]
+
+    def precompute(self, params_grid: Iterable[Dict]) -> None:
+        """
+        Warm the caches for every distinct (INFO_TIME, U, BINS) of the parameters grid.
+        """
+        for params in params_grid:
+            if 'INFO_TIME' not in params:
+                continue
+            u = params.get('U', 1)
+            self.window_stats(params['INFO_TIME'], u)
+            if 'BINS' in params:
+                self.histogram(params['INFO_TIME'], u, params['BINS'])
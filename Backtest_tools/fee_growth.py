@@ -0,0 +1,139 @@
+from typing import List, Optional
+
+import numpy as np
+
+from fractal.core.base import Observation
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Modified_entity.tick_math import Q96, pool_tick
+from Backtest_tools.observations import ObservationArrays
+
+
+def pool_liquidity(liquidity: float, token0_decimals: int, token1_decimals: int) -> float:
+    """
+    Position liquidity (`Position.liquidity`) in the units of the pool liquidity,
+    the value `UniswapV3LPEntity.get_position_liquidity_delta` returns in range.
+    """
+    return liquidity * 10 ** ((token0_decimals + token1_decimals) / 2)
+
+
+def liquidity_delta(price: np.ndarray, price_lower: np.ndarray, price_upper: np.ndarray,
+                    token0: np.ndarray, token1: np.ndarray, token0_decimals: int, token1_decimals: int) -> np.ndarray:
+    """
+    Vectorized `get_liquidity_delta` for inverted (token0/token1) prices, as `UniswapV3LPEntity`.
+    """
+    def sqrt_x96(p):
+        return np.sqrt(p * 10 ** token0_decimals / 10 ** token1_decimals) * Q96
+
+    sqrt_p = sqrt_x96(1 / price)
+    sqrt_a = sqrt_x96(1 / price_upper)
+    sqrt_b = sqrt_x96(1 / price_lower)
+    amount0 = token0 * 10 ** token1_decimals
+    amount1 = token1 * 10 ** token0_decimals
+    with np.errstate(divide='ignore', invalid='ignore'):
+        below = amount0 * (sqrt_b * sqrt_a / Q96) / (sqrt_b - sqrt_a)
+        inside = np.minimum(amount0 * (sqrt_b * sqrt_p / Q96) / (sqrt_b - sqrt_p),
+                            amount1 * Q96 / (sqrt_p - sqrt_a))
+        above = amount1 * Q96 / (sqrt_b - sqrt_a)
+    return np.where(sqrt_p <= sqrt_a, below, np.where(sqrt_p < sqrt_b, inside, above))
+
+
+class FeeGrowthIndex:
+    """
+    Cumulative fee growth per unit of pool liquidity, by time and tick bucket.
+
+    Modeled on Uniswap's feeGrowthGlobal/feeGrowthOutside: the growth of a
+    step is `fees / liquidity` and is credited to the tick bucket
+    (`tick_spacing` wide) of the on-chain tick of the price (`pool_tick`). `below[r, k]` holds the growth
+    accrued before observation `r * stride` while the price was in a bucket
+    below boundary `k`, so the growth inside [tick_lower, tick_upper) over
+    [t0, t1) is a difference of four prefix sums:
+
+        (below(t1, upper) - below(t0, upper)) - (below(t1, lower) - below(t0, lower))
+
+    With `stride > 1` only every stride-th row is stored and a query adds
+    at most `stride` steps from the per-step arrays, trading table memory
+    (rows x buckets) for query time.
+
+    Fees of a position are `pool_liquidity * growth_inside`, the first order
+    of the entity's `fees * delta / (liquidity + delta)` (relative error
+    about delta / liquidity). Bounds on usable ticks of `tick_spacing` are
+    exact up to prices lying exactly on a bound; other bounds are rounded
+    outwards to the bucket edges.
+    """
+    def __init__(self, arrays: ObservationArrays, tick_spacing: int, token0_decimals: int, token1_decimals: int,
+                 stride: int = 1):
+        self.tick_spacing: int = tick_spacing
+        self.token0_decimals: int = token0_decimals
+        self.token1_decimals: int = token1_decimals
+        self.stride: int = stride
+        self.n: int = len(arrays)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.growth: np.ndarray = np.where(arrays.liquidity > 0, arrays.fees / arrays.liquidity, 0.0)
+        buckets = np.floor_divide(pool_tick(arrays.price, token0_decimals, token1_decimals), tick_spacing)
+        self.bucket_offset: int = int(buckets.min()) if self.n else 0
+        self.buckets: np.ndarray = (buckets - self.bucket_offset).astype(np.int64)
+        self.n_buckets: int = int(self.buckets.max()) + 1 if self.n else 0
+
+        rows = -(-self.n // stride) + 1
+        increments = np.zeros((rows, self.n_buckets + 1))
+        steps = np.arange(self.n)
+        # a step counts in the rows after it and for the boundaries above its bucket
+        np.add.at(increments, (steps // stride + 1, self.buckets + 1), self.growth)
+        self.below: np.ndarray = np.cumsum(np.cumsum(increments, axis=0), axis=1)
+        self.cumulative: np.ndarray = np.concatenate([[0.0], np.cumsum(self.growth)])
+
+    @classmethod
+    def from_observations(cls, observations: List[Observation], tick_spacing: int, token0_decimals: int,
+                          token1_decimals: int, stride: int = 1, entity_name: str = 'UNISWAP_V3') -> 'FeeGrowthIndex':
+        return cls(ObservationArrays.from_observations(observations, entity_name), tick_spacing,
+                   token0_decimals, token1_decimals, stride)
+
+    def _boundary(self, tick: int, upper: bool) -> int:
+        bucket = -(-tick // self.tick_spacing) if upper else tick // self.tick_spacing
+        return min(max(bucket - self.bucket_offset, 0), self.n_buckets)
+
+    def _below(self, t: int, boundary: int) -> float:
+        row = t // self.stride
+        start = row * self.stride
+        value = self.below[row, boundary]
+        if start < t:
+            value += self.growth[start:t][self.buckets[start:t] < boundary].sum()
+        return float(value)
+
+    def growth_global(self, t0: int, t1: int) -> float:
+        """
+        Growth per unit of liquidity over the observations [t0, t1), in range or not.
+        """
+        return float(self.cumulative[t1] - self.cumulative[t0])
+
+    def growth_inside(self, t0: int, t1: int, tick_lower: int, tick_upper: int) -> float:
+        """
+        Growth per unit of liquidity over the observations [t0, t1) with the price in [tick_lower, tick_upper).
+        """
+        lower, upper = self._boundary(tick_lower, False), self._boundary(tick_upper, True)
+        if t1 <= t0 or upper <= lower:
+            return 0.0
+        return (self._below(t1, upper) - self._below(t0, upper)) - (self._below(t1, lower) - self._below(t0, lower))
+
+    def fees(self, t0: int, t1: int, tick_lower: int, tick_upper: int, liquidity_delta: float) -> float:
+        """
+        Fees earned over [t0, t1) by a position of `liquidity_delta` pool liquidity units.
+        """
+        return liquidity_delta * self.growth_inside(t0, t1, tick_lower, tick_upper)
+
+    def position_fees(self, t0: int, t1: int, position, tick_lower: Optional[int] = None,
+                      tick_upper: Optional[int] = None) -> float:
+        """
+        Fees earned over [t0, t1) by an entity position, its on-chain ticks are taken
+        from the position (tick-aligned entities) or from its price bounds.
+        """
+        d0, d1 = self.token0_decimals, self.token1_decimals
+        if tick_lower is None:
+            tick_lower = position.tick_lower if position.tick_lower is not None else pool_tick(position.price_upper, d0, d1)
+        if tick_upper is None:
+            tick_upper = position.tick_upper if position.tick_upper is not None else pool_tick(position.price_lower, d0, d1)
+        delta = pool_liquidity(position.liquidity, d0, d1)
+        return self.fees(t0, t1, tick_lower, tick_upper, delta)
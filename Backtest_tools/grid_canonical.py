@@ -0,0 +1,98 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import pandas as pd
+
+from fractal.core.base import BaseStrategy
+
+
+def params_label(params: Dict[str, Any]) -> str:
+    """
+    Row label of a grid point in the sweep reports (MultiStrategyRunner, SweepPlanner).
+    """
+    return json.dumps(params, sort_keys=True)
+
+
+@dataclass
+class EquivalenceClass:
+    """
+    Grid points whose runs are identical, run once through their representative.
+
+    Attributes:
+        params (Dict[str, Any]): The representative, the first member in grid order.
+        members (List[Dict[str, Any]]): All the grid points of the class, the representative included.
+        ignored (Tuple[str, ...]): The parameters that have no effect on the runs of the class.
+    """
+    params: Dict[str, Any]
+    members: List[Dict[str, Any]]
+    ignored: Tuple[str, ...]
+
+
+def canonical_key(strategy_type: Type[BaseStrategy], params: Dict[str, Any],
+                  n_observations: Optional[int] = None) -> str:
+    """
+    Key equal for the grid points with the same run: the params without the ones
+    the strategy declares irrelevant (`irrelevant_params`), and which ones they are.
+    """
+    irrelevant_params = getattr(strategy_type, 'irrelevant_params', None)
+    ignored = () if irrelevant_params is None else tuple(sorted(irrelevant_params(params, n_observations)))
+    return json.dumps([{name: value for name, value in params.items() if name not in ignored}, ignored],
+                      sort_keys=True)
+
+
+def canonicalize(strategy_type: Type[BaseStrategy], grid: List[Dict[str, Any]],
+                 n_observations: Optional[int] = None) -> List[EquivalenceClass]:
+    """
+    Collapse the grid into classes of equivalent points, in grid order.
+
+    Strategies declare their parameter dependencies with the classmethod
+    `irrelevant_params(params, n_observations)`: the names of the parameters
+    that do not change a run of `n_observations` (None if unknown) with
+    `params`. Strategies without it keep every grid point.
+    """
+    classes: Dict[str, EquivalenceClass] = {}
+    for params in grid:
+        key = canonical_key(strategy_type, params, n_observations)
+        if key in classes:
+            classes[key].members.append(params)
+        else:
+            classes[key] = EquivalenceClass(params, [params], tuple(json.loads(key)[1]))
+    return list(classes.values())
+
+
+def fan_out(report: pd.DataFrame, classes: List[EquivalenceClass], grid: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Report with a row for every point of the grid, copied from the row of its
+    class representative, in grid order; points whose representative is not
+    in the report (screened out) are left out and the other rows (MARKET) kept.
+    """
+    representatives = {params_label(params): params_label(equivalence.params)
+                       for equivalence in classes for params in equivalence.members}
+    labels = [params_label(params) for params in grid]
+    labels = [label for label in labels if representatives.get(label) in report.index]
+    rows = report.loc[[representatives[label] for label in labels]]
+    rows.index = labels
+    others = report.drop(index=list(set(representatives.values())), errors='ignore')
+    return pd.concat([rows, others])
+
+
+def log_equivalent_runs(run_id: str, members: List[Dict[str, Any]]) -> List[str]:
+    """
+    Log an mlflow run per member with the params of the member and the metrics and
+    tags of the representative's run `run_id`, tagged equivalent_to=run_id.
+
+    Returns:
+        List[str]: the ids of the logged runs
+    """
+    import mlflow
+    run = mlflow.get_run(run_id)
+    tags = {name: value for name, value in run.data.tags.items() if not name.startswith('mlflow.')}
+    run_ids = []
+    for params in members:
+        with mlflow.start_run() as member_run:
+            mlflow.log_params(params)
+            mlflow.log_metrics(run.data.metrics)
+            mlflow.set_tags({**tags, 'equivalent_to': run_id})
+            run_ids.append(member_run.info.run_id)
+    return run_ids
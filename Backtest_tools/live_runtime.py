@@ -0,0 +1,336 @@
+import asyncio
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, UTC
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+from fractal.core.base import ActionToTake, BaseStrategy, Observation
+from fractal.core.base.entity import GlobalState
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Backtest_tools.execution import execute_actions
+from Modified_entity.compact_states import CompactBarState, CompactGlobalState
+
+
+DEFAULT_STATE_TYPES: Dict[str, Type[GlobalState]] = {'UNISWAP_V3': CompactGlobalState}
+BAR_FIELDS = frozenset(('price_min', 'price_max', 'count', 'price_open'))
+
+
+def _json_default(value):
+    # numpy scalars of bar states (counts, pyramid columns)
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_state(state_type: Type[GlobalState], state: Dict) -> GlobalState:
+    # bars (pyramid levels, compressed observations) keep their open/low/high/count
+    if state_type is CompactGlobalState and BAR_FIELDS & state.keys():
+        state_type = CompactBarState
+    return state_type(**state)
+
+
+def encode_observation(observation: Observation) -> bytes:
+    """
+    Serialize an observation to a single newline-terminated JSON line.
+
+    Args:
+        observation (Observation): observation to serialize
+
+    Returns:
+        bytes: JSON line
+    """
+    return (json.dumps({
+        'timestamp': observation.timestamp.isoformat(),
+        'states': {entity_name: dict(state.__dict__) for entity_name, state in observation.states.items()},
+    }, default=_json_default) + '\n').encode()
+
+
+def decode_observation(line: bytes, state_types: Dict[str, Type[GlobalState]] = None) -> Observation:
+    """
+    Deserialize an observation produced by `encode_observation`.
+
+    States with bar fields (price_min, price_max, count, price_open) are
+    decoded as `CompactBarState` when their entity maps to `CompactGlobalState`.
+
+    Args:
+        line (bytes): JSON line
+        state_types (Dict[str, Type[GlobalState]]): global state class per entity name
+
+    Returns:
+        Observation: decoded observation
+    """
+    state_types = state_types or DEFAULT_STATE_TYPES
+    data = json.loads(line)
+    return Observation(
+        timestamp=datetime.fromisoformat(data['timestamp']),
+        states={
+            entity_name: _decode_state(state_types[entity_name], state)
+            for entity_name, state in data['states'].items()
+        }
+    )
+
+
+@dataclass
+class TickRecord:
+    """
+    Represents a single processed tick of the live runtime.
+
+    Attributes:
+        timestamp (datetime): The observation timestamp.
+        decision_latency (float): Seconds spent in state update + `predict`.
+        execution_latency (float): Seconds spent in the executor.
+        actions (int): The number of actions emitted.
+        balance (float): The strategy balance after execution.
+        over_budget (bool): Whether the decision exceeded the latency budget.
+    """
+    timestamp: datetime
+    decision_latency: float
+    execution_latency: float
+    actions: int
+    balance: float
+    over_budget: bool
+
+
+@dataclass
+class LiveRunReport:
+    """
+    Represents the collected tick records of a live runtime session.
+
+    Attributes:
+        latency_budget (float): The per-tick decision latency budget in seconds.
+        ticks (List[TickRecord]): The processed ticks.
+    """
+    latency_budget: float
+    ticks: List[TickRecord] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Returns decision latency statistics in milliseconds.
+        """
+        if not self.ticks:
+            return {'ticks': 0}
+        latencies = np.array([tick.decision_latency for tick in self.ticks]) * 1e3
+        return {
+            'ticks': len(self.ticks),
+            'actions': sum(tick.actions for tick in self.ticks),
+            'mean_ms': float(latencies.mean()),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'max_ms': float(latencies.max()),
+            'over_budget': sum(tick.over_budget for tick in self.ticks),
+            'final_balance': self.ticks[-1].balance,
+        }
+
+
+class BaseExecutor(ABC):
+    """
+    Receives the actions decided by the strategy on each tick.
+    """
+    @abstractmethod
+    async def execute(self, strategy: BaseStrategy, actions: List[ActionToTake]) -> None:
+        """
+        Execute the actions of one tick.
+
+        The fills must end up in the strategy's entities before the next tick,
+        `predict` decides from their positions and cash.
+        """
+
+
+class PaperExecutor(BaseExecutor):
+    """
+    Paper trading: applies actions to the strategy's own simulated entities,
+    exactly like `BaseStrategy.step` does in a backtest.
+    """
+    async def execute(self, strategy: BaseStrategy, actions: List[ActionToTake]) -> None:
+        execute_actions(strategy, actions)
+
+
+class CallbackExecutor(BaseExecutor):
+    """
+    Forwards actions to a user callback (order router, bot, log sink).
+    The callback may be a plain function or a coroutine function.
+
+    The callback must apply the fills to the strategy's entities, e.g. with
+    `execute_actions(strategy, actions)` once the orders are filled or with
+    the filled amounts; otherwise the entities keep their old positions and
+    `predict` emits the same rebalance again on every tick.
+    """
+    def __init__(self, callback: Callable[[BaseStrategy, List[ActionToTake]], Optional[Awaitable[None]]]):
+        self._callback = callback
+
+    async def execute(self, strategy: BaseStrategy, actions: List[ActionToTake]) -> None:
+        if not actions:
+            return
+        result = self._callback(strategy, actions)
+        if asyncio.iscoroutine(result):
+            await result
+
+
+async def queue_feed(queue: asyncio.Queue, conflate: bool = False) -> AsyncIterator[Observation]:
+    """
+    Yields observations from an asyncio queue until `None` is received.
+
+    Args:
+        queue (asyncio.Queue): queue of observations, `None` terminates the feed
+        conflate (bool): skip to the newest queued observation when the runtime falls behind
+    """
+    while True:
+        observation = await queue.get()
+        if conflate:
+            while observation is not None and not queue.empty():
+                observation = queue.get_nowait()
+        if observation is None:
+            return
+        yield observation
+
+
+async def socket_feed(host: str, port: int,
+                      state_types: Dict[str, Type[GlobalState]] = None) -> AsyncIterator[Observation]:
+    """
+    Yields observations streamed as JSON lines over TCP until the peer closes the connection.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while line := await reader.readline():
+            yield decode_observation(line, state_types)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+class ReplayServer:
+    """
+    Local TCP server streaming historical observations as JSON lines.
+
+    Every client gets the full replay. With `speedup` the gaps between
+    observation timestamps are replayed `speedup` times faster,
+    without it observations are sent as fast as the client reads them.
+    """
+    def __init__(self, observations: List[Observation], speedup: Optional[float] = None,
+                 host: str = '127.0.0.1', port: int = 0):
+        self._observations: List[Observation] = observations
+        self._speedup: Optional[float] = speedup
+        self._host: str = host
+        self._port: int = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> Tuple[str, int]:
+        self._server = await asyncio.start_server(self._handle_client, self._host, self._port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def __aenter__(self) -> 'ReplayServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        previous_timestamp = None
+        try:
+            for observation in self._observations:
+                if self._speedup and previous_timestamp is not None:
+                    await asyncio.sleep((observation.timestamp - previous_timestamp).total_seconds() / self._speedup)
+                writer.write(encode_observation(observation))
+                await writer.drain()
+                previous_timestamp = observation.timestamp
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+class LiveRuntime:
+    """
+    Event-driven runtime: steps the strategy on every incoming observation.
+
+    Each tick does what `BaseStrategy.step` does, with the execution handed
+    to the executor: the observation is checked against the registered
+    entities and written to the strategy's `observations_storage`, the
+    entities states are updated and the actions of `predict` are executed.
+    The decision latency is recorded against `latency_budget` (seconds).
+    """
+    def __init__(self, strategy: BaseStrategy, executor: BaseExecutor = None, latency_budget: float = 0.1):
+        self._strategy: BaseStrategy = strategy
+        self._executor: BaseExecutor = executor or PaperExecutor()
+        self.report: LiveRunReport = LiveRunReport(latency_budget=latency_budget)
+
+    async def on_observation(self, observation: Observation) -> TickRecord:
+        start = time.perf_counter()
+        entities = self._strategy.get_all_available_entities()
+        for entity_name in observation.states:
+            if entity_name not in entities:
+                raise ValueError(f"Entity {entity_name} is not registered.")
+        if self._strategy.observations_storage is not None:
+            self._strategy.observations_storage.write(observation)
+        for entity_name, state in observation.states.items():
+            entities[entity_name].update_state(state)
+        actions: List[ActionToTake] = self._strategy.predict()
+        decided = time.perf_counter()
+        await self._executor.execute(self._strategy, actions)
+        executed = time.perf_counter()
+
+        record = TickRecord(
+            timestamp=observation.timestamp,
+            decision_latency=decided - start,
+            execution_latency=executed - decided,
+            actions=len(actions),
+            balance=sum(entity.balance for entity in self._strategy.get_all_available_entities().values()),
+            over_budget=decided - start > self.report.latency_budget,
+        )
+        self.report.ticks.append(record)
+        return record
+
+    async def run(self, feed: AsyncIterator[Observation]) -> LiveRunReport:
+        async for observation in feed:
+            await self.on_observation(observation)
+        return self.report
+
+
+async def paper_trade_replay(strategy: BaseStrategy, observations: List[Observation],
+                             speedup: Optional[float] = None, latency_budget: float = 0.1) -> LiveRunReport:
+    """
+    Paper-trades the strategy against a local replay server of historical observations.
+    """
+    async with ReplayServer(observations, speedup=speedup) as server:
+        host, port = server.address
+        runtime = LiveRuntime(strategy, PaperExecutor(), latency_budget=latency_budget)
+        return await runtime.run(socket_feed(host, port))
+
+
+if __name__ == '__main__':
+    from Backtest_tools.observations import build_observations
+    from Classic_tau_reset.tau_strategy import TauResetParams, TauResetStrategy
+
+    ticker: str = 'ETHUSDT'
+    pool_address: str = '0x8ad599c3a0ff1de082011efddc58f1908eb6e6d8'
+    THE_GRAPH_API_KEY = os.getenv('THE_GRAPH_API_KEY')
+
+    strategy: TauResetStrategy = TauResetStrategy(params=TauResetParams(TAU=90, INITIAL_BALANCE=1_000_000),
+                                                  token0_decimals=6, token1_decimals=18, tick_spacing=60)
+
+    observations: List[Observation] = build_observations(
+        ticker=ticker, pool_address=pool_address, api_key=THE_GRAPH_API_KEY,
+        start_time=datetime(2025, 1, 11, tzinfo=UTC), end_time=datetime(2025, 2, 11, tzinfo=UTC),
+        fidelity='hour'
+    )
+    # one hour of history per 10 ms
+    report = asyncio.run(paper_trade_replay(strategy, observations, speedup=3600 * 100))
+    print(report.summary())
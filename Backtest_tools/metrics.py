@@ -0,0 +1,38 @@
+from typing import Dict
+
+import numpy as np
+
+
+SECONDS_IN_YEAR: float = 60 * 60 * 24 * 365
+
+
+def balance_metrics(timestamps: np.ndarray, balances: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Default strategy metrics (as `StrategyResult.get_metrics`) for one or many balance curves.
+
+    Args:
+        timestamps (np.ndarray): datetime64 timestamps of length T
+        balances (np.ndarray): net balances of shape (T,) or (N, T)
+
+    Returns:
+        Dict[str, np.ndarray]: accumulated_return, apy, sharpe and max_drawdown per curve
+    """
+    balances = np.atleast_2d(np.asarray(balances, dtype=np.float64))
+    total_seconds = (timestamps[-1] - timestamps[0]) / np.timedelta64(1, 's')
+    total_years = total_seconds / SECONDS_IN_YEAR
+    accumulated_return = balances[:, -1] / balances[:, 0] - 1
+    apy = accumulated_return / total_years
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct_change = balances[:, 1:] / balances[:, :-1] - 1
+        std = pct_change.std(axis=1, ddof=1)
+        sharpe = np.where(std > 0, pct_change.mean(axis=1) / std, 0.0)
+    sharpe *= np.sqrt(balances.shape[1] / total_years)
+
+    drawdowns = balances / np.maximum.accumulate(balances, axis=1) - 1
+    return {
+        'accumulated_return': accumulated_return,
+        'apy': apy,
+        'sharpe': sharpe,
+        'max_drawdown': drawdowns.min(axis=1),
+    }
@@ -0,0 +1,239 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, UTC
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import numpy as np
+import pandas as pd
+
+from fractal.core.base import BaseStrategy, BaseStrategyParams, Observation
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Backtest_tools.early_stopping import BestCurve, EarlyStopGuard, StopRules
+from Backtest_tools.execution import REBALANCE_ACTIONS, execute_actions
+from Backtest_tools.feature_store import FeatureStore
+from Backtest_tools.metrics import balance_metrics
+from Backtest_tools.observations import ObservationArrays, build_observations
+
+
+@dataclass
+class StrategySpec:
+    """
+    Represents one strategy instance of a comparative run.
+
+    Attributes:
+        name (str): The label of the strategy in the report.
+        strategy_type (Type[BaseStrategy]): The strategy class.
+        params (BaseStrategyParams | Dict): The strategy parameters.
+    """
+    name: str
+    strategy_type: Type[BaseStrategy]
+    params: BaseStrategyParams | Dict
+
+
+class MultiStrategyRunner:
+    """
+    Steps many strategy instances in lockstep over one pass of the observations.
+
+    Observation arrays, per-step features (log/difference returns) and the
+    window features are built once in a `FeatureStore` over the observations
+    and shared: strategies with a `feature_store` receive it as their
+    `feature_store=` kwarg and read their windows from it, and every strategy
+    receives the same global state objects instead of its own copy of the data.
+
+    `strategy_kwargs` (the pool settings of `registry.strategy_kwargs`:
+    token decimals, tick_spacing, align_ticks) are passed to every instance.
+
+    With `stop_rules` a strategy is no longer stepped once a rule fires
+    (dominance is checked against the best strategy of the same step), its
+    balance is held from then on and the report marks it as pruned.
+    """
+    def __init__(self, specs: List[StrategySpec], stop_rules: Optional[StopRules] = None,
+                 feature_store: Optional[FeatureStore] = None, **strategy_kwargs):
+        self._specs: List[StrategySpec] = specs
+        self._strategy_kwargs: Dict[str, Any] = strategy_kwargs
+        self.stop_rules: Optional[StopRules] = stop_rules
+        # a store given here must be built over the observations passed to `run`
+        self.feature_store: Optional[FeatureStore] = feature_store
+        self.features: ObservationArrays | None = None
+        self.strategies: Dict[str, BaseStrategy] = {}
+        self.balances: np.ndarray | None = None
+        self.stop_reasons: Dict[str, str] = {}
+
+    def _create_strategies(self) -> Dict[str, BaseStrategy]:
+        return {
+            spec.name: spec.strategy_type(
+                params=spec.params,
+                **self._strategy_kwargs,
+                **({'feature_store': self.feature_store} if hasattr(spec.strategy_type, 'feature_store') else {}),
+            ) for spec in self._specs
+        }
+
+    def _share_features(self, observations: List[Observation]) -> None:
+        """
+        Build the shared FeatureStore (unless given) and precompute the windows of all the specs.
+        """
+        if self.feature_store is None:
+            self.feature_store = FeatureStore(observations)
+        self.features = self.feature_store.arrays
+        self.feature_store.precompute(spec.params if isinstance(spec.params, dict) else vars(spec.params)
+                                      for spec in self._specs)
+
+    @staticmethod
+    def _step(strategy: BaseStrategy, observation: Observation) -> Tuple[float, bool]:
+        """
+        Step one strategy on one observation.
+
+        Returns:
+            Tuple[float, bool]: net balance after the step and whether the strategy rebalanced
+        """
+        for entity_name, state in observation.states.items():
+            strategy.get_entity(entity_name).update_state(state)
+        actions = strategy.predict()
+        rebalanced = any(action.action.action in REBALANCE_ACTIONS for action in actions)
+        execute_actions(strategy, actions)
+        return sum(entity.balance for entity in strategy.get_all_available_entities().values()), rebalanced
+
+    def run(self, observations: List[Observation]) -> pd.DataFrame:
+        """
+        Run all the strategies over the observations.
+
+        Returns:
+            pd.DataFrame: comparative report, one row per strategy plus the market (price) row
+        """
+        self._share_features(observations)
+        self.strategies = self._create_strategies()
+        strategies = list(self.strategies.values())
+        balances = np.zeros((len(strategies), len(observations)))
+        rebalances = np.zeros(len(strategies), dtype=np.int64)
+        self.stop_reasons = {}
+        if self.stop_rules is None:
+            for t, observation in enumerate(observations):
+                for k, strategy in enumerate(strategies):
+                    balances[k, t], rebalanced = self._step(strategy, observation)
+                    rebalances[k] += rebalanced
+        else:
+            self._run_guarded(strategies, observations, balances, rebalances)
+
+        self.balances = balances
+        return self.report(balances, rebalances)
+
+    def _run_guarded(self, strategies: List[BaseStrategy], observations: List[Observation],
+                     balances: np.ndarray, rebalances: np.ndarray) -> None:
+        names = list(self.strategies)
+        guards = [EarlyStopGuard(self.stop_rules) for _ in strategies]
+        live = list(range(len(strategies)))
+        for t, observation in enumerate(observations):
+            if not live:
+                break
+            stepped = {}
+            for k in live:
+                balances[k, t], stepped[k] = self._step(strategies[k], observation)
+                rebalances[k] += stepped[k]
+            best = balances[live, t].max()
+            for k in live:
+                reason = guards[k].check(observation.timestamp, balances[k, t], stepped[k], best)
+                if reason is not None:
+                    self.stop_reasons[names[k]] = reason
+                    balances[k, t + 1:] = balances[k, t]
+            live = [k for k in live if names[k] not in self.stop_reasons]
+
+    def report(self, balances: np.ndarray, rebalances: np.ndarray) -> pd.DataFrame:
+        metrics = balance_metrics(self.features.timestamps, balances)
+        market = balance_metrics(self.features.timestamps, self.features.price)
+        report = pd.DataFrame({
+            'final_balance': balances[:, -1],
+            'rebalances': rebalances,
+            **metrics,
+        }, index=list(self.strategies))
+        report.loc['MARKET'] = {'final_balance': np.nan, 'rebalances': 0,
+                                **{name: value[0] for name, value in market.items()}}
+        report['realized_vol'] = self.features.log_returns[1:].std(ddof=1)
+        if self.stop_rules is not None:
+            report['pruned'] = [name in self.stop_reasons for name in report.index]
+            report['stop_reason'] = [self.stop_reasons.get(name, '') for name in report.index]
+        return report
+
+
+class ThreadedStrategyRunner(MultiStrategyRunner):
+    """
+    Runs many strategy instances concurrently in a thread pool of one process.
+
+    Every instance carries its own pool config and run state, so instances
+    of different strategies and configs run side by side; they all read the
+    same observation list, global state objects and FeatureStore, nothing is
+    copied per thread; the windows of all the specs are precomputed before
+    the threads start. The report is that of MultiStrategyRunner.
+
+    With `stop_rules` dominance is checked against the best strategy
+    finished so far (a shared `BestCurve`).
+    """
+    def __init__(self, specs: List[StrategySpec], max_workers: Optional[int] = None,
+                 stop_rules: Optional[StopRules] = None, feature_store: Optional[FeatureStore] = None,
+                 **strategy_kwargs):
+        super().__init__(specs, stop_rules, feature_store, **strategy_kwargs)
+        self.max_workers: int = max_workers or os.cpu_count()
+        self.best_curve: BestCurve = BestCurve()
+
+    def _run_strategy(self, name: str, strategy: BaseStrategy,
+                      observations: List[Observation]) -> Tuple[np.ndarray, int]:
+        balances = np.zeros(len(observations))
+        rebalances = 0
+        guard = EarlyStopGuard(self.stop_rules, self.best_curve) if self.stop_rules is not None else None
+        for t, observation in enumerate(observations):
+            balances[t], rebalanced = self._step(strategy, observation)
+            rebalances += rebalanced
+            if guard is not None:
+                reason = guard.check(observation.timestamp, balances[t], rebalanced)
+                if reason is not None:
+                    self.stop_reasons[name] = reason
+                    balances[t + 1:] = balances[t]
+                    return balances, rebalances
+        if guard is not None:
+            self.best_curve.offer(guard.start, balances)
+        return balances, rebalances
+
+    def run(self, observations: List[Observation]) -> pd.DataFrame:
+        self._share_features(observations)
+        self.strategies = self._create_strategies()
+        self.stop_reasons = {}
+        self.best_curve = BestCurve()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            outcomes = list(executor.map(lambda item: self._run_strategy(*item, observations),
+                                         self.strategies.items()))
+        balances = np.array([balances for balances, _ in outcomes]).reshape(len(outcomes), len(observations))
+        rebalances = np.array([rebalances for _, rebalances in outcomes], dtype=np.int64)
+        self.balances = balances
+        return self.report(balances, rebalances)
+
+
+if __name__ == '__main__':
+    from Classic_tau_reset.tau_strategy import TauResetParams, TauResetStrategy
+    from Distributed_tau_reset.dist_tau_reset import DistTauResetParams, DistTauResetStrategy
+    from Volatility_tau_reset.vol_tau_reset import VolTauResetParams, VolTauResetStrategy
+    from Combined_tau_reset.merged_tau_reset import MergedTauResetParams, MergedTauResetStrategy
+
+    ticker: str = 'ETHUSDT'
+    pool_address: str = '0x8ad599c3a0ff1de082011efddc58f1908eb6e6d8'
+    THE_GRAPH_API_KEY = os.getenv('THE_GRAPH_API_KEY')
+
+    observations: List[Observation] = build_observations(
+        ticker=ticker, pool_address=pool_address, api_key=THE_GRAPH_API_KEY,
+        start_time=datetime(2025, 1, 11, tzinfo=UTC), end_time=datetime(2025, 2, 11, tzinfo=UTC),
+        fidelity='hour'
+    )
+    runner = MultiStrategyRunner([
+        StrategySpec('classic', TauResetStrategy, TauResetParams(TAU=90, INITIAL_BALANCE=1_000_000)),
+        StrategySpec('distributed', DistTauResetStrategy,
+                     DistTauResetParams(TAU=30, BINS=3, INFO_TIME=24*30, U=1, INITIAL_BALANCE=1_000_000)),
+        StrategySpec('volatility', VolTauResetStrategy,
+                     VolTauResetParams(C=5000, ALPHA=0.9, INFO_TIME=24*30, INITIAL_BALANCE=1_000_000)),
+        StrategySpec('combined', MergedTauResetStrategy,
+                     MergedTauResetParams(C=5000, ALPHA=1, BINS=3, U=1, INFO_TIME=24*30, INITIAL_BALANCE=1_000_000)),
+    ], token0_decimals=6, token1_decimals=18, tick_spacing=60)
+    report = runner.run(observations)
+    print(report)
+    report.to_csv('tau_strategies_report.csv')
@@ -0,0 +1,133 @@
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from fractal.loaders.base_loader import LoaderType
+from fractal.loaders.thegraph.uniswap_v3 import (
+    UniswapV3EthereumPoolHourDataLoader, UniswapV3EthereumPoolMinuteDataLoader
+)
+from fractal.loaders.binance import BinanceHourPriceLoader, BinanceMinutePriceLoader
+from fractal.loaders.structs import PriceHistory, PoolHistory
+
+from fractal.core.base import Observation
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Modified_entity.compact_states import CompactGlobalState
+
+
+def join_histories(pool_data: PoolHistory, price_data: PriceHistory) -> pd.DataFrame:
+    """
+    Pool and price history joined on the timestamps, rows with missing values or no tvl dropped.
+    """
+    observations_df: pd.DataFrame = pool_data.join(price_data)
+    observations_df = observations_df.dropna()
+    observations_df = observations_df[observations_df.tvl > 0]
+    return observations_df.sort_index()
+
+
+def get_observations(
+        pool_data: PoolHistory, price_data: PriceHistory,
+        start_time: datetime = None, end_time: datetime = None
+    ) -> List[Observation]:
+    observations_df = join_histories(pool_data, price_data).loc[start_time:end_time]
+    # column-wise instead of iterrows: no per-row Series, plain Python floats in the states
+    columns = [observations_df[name].to_numpy(dtype=np.float64).tolist()
+               for name in ('tvl', 'volume', 'fees', 'liquidity', 'price')]
+    return [
+        Observation(
+            timestamp=timestamp,
+            states={
+                'UNISWAP_V3': CompactGlobalState(price=price, tvl=tvls, volume=volume, fees=fees, liquidity=liquidity),
+            }
+        ) for timestamp, tvls, volume, fees, liquidity, price in zip(observations_df.index, *columns)
+    ]
+
+
+def build_observations(
+        ticker: str, pool_address: str, api_key: str,
+        start_time: datetime = None, end_time: datetime = None, fidelity: str = 'hour',
+        pyramid: Optional[str] = None,
+    ) -> List[Observation]:
+    """
+    Observations of the pool at the given fidelity.
+
+    With `pyramid` (a cache file path) any fidelity of `pyramid.FIDELITIES`
+    is served from the resolution pyramid, which is built from the minute
+    data on the first call.
+    """
+    if pyramid is not None:
+        from Backtest_tools.pyramid import ObservationPyramid, build_pyramid
+        if os.path.exists(pyramid):
+            cache = ObservationPyramid.load(pyramid)
+        else:
+            cache = build_pyramid(ticker, pool_address, api_key, pyramid, start_time, end_time)
+        return cache.observations(fidelity, start_time, end_time)
+    if fidelity == 'hour':
+        pool_data: PoolHistory = UniswapV3EthereumPoolHourDataLoader(
+            api_key, pool_address, loader_type=LoaderType.CSV).read(with_run=True)
+        binance_prices: PriceHistory = BinanceHourPriceLoader(ticker, loader_type=LoaderType.CSV).read(with_run=True)
+    elif fidelity == 'minute':
+        pool_data: PoolHistory = UniswapV3EthereumPoolMinuteDataLoader(
+            api_key, pool_address, loader_type=LoaderType.CSV).read(with_run=True)
+        binance_prices: PriceHistory = BinanceMinutePriceLoader(ticker, loader_type=LoaderType.CSV,
+                                                                start_time=start_time, end_time=end_time).read(with_run=True)
+    else:
+        raise ValueError("Fidelity must be either 'hour' or 'minute'.")
+    return get_observations(pool_data, binance_prices, start_time, end_time)
+
+
+@dataclass
+class ObservationArrays:
+    """
+    Column view of an observation list with per-step derived features.
+
+    Attributes:
+        timestamps (np.ndarray): The observation timestamps (datetime64[ns]).
+        price (np.ndarray): The pool price [token1 / token0].
+        fees (np.ndarray): The trading fees.
+        liquidity (np.ndarray): The pool liquidity.
+        volume (np.ndarray): The trading volume.
+        tvl (np.ndarray): The total value locked.
+        log_returns (np.ndarray): log(price[t]) - log(price[t - 1]), 0 at t = 0.
+        diff_returns (np.ndarray): price[t] - price[t - 1], 0 at t = 0.
+    """
+    timestamps: np.ndarray
+    price: np.ndarray
+    fees: np.ndarray
+    liquidity: np.ndarray
+    volume: np.ndarray
+    tvl: np.ndarray
+    log_returns: np.ndarray
+    diff_returns: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    @classmethod
+    def from_observations(cls, observations: List[Observation], entity_name: str = 'UNISWAP_V3') -> 'ObservationArrays':
+        states = [observation.states[entity_name] for observation in observations]
+        price = np.array([state.price for state in states], dtype=np.float64)
+        log_returns = np.zeros_like(price)
+        diff_returns = np.zeros_like(price)
+        log_price = np.log(price)
+        log_returns[1:] = log_price[1:] - log_price[:-1]
+        diff_returns[1:] = price[1:] - price[:-1]
+        timestamps = pd.DatetimeIndex([observation.timestamp for observation in observations]).as_unit('ns')
+        if timestamps.tz is not None:
+            timestamps = timestamps.tz_convert(None)
+        return cls(
+            timestamps=timestamps.to_numpy(),
+            price=price,
+            fees=np.array([state.fees for state in states], dtype=np.float64),
+            liquidity=np.array([state.liquidity for state in states], dtype=np.float64),
+            volume=np.array([state.volume for state in states], dtype=np.float64),
+            tvl=np.array([state.tvl for state in states], dtype=np.float64),
+            log_returns=log_returns,
+            diff_returns=diff_returns,
+        )
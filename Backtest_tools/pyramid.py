@@ -0,0 +1,192 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from fractal.core.base import Observation
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Modified_entity.compact_states import CompactBarState
+
+
+# fidelity -> pandas resample rule, finest first
+FIDELITIES: Dict[str, str] = {'1m': '1min', '5m': '5min', '15m': '15min', '1h': '1h', '1d': '1D'}
+ALIASES: Dict[str, str] = {'minute': '1m', 'hour': '1h', 'day': '1d'}
+COLUMNS = ('open', 'high', 'low', 'close', 'fees', 'volume', 'liquidity', 'tvl', 'count')
+
+
+def resolve_fidelity(fidelity: str) -> str:
+    fidelity = ALIASES.get(fidelity, fidelity)
+    if fidelity not in FIDELITIES:
+        raise ValueError(f"Unknown fidelity {fidelity}, expected one of {list(FIDELITIES) + list(ALIASES)}")
+    return fidelity
+
+
+@dataclass
+class PyramidLevel:
+    """
+    Bars of one resolution of the pyramid.
+
+    Attributes:
+        timestamps (np.ndarray): Bar open times, int64 nanoseconds since the epoch (UTC).
+        open (np.ndarray): First price of the bar.
+        high (np.ndarray): Highest price of the bar.
+        low (np.ndarray): Lowest price of the bar.
+        close (np.ndarray): Last price of the bar.
+        fees (np.ndarray): Fees summed over the bar.
+        volume (np.ndarray): Volume summed over the bar.
+        liquidity (np.ndarray): Pool liquidity at the bar close.
+        tvl (np.ndarray): Total value locked at the bar close.
+        count (np.ndarray): Number of finest observations in the bar.
+    """
+    timestamps: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    fees: np.ndarray
+    volume: np.ndarray
+    liquidity: np.ndarray
+    tvl: np.ndarray
+    count: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def to_frame(self, tz: Optional[str] = 'UTC') -> pd.DataFrame:
+        index = pd.DatetimeIndex(self.timestamps.astype('datetime64[ns]'))
+        if tz is not None:
+            index = index.tz_localize('UTC').tz_convert(tz)
+        return pd.DataFrame({name: getattr(self, name) for name in COLUMNS}, index=index)
+
+
+class ObservationPyramid:
+    """
+    Observations of one pool at several resolutions, built once from the finest data.
+
+    Every level is resampled from the finest observations (bars labelled by
+    their open time, as the hourly loaders do): OHLC price, fees and volume
+    summed, liquidity and tvl of the bar close. All levels are stored in one
+    `.npz` file, so any fidelity is served without downloading or parsing,
+    and a sweep can screen a grid on coarse bars before running the best
+    points on fine ones. Observations are `CompactBarState`s with the close
+    as price and the low/high as price_min/price_max.
+    """
+    def __init__(self, levels: Dict[str, PyramidLevel], tz: Optional[str] = 'UTC'):
+        self.levels: Dict[str, PyramidLevel] = levels
+        self.tz: Optional[str] = tz
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, fidelities: Sequence[str] = tuple(FIDELITIES)) -> 'ObservationPyramid':
+        """
+        Build from a frame of the finest observations (price, fees, volume, liquidity, tvl columns).
+        """
+        frame = frame.sort_index()
+        tz = None if frame.index.tz is None else str(frame.index.tz)
+        levels = {}
+        for fidelity in (resolve_fidelity(fidelity) for fidelity in fidelities):
+            resampler = frame.resample(FIDELITIES[fidelity])
+            ohlc = resampler['price'].ohlc()
+            bars = pd.DataFrame({
+                'open': ohlc['open'], 'high': ohlc['high'], 'low': ohlc['low'], 'close': ohlc['close'],
+                'fees': resampler['fees'].sum(), 'volume': resampler['volume'].sum(),
+                'liquidity': resampler['liquidity'].last(), 'tvl': resampler['tvl'].last(),
+                'count': resampler['price'].count(),
+            })
+            bars = bars[bars['count'] > 0]
+            index = bars.index if bars.index.tz is None else bars.index.tz_convert(None)
+            levels[fidelity] = PyramidLevel(
+                timestamps=index.as_unit('ns').asi8,
+                **{name: bars[name].to_numpy(dtype=np.float64) for name in COLUMNS[:-1]},
+                count=bars['count'].to_numpy(dtype=np.int64),
+            )
+        return cls(levels, tz)
+
+    def save(self, path: str) -> None:
+        arrays = {f'{fidelity}/{name}': getattr(level, name)
+                  for fidelity, level in self.levels.items() for name in ('timestamps',) + COLUMNS}
+        arrays['tz'] = np.array(self.tz or '')
+        # write then rename, so a reader never sees a half-written cache
+        tmp_path = f'{path}.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'ObservationPyramid':
+        with np.load(path) as data:
+            fidelities = sorted({key.split('/')[0] for key in data.files if '/' in key},
+                                key=list(FIDELITIES).index)
+            levels = {
+                fidelity: PyramidLevel(**{name: data[f'{fidelity}/{name}'] for name in ('timestamps',) + COLUMNS})
+                for fidelity in fidelities
+            }
+            tz = str(data['tz']) or None
+        return cls(levels, tz)
+
+    def level(self, fidelity: str) -> PyramidLevel:
+        fidelity = resolve_fidelity(fidelity)
+        if fidelity not in self.levels:
+            raise ValueError(f"Fidelity {fidelity} is not in the pyramid ({list(self.levels)})")
+        return self.levels[fidelity]
+
+    def _bounds(self, level: PyramidLevel, start_time: Optional[datetime], end_time: Optional[datetime]):
+        def to_ns(moment) -> int:
+            moment = pd.Timestamp(moment)
+            if moment.tz is None and self.tz is not None:
+                moment = moment.tz_localize(self.tz)
+            return (moment.tz_convert(None) if moment.tz is not None else moment).as_unit('ns').value
+        start = 0 if start_time is None else np.searchsorted(level.timestamps, to_ns(start_time), side='left')
+        stop = len(level) if end_time is None else np.searchsorted(level.timestamps, to_ns(end_time), side='right')
+        return int(start), int(stop)
+
+    def frame(self, fidelity: str, start_time: Optional[datetime] = None,
+              end_time: Optional[datetime] = None) -> pd.DataFrame:
+        level = self.level(fidelity)
+        start, stop = self._bounds(level, start_time, end_time)
+        return level.to_frame(self.tz).iloc[start:stop]
+
+    def observations(self, fidelity: str, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None,
+                     entity_name: str = 'UNISWAP_V3') -> List[Observation]:
+        """
+        Observations of one fidelity between `start_time` and `end_time` (inclusive, like `get_observations`).
+        """
+        level = self.level(fidelity)
+        start, stop = self._bounds(level, start_time, end_time)
+        index = pd.DatetimeIndex(level.timestamps[start:stop].astype('datetime64[ns]'))
+        if self.tz is not None:
+            index = index.tz_localize('UTC').tz_convert(self.tz)
+        columns = [getattr(level, name)[start:stop].tolist()
+                   for name in ('tvl', 'volume', 'fees', 'liquidity', 'close', 'low', 'high', 'count', 'open')]
+        return [
+            Observation(
+                timestamp=timestamp,
+                states={entity_name: CompactBarState(
+                    tvl=tvl, volume=volume, fees=fees, liquidity=liquidity, price=close,
+                    price_min=low, price_max=high, count=count, price_open=open_)}
+            ) for timestamp, tvl, volume, fees, liquidity, close, low, high, count, open_ in zip(index, *columns)
+        ]
+
+
+def build_pyramid(ticker: str, pool_address: str, api_key: str, path: str,
+                  start_time: datetime = None, end_time: datetime = None,
+                  fidelities: Sequence[str] = tuple(FIDELITIES)) -> ObservationPyramid:
+    """
+    Download the minute pool and price data once and store its pyramid in `path`.
+    """
+    from fractal.loaders.base_loader import LoaderType
+    from fractal.loaders.binance import BinanceMinutePriceLoader
+    from fractal.loaders.thegraph.uniswap_v3 import UniswapV3EthereumPoolMinuteDataLoader
+    from Backtest_tools.observations import join_histories
+
+    pool_data = UniswapV3EthereumPoolMinuteDataLoader(
+        api_key, pool_address, loader_type=LoaderType.CSV).read(with_run=True)
+    prices = BinanceMinutePriceLoader(ticker, loader_type=LoaderType.CSV,
+                                      start_time=start_time, end_time=end_time).read(with_run=True)
+    pyramid = ObservationPyramid.from_frame(join_histories(pool_data, prices).loc[start_time:end_time], fidelities)
+    pyramid.save(path)
+    return pyramid
@@ -0,0 +1,166 @@
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+from fractal.core.base import BaseStrategy, Observation
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Modified_entity.uniswap_v3_lp_modified import UniswapV3LPEntity
+from Backtest_tools.execution import execute_actions
+from Backtest_tools.metrics import balance_metrics
+from Backtest_tools.fee_growth import liquidity_delta
+from Backtest_tools.observations import ObservationArrays
+
+
+class RangeExitIndex:
+    """
+    Segment tree of the price range minimum and maximum.
+
+    `first_exit(t, lo, hi)` returns the first index after `t` whose price is
+    outside `[lo, hi]` in O(log n): the query climbs from the leaf of `t + 1`
+    to the first subtree containing an exit and descends into it.
+    Padding leaves hold +inf/-inf, so they never exit.
+    """
+    def __init__(self, prices: np.ndarray):
+        prices = np.asarray(prices, dtype=np.float64)
+        self.n: int = len(prices)
+        size = 1
+        while size < max(self.n, 1):
+            size *= 2
+        self._size: int = size
+        self._min = np.full(2 * size, np.inf)
+        self._max = np.full(2 * size, -np.inf)
+        self._min[size:size + self.n] = prices
+        self._max[size:size + self.n] = prices
+        # build level by level from the leaves
+        level = size
+        while level > 1:
+            parents = np.arange(level // 2, level)
+            self._min[parents] = np.minimum(self._min[2 * parents], self._min[2 * parents + 1])
+            self._max[parents] = np.maximum(self._max[2 * parents], self._max[2 * parents + 1])
+            level //= 2
+
+    def first_exit(self, t: int, lo: float, hi: float) -> int:
+        """
+        Returns the first index j > t with price[j] < lo or price[j] > hi, `n` if there is none.
+        """
+        if t + 1 >= self.n:
+            return self.n
+        node = t + 1 + self._size
+        minimum, maximum = self._min, self._max
+        while not (minimum[node] < lo or maximum[node] > hi):
+            # next subtree to the right: climb while the node is a right child
+            while node & 1:
+                node >>= 1
+            if node == 0:
+                return self.n
+            node += 1
+        while node < self._size:
+            node *= 2
+            if not (minimum[node] < lo or maximum[node] > hi):
+                node += 1
+        return node - self._size
+
+
+def accrue_span(entity: UniswapV3LPEntity, arrays: ObservationArrays, start: int, stop: int) -> np.ndarray:
+    """
+    Bulk `update_state` of the entity over observations [start, stop) with unchanged positions.
+
+    The token amounts and the in-range fees of every position are computed
+    for all the steps at once, the fees are added to cash and the entity is
+    left revalued at the price of `stop - 1` (its global state is set by the caller).
+
+    Returns:
+        np.ndarray: entity balance after each step of the span
+    """
+    price = arrays.price[start:stop]
+    pool_fees = arrays.fees[start:stop]
+    pool_liquidity = arrays.liquidity[start:stop]
+    cash = entity.internal_state.cash
+    step_fees = np.zeros(stop - start)
+    value = np.zeros(stop - start)
+    if entity.is_position:
+        sqrt_p = np.sqrt(price)
+        for position in entity.internal_state.positions:
+            pl, pu, liquidity = position.price_lower, position.price_upper, position.liquidity
+            if position.tick_lower is None:
+                sqrt_pl, sqrt_pu = pl**0.5, pu**0.5
+            else:
+                sqrt_pl, sqrt_pu = entity.tick_sqrt_prices(position.tick_lower, position.tick_upper)
+            below = price <= pl
+            inside = (pl < price) & (price < pu)
+            token0 = np.where(below, 0.0, liquidity * np.where(inside, sqrt_p - sqrt_pl, sqrt_pu - sqrt_pl))
+            token1 = np.where(below, liquidity * (1 / sqrt_pl - 1 / sqrt_pu),
+                              np.where(inside, liquidity * (1 / sqrt_p - 1 / sqrt_pu), 0.0))
+            value += token0 + token1 * price
+            if inside.any():
+                delta = liquidity_delta(price, pl, pu, token0, token1, entity.token0_decimals, entity.token1_decimals)
+                fees = pool_fees * (delta / (pool_liquidity + delta))
+                step_fees += np.where(inside, np.minimum(fees, pool_fees), 0.0)
+            position.token0_amount = float(token0[-1])
+            position.token1_amount = float(token1[-1])
+    cash_after = np.cumsum(np.concatenate([[cash], step_fees]))[1:]
+    entity.internal_state.cash = float(cash_after[-1])
+    return value + cash_after
+
+
+@dataclass
+class SkipRunResult:
+    """
+    Result of a run that skipped idle observations.
+
+    Attributes:
+        timestamps (np.ndarray): The observation timestamps (datetime64[ns]).
+        balances (np.ndarray): The entity balance after every observation, skipped ones included.
+        steps (int): Number of observations the strategy was stepped on.
+    """
+    timestamps: np.ndarray
+    balances: np.ndarray
+    steps: int
+
+    def get_metrics(self):
+        return {name: float(value[0]) for name, value in balance_metrics(self.timestamps, self.balances).items()}
+
+
+def run_with_skips(strategy: BaseStrategy, observations: List[Observation],
+                   entity_name: str = 'UNISWAP_V3') -> SkipRunResult:
+    """
+    Run a single-entity strategy, jumping over the observations where it would do nothing.
+
+    After each step the strategy is asked for the next observation that needs
+    its `predict` via `idle_until(index, t)`; the observations in between are
+    accrued in bulk by `accrue_span` (and pushed to the entity history and
+    journal) and handed to `skip(prices)` so the strategy can update its
+    counters. Strategies without these hooks are stepped on every observation.
+
+    Returns:
+        SkipRunResult: balances of every observation
+    """
+    arrays = ObservationArrays.from_observations(observations, entity_name)
+    index = RangeExitIndex(arrays.price)
+    entity = strategy.get_entity(entity_name)
+    idle_until = getattr(strategy, 'idle_until', None)
+    n = len(observations)
+    balances = np.empty(n)
+    steps = 0
+    t = 0
+    while t < n:
+        entity.update_state(observations[t].states[entity_name])
+        execute_actions(strategy, strategy.predict())
+        balances[t] = entity.balance
+        steps += 1
+        stop = t + 1 if idle_until is None else max(min(idle_until(index, t), n), t + 1)
+        if stop > t + 1:
+            balances[t + 1:stop] = accrue_span(entity, arrays, t + 1, stop)
+            entity.revalue(observations[stop - 1].states[entity_name])
+            if entity.history is not None:
+                entity.history.extend(price=arrays.price[t + 1:stop], fees=arrays.fees[t + 1:stop],
+                                      liquidity=arrays.liquidity[t + 1:stop])
+            if entity.journal is not None:
+                entity.journal.step(stop - t - 1)
+            strategy.skip(arrays.price[t + 1:stop])
+        t = stop
+    return SkipRunResult(timestamps=arrays.timestamps, balances=balances, steps=steps)
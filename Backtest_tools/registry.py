@@ -0,0 +1,153 @@
+import importlib
+import itertools
+import json
+import os
+import sys
+from dataclasses import dataclass
+from datetime import datetime, date, UTC
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+
+# name -> (module, strategy class, params class), imported only when selected
+STRATEGIES: Dict[str, Tuple[str, str, str]] = {
+    'classic': ('Classic_tau_reset.tau_strategy', 'TauResetStrategy', 'TauResetParams'),
+    'distributed': ('Distributed_tau_reset.dist_tau_reset', 'DistTauResetStrategy', 'DistTauResetParams'),
+    'volatility': ('Volatility_tau_reset.vol_tau_reset', 'VolTauResetStrategy', 'VolTauResetParams'),
+    'merged': ('Combined_tau_reset.merged_tau_reset', 'MergedTauResetStrategy', 'MergedTauResetParams'),
+}
+
+
+@dataclass
+class CliConfig:
+    """
+    Parsed config file of the CLI.
+
+    Attributes:
+        strategy (str): The strategy name, a key of STRATEGIES.
+        data (Dict[str, Any]): build_observations arguments (ticker, pool_address, start_time, end_time, fidelity).
+        pool (Dict[str, int]): token0_decimals, token1_decimals and tick_spacing.
+        params (Dict[str, Any]): The strategy parameters of `run` and `bench`.
+        grid (Dict[str, List[Any]]): The parameters grid of `sweep`.
+        sweep (Dict[str, Any]): The sweep options (mlflow_uri, experiment_name, window_size, planner,
+            threads, canonical, screen, stop).
+        monte_carlo (Dict[str, Any]): Monte Carlo options of `sweep` (n_paths, block_size, length, seed, model),
+            empty to skip the robustness report.
+        walk_forward (Dict[str, Any]): Options of `walk-forward` (train_size, test_size, step, anchored,
+            warmup, metric, max_workers).
+    """
+    strategy: str
+    data: Dict[str, Any]
+    pool: Dict[str, int]
+    params: Dict[str, Any]
+    grid: Dict[str, List[Any]]
+    sweep: Dict[str, Any]
+    monte_carlo: Dict[str, Any]
+    walk_forward: Dict[str, Any]
+
+
+def _to_datetime(value) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return value if value.tzinfo is not None else value.replace(tzinfo=UTC)
+
+
+def load_config(path: str) -> CliConfig:
+    """
+    Read a TOML (.toml) or JSON config file.
+    """
+    path = Path(path)
+    if path.suffix == '.toml':
+        import tomllib
+        with open(path, 'rb') as f:
+            raw = tomllib.load(f)
+    else:
+        with open(path) as f:
+            raw = json.load(f)
+    return config_from_dict(raw)
+
+
+def config_from_dict(raw: Dict[str, Any]) -> CliConfig:
+    strategy = raw.get('strategy')
+    if strategy not in STRATEGIES:
+        raise ValueError(f"strategy must be one of {sorted(STRATEGIES)} - {strategy}")
+    data = dict(raw.get('data', {}))
+    for key in ('start_time', 'end_time'):
+        data[key] = _to_datetime(data.get(key))
+    return CliConfig(
+        strategy=strategy,
+        data=data,
+        pool=dict(raw.get('pool', {})),
+        params=dict(raw.get('params', {})),
+        grid={name: list(values) for name, values in raw.get('grid', {}).items()},
+        sweep=dict(raw.get('sweep', {})),
+        monte_carlo=dict(raw.get('monte_carlo', {})),
+        walk_forward=dict(raw.get('walk_forward', {})),
+    )
+
+
+def expand_grid(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """
+    Cartesian product of the grid values, in the order of sklearn's ParameterGrid (sorted keys).
+    """
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def resolve_strategy(name: str):
+    """
+    Import the strategy module and return the (strategy class, params class).
+    """
+    module_name, strategy_name, params_name = STRATEGIES[name]
+    module = importlib.import_module(module_name)
+    return getattr(module, strategy_name), getattr(module, params_name)
+
+
+def load_observations(config: CliConfig):
+    from Backtest_tools.observations import build_observations
+    observations = build_observations(api_key=os.getenv('THE_GRAPH_API_KEY'), **config.data)
+    assert len(observations) > 0
+    return observations
+
+
+def strategy_kwargs(pool: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Constructor kwargs of the strategy instances for a pool section (token decimals,
+    tick_spacing and align_ticks when given): pool settings go to the instance, the
+    strategy class is shared by the runs of other pools.
+    """
+    kwargs = dict(token0_decimals=pool['token0_decimals'], token1_decimals=pool['token1_decimals'],
+                  tick_spacing=pool.get('tick_spacing', 60))
+    if 'align_ticks' in pool:
+        kwargs['align_ticks'] = pool['align_ticks']
+    return kwargs
+
+
+def configure_strategy(config: CliConfig):
+    """
+    Resolve the strategy class, the params class and the pool kwargs of its
+    instances (`strategy_type(params=..., **kwargs)`), reading the token
+    decimals from the pool loader when the config does not give them.
+    """
+    strategy_type, params_type = resolve_strategy(config.strategy)
+    pool = config.pool
+    if 'token0_decimals' not in pool or 'token1_decimals' not in pool:
+        from fractal.loaders.base_loader import LoaderType
+        from fractal.loaders.thegraph.uniswap_v3 import EthereumUniswapV3Loader
+        pool['token0_decimals'], pool['token1_decimals'] = EthereumUniswapV3Loader(
+            os.getenv('THE_GRAPH_API_KEY'), loader_type=LoaderType.CSV).get_pool_decimals(config.data['pool_address'])
+    return strategy_type, params_type, strategy_kwargs(pool)
+
+
+def with_defaults(strategy_type, **defaults):
+    """
+    Subclass of the strategy with other class defaults, for pipelines that create the
+    instances themselves (fractal's DefaultPipeline); the strategy class is not modified.
+    """
+    return type(strategy_type.__name__, (strategy_type,), {**defaults, '__module__': strategy_type.__module__})
@@ -0,0 +1,198 @@
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from fractal.core.base import Observation
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Modified_entity.action_journal import ACTIONS, ActionJournal
+from Backtest_tools.metrics import balance_metrics
+from Backtest_tools.fee_growth import liquidity_delta
+from Backtest_tools.observations import ObservationArrays
+
+
+FEE_MODELS = ('share', 'first_order')
+DEPOSIT, WITHDRAW, OPEN_POSITION, CLOSE_POSITION, REBALANCE = range(len(ACTIONS))
+
+
+@dataclass
+class CostSettings:
+    """
+    Cost and fee settings a recorded run is repriced under.
+
+    Attributes:
+        trading_fee (float): The trading fee while opening/closing a position (UniswapV3LPConfig.trading_fee).
+        fees_rate (Optional[float]): The pool fee rate; the pool fees of the observations are scaled by
+            its ratio to the fees_rate of the recorded run. None keeps the recorded one.
+        fee_model (str): 'share' - fees * delta / (liquidity + delta) capped at the pool fees, as the entity;
+            'first_order' - fees * delta / liquidity, as the fee growth index (fee_growth.py).
+    """
+    trading_fee: float = 0.003
+    fees_rate: Optional[float] = None
+    fee_model: str = 'share'
+
+    def __post_init__(self):
+        if self.fee_model not in FEE_MODELS:
+            raise ValueError(f"Unknown fee model {self.fee_model}, expected one of {FEE_MODELS}")
+
+
+class _Ladder:
+    """
+    Open ranges of every setting: liquidity and token amounts of shape (S, R).
+    """
+    def __init__(self, n_settings: int):
+        self.price_lower = self.price_upper = self.sqrt_lower = self.sqrt_upper = np.empty(0)
+        self.liquidity = self.token0 = self.token1 = np.empty((n_settings, 0))
+
+    def add(self, ranges: np.ndarray, liquidity: np.ndarray, token0: np.ndarray, token1: np.ndarray) -> None:
+        self.price_lower = np.concatenate([self.price_lower, ranges['price_lower']])
+        self.price_upper = np.concatenate([self.price_upper, ranges['price_upper']])
+        self.sqrt_lower = np.concatenate([self.sqrt_lower, ranges['sqrt_lower']])
+        self.sqrt_upper = np.concatenate([self.sqrt_upper, ranges['sqrt_upper']])
+        self.liquidity = np.concatenate([self.liquidity, liquidity], axis=1)
+        self.token0 = np.concatenate([self.token0, token0], axis=1)
+        self.token1 = np.concatenate([self.token1, token1], axis=1)
+
+    def value(self, price: float) -> np.ndarray:
+        return self.token0.sum(axis=1) + self.token1.sum(axis=1) * price
+
+
+class RepricingEngine:
+    """
+    Replays the actions of a recorded run (ActionJournal) under other cost settings.
+
+    The positions are opened and revalued with the entity formulas and the
+    fees accrued as in `update_state`, for all the settings at once: an
+    action is one (S, R) array operation and a span between actions is
+    vectorized over its observations. Amounts opened as a part of the
+    entity cash are replayed as the same part of each setting's cash.
+
+    Repricing is exact only for strategies whose decisions do not depend on
+    the balance or the fees (all the tau-reset strategies of this repo,
+    their ranges and rebalance times depend only on prices). Journals of
+    intrabar entities are not supported.
+    """
+    def __init__(self, journal: ActionJournal, arrays: ObservationArrays, chunk: int = 65_536):
+        if journal.meta.get('intrabar'):
+            raise ValueError("Journals of intrabar entities can not be repriced")
+        self.journal: ActionJournal = journal
+        self.arrays: ObservationArrays = arrays
+        self.chunk: int = chunk
+        self.events: np.ndarray = journal.events
+        self.ranges: np.ndarray = journal.ranges
+        if len(self.events) and (self.events['t'].min() < 0 or self.events['t'].max() >= len(arrays)):
+            raise ValueError(f"Journal actions are outside the {len(arrays)} observations")
+
+    @classmethod
+    def from_observations(cls, journal: ActionJournal, observations: List[Observation],
+                          entity_name: str = 'UNISWAP_V3') -> 'RepricingEngine':
+        return cls(journal, ObservationArrays.from_observations(observations, entity_name))
+
+    def _accrue(self, ladder: _Ladder, start: int, stop: int, cash: np.ndarray, balances: np.ndarray,
+                fee_scale: np.ndarray, first_order: np.ndarray) -> np.ndarray:
+        # `update_state` of every setting over [start, stop), token amounts left at stop - 1
+        d0, d1 = self.journal.meta['token0_decimals'], self.journal.meta['token1_decimals']
+        for a in range(start, stop, self.chunk):
+            b = min(a + self.chunk, stop)
+            price = self.arrays.price[a:b]
+            pool_fees = fee_scale[:, None] * self.arrays.fees[a:b]
+            pool_liquidity = self.arrays.liquidity[a:b]
+            sqrt_p = np.sqrt(price)
+            value = np.zeros((len(cash), b - a))
+            step_fees = np.zeros((len(cash), b - a))
+            for r in range(ladder.liquidity.shape[1]):
+                pl, pu = ladder.price_lower[r], ladder.price_upper[r]
+                sqrt_pl, sqrt_pu = ladder.sqrt_lower[r], ladder.sqrt_upper[r]
+                liquidity = ladder.liquidity[:, r, None]
+                below = price <= pl
+                inside = (pl < price) & (price < pu)
+                token0 = np.where(below, 0.0, liquidity * np.where(inside, sqrt_p - sqrt_pl, sqrt_pu - sqrt_pl))
+                token1 = np.where(below, liquidity * (1 / sqrt_pl - 1 / sqrt_pu),
+                                  np.where(inside, liquidity * (1 / sqrt_p - 1 / sqrt_pu), 0.0))
+                value += token0 + token1 * price
+                if inside.any():
+                    delta = liquidity_delta(price, pl, pu, token0, token1, d0, d1)
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        fees = np.where(first_order[:, None], pool_fees * (delta / pool_liquidity),
+                                        np.minimum(pool_fees * (delta / (pool_liquidity + delta)), pool_fees))
+                    step_fees += np.where(inside, fees, 0.0)
+                ladder.token0[:, r], ladder.token1[:, r] = token0[:, -1], token1[:, -1]
+            cash_after = cash[:, None] + np.cumsum(step_fees, axis=1)
+            balances[:, a:b] = value + cash_after
+            cash = cash_after[:, -1].copy()
+        return cash
+
+    def _open(self, ladder: _Ladder, ranges: np.ndarray, cash: np.ndarray, price: float,
+              trading_fee: np.ndarray) -> np.ndarray:
+        # `calculate_positions_from_notional` for a share of every setting's cash
+        amounts = cash[:, None] * ranges['share']
+        sqrt_current = np.sqrt(price)
+        sqrt_lower, sqrt_upper = np.sqrt(ranges['price_lower']), np.sqrt(ranges['price_upper'])
+        below = price <= ranges['price_lower']
+        above = price >= ranges['price_upper']
+        fee = trading_fee[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = (sqrt_current - sqrt_lower) / (1 / sqrt_current - 1 / sqrt_upper)
+            inside_deposit = amounts / (ratio + price)
+            inside_liquidity = inside_deposit / (1 / sqrt_current - 1 / sqrt_upper)
+            below_deposit = amounts * (1 - fee)
+            token0 = np.where(below, 0.0, np.where(above, amounts, inside_liquidity * (sqrt_current - sqrt_lower)))
+            token1 = np.where(below, below_deposit / price, np.where(above, 0.0, inside_deposit * (1 - fee)))
+            liquidity = np.where(below, below_deposit / (1 / sqrt_lower - 1 / sqrt_upper) / price,
+                                 np.where(above, amounts / (sqrt_upper - sqrt_lower), inside_liquidity))
+        ladder.add(ranges, liquidity, token0, token1)
+        return cash - amounts.sum(axis=1)
+
+    def reprice(self, settings: Sequence[CostSettings]) -> np.ndarray:
+        """
+        Net balance curves of the recorded run under each of the settings.
+
+        Returns:
+            np.ndarray: balances of shape (S, T)
+        """
+        n_settings = len(settings)
+        recorded_fees_rate = self.journal.meta['fees_rate']
+        trading_fee = np.array([s.trading_fee for s in settings], dtype=np.float64)
+        fee_scale = np.array([1.0 if s.fees_rate is None else s.fees_rate / recorded_fees_rate for s in settings])
+        first_order = np.array([s.fee_model == 'first_order' for s in settings])
+
+        balances = np.empty((n_settings, len(self.arrays)))
+        cash = np.zeros(n_settings)
+        ladder: Optional[_Ladder] = None
+        start = 0
+        for t in np.unique(self.events['t']):
+            cash = self._accrue(ladder or _Ladder(n_settings), start, t + 1, cash, balances, fee_scale, first_order)
+            price = self.arrays.price[t]
+            for event in self.events[self.events['t'] == t]:
+                action = event['action']
+                ranges = self.ranges[event['first_range']:event['first_range'] + event['n_ranges']]
+                if action == DEPOSIT:
+                    cash = cash + event['amount']
+                elif action == WITHDRAW:
+                    cash = cash - event['amount']
+                elif action in (CLOSE_POSITION, REBALANCE) and ladder is not None:
+                    cash = (ladder.value(price) + cash) * (1 - trading_fee)
+                    ladder = None
+                if action in (OPEN_POSITION, REBALANCE):
+                    ladder = ladder or _Ladder(n_settings)
+                    cash = self._open(ladder, ranges, cash, price, trading_fee)
+            balances[:, t] = cash if ladder is None else ladder.value(price) + cash
+            start = t + 1
+        self._accrue(ladder or _Ladder(n_settings), start, len(self.arrays), cash, balances, fee_scale, first_order)
+        return balances
+
+    def report(self, settings: Sequence[CostSettings]) -> pd.DataFrame:
+        """
+        Final balance and default metrics of the recorded run under each of the settings, one row per setting.
+        """
+        balances = self.reprice(settings)
+        metrics = balance_metrics(self.arrays.timestamps, balances)
+        return pd.DataFrame({
+            **{name: [getattr(s, name) for s in settings] for name in asdict(CostSettings())},
+            'final_balance': balances[:, -1],
+            **metrics,
+        })
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import pandas as pd
+
+
+PARAM_PREFIX = 'p_'
+METRIC_PREFIX = 'm_'
+AGGREGATES = ('mean', 'max', 'min', 'count')
+_SQL_AGGREGATES = {'mean': 'AVG', 'max': 'MAX', 'min': 'MIN', 'count': 'COUNT', 'sum': 'SUM'}
+
+
+def _column(prefix: str, name: str) -> str:
+    if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', name):
+        raise ValueError(f"Invalid parameter or metric name {name!r}")
+    return f'"{prefix}{name}"'
+
+
+class ResultsDB:
+    """
+    Local store of backtest results: one row per run with a column per parameter and per metric.
+
+    Parameter and metric columns are added on first use and every one of them
+    is indexed, so top-k, marginal (GROUP BY parameter) and heatmap queries
+    over thousands of runs are answered from SQLite indexes in milliseconds.
+    A run is identified by its sweep and parameters: recording it again
+    replaces the previous row.
+    """
+    def __init__(self, path: str):
+        self.path: str = path
+        with self._connect() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    sweep_id TEXT NOT NULL,
+                    strategy TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    params TEXT NOT NULL,
+                    meta TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS runs_sweep ON runs (sweep_id, strategy);
+            """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.path, timeout=60.0)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _columns(self, connection: sqlite3.Connection) -> List[str]:
+        return [row[1] for row in connection.execute('PRAGMA table_info(runs)')]
+
+    def _ensure_columns(self, connection: sqlite3.Connection, prefix: str, names: Iterable[str]) -> None:
+        existing = set(self._columns(connection))
+        for name in names:
+            column = _column(prefix, name)
+            if column.strip('"') not in existing:
+                connection.execute(f'ALTER TABLE runs ADD COLUMN {column}')
+                connection.execute(f'CREATE INDEX IF NOT EXISTS "runs_{prefix}{name}" ON runs (sweep_id, {column})')
+                existing.add(column.strip('"'))
+
+    def record_many(self, sweep_id: str, strategy: str, runs: Sequence[Dict[str, Dict[str, Any]]]) -> int:
+        """
+        Record runs given as {'params': {...}, 'metrics': {...}, 'meta': {...}} dicts.
+
+        Returns:
+            int: number of recorded runs
+        """
+        if not runs:
+            return 0
+        with self._connect() as connection:
+            self._ensure_columns(connection, PARAM_PREFIX, sorted({name for run in runs for name in run['params']}))
+            self._ensure_columns(connection, METRIC_PREFIX, sorted({name for run in runs for name in run['metrics']}))
+            now = time.time()
+            for run in runs:
+                params, metrics = run['params'], run['metrics']
+                run_id = hashlib.sha1(json.dumps([sweep_id, strategy, params], sort_keys=True).encode()).hexdigest()
+                columns = (['run_id', 'sweep_id', 'strategy', 'created_at', 'params', 'meta']
+                           + [_column(PARAM_PREFIX, name) for name in params]
+                           + [_column(METRIC_PREFIX, name) for name in metrics])
+                values = ([run_id, sweep_id, strategy, now, json.dumps(params, sort_keys=True),
+                           json.dumps(run.get('meta', {}), default=str)]
+                          + list(params.values()) + [float(value) for value in metrics.values()])
+                connection.execute(
+                    f'INSERT OR REPLACE INTO runs ({", ".join(columns)}) VALUES ({", ".join("?" * len(values))})',
+                    values)
+        return len(runs)
+
+    def record(self, sweep_id: str, strategy: str, params: Dict[str, Any], metrics: Dict[str, float],
+               meta: Optional[Dict[str, Any]] = None) -> None:
+        self.record_many(sweep_id, strategy, [{'params': params, 'metrics': metrics, 'meta': meta or {}}])
+
+    def _where(self, sweep_id: Optional[str], where: Optional[Dict[str, Any]]):
+        clauses, args = [], []
+        if sweep_id is not None:
+            clauses.append('sweep_id = ?')
+            args.append(sweep_id)
+        for name, value in (where or {}).items():
+            clauses.append(f'{_column(PARAM_PREFIX, name)} = ?')
+            args.append(value)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', args
+
+    def _query(self, sql: str, args: List[Any]) -> pd.DataFrame:
+        with self._connect() as connection:
+            cursor = connection.execute(sql, args)
+            names = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+        names = [name[len(PARAM_PREFIX):] if name.startswith(PARAM_PREFIX) else
+                 name[len(METRIC_PREFIX):] if name.startswith(METRIC_PREFIX) else name for name in names]
+        return pd.DataFrame(rows, columns=names)
+
+    def top_k(self, metric: str, k: int = 10, sweep_id: Optional[str] = None,
+              where: Optional[Dict[str, Any]] = None, ascending: bool = False) -> pd.DataFrame:
+        """
+        The `k` best runs by a metric, with their parameters and metrics.
+        """
+        with self._connect() as connection:
+            columns = [name for name in self._columns(connection) if name.startswith((PARAM_PREFIX, METRIC_PREFIX))]
+        condition, args = self._where(sweep_id, where)
+        selected = ', '.join(['sweep_id', 'strategy'] + [f'"{name}"' for name in columns])
+        order = 'ASC' if ascending else 'DESC'
+        metric_column = _column(METRIC_PREFIX, metric)
+        condition += (' AND ' if condition else ' WHERE ') + f'{metric_column} IS NOT NULL'
+        return self._query(f'SELECT {selected} FROM runs{condition} ORDER BY {metric_column} {order} LIMIT ?',
+                           args + [k])
+
+    def marginals(self, param: str, metric: str, sweep_id: Optional[str] = None,
+                  where: Optional[Dict[str, Any]] = None, aggregates: Sequence[str] = AGGREGATES) -> pd.DataFrame:
+        """
+        Metric aggregates grouped by the values of one parameter.
+        """
+        condition, args = self._where(sweep_id, where)
+        param_column, metric_column = _column(PARAM_PREFIX, param), _column(METRIC_PREFIX, metric)
+        selected = ', '.join(f'{_SQL_AGGREGATES[agg]}({metric_column}) AS "{metric}_{agg}"' for agg in aggregates)
+        return self._query(
+            f'SELECT {param_column}, {selected} FROM runs{condition} GROUP BY {param_column} ORDER BY {param_column}',
+            args)
+
+    def heatmap(self, x: str, y: str, metric: str, sweep_id: Optional[str] = None,
+                where: Optional[Dict[str, Any]] = None, aggregate: str = 'max') -> pd.DataFrame:
+        """
+        Metric aggregate over a two-parameter slice: rows are `y` values, columns are `x` values.
+        """
+        condition, args = self._where(sweep_id, where)
+        x_column, y_column = _column(PARAM_PREFIX, x), _column(PARAM_PREFIX, y)
+        cells = self._query(
+            f'SELECT {x_column}, {y_column}, {_SQL_AGGREGATES[aggregate]}({_column(METRIC_PREFIX, metric)}) AS value '
+            f'FROM runs{condition} GROUP BY {x_column}, {y_column}', args)
+        return cells.pivot(index=y, columns=x, values='value')
+
+    def sweeps(self) -> pd.DataFrame:
+        return self._query('SELECT sweep_id, strategy, COUNT(*) AS runs, MAX(created_at) AS updated_at '
+                           'FROM runs GROUP BY sweep_id, strategy', [])
+
+
+def runs_from_report(report: pd.DataFrame, grid: List[Dict[str, Any]]) -> List[Dict[str, Dict[str, Any]]]:
+    """
+    Runs of a MultiStrategyRunner sweep report whose rows are labelled by the JSON of the grid params.
+    The stop reason of a pruned run goes to its meta.
+    """
+    report = report.drop(index='MARKET', errors='ignore')
+    runs = []
+    for params in grid:
+        row = report.loc[json.dumps(params, sort_keys=True)]
+        meta = {'stop_reason': row['stop_reason']} if row.get('pruned') else {}
+        metrics = {name: float(value) for name, value in row.items() if name != 'stop_reason'}
+        runs.append({'params': params, 'metrics': metrics, 'meta': meta})
+    return runs
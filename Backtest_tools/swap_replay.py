@@ -0,0 +1,185 @@
+from copy import deepcopy
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from fractal.core.base import BaseStrategy, Observation
+from fractal.core.base.strategy import StrategyResult
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Modified_entity.uniswap_v3_lp_modified import UniswapV3LPEntity
+from Backtest_tools.execution import execute_actions
+
+
+@dataclass
+class SwapEvents:
+    """
+    Column-oriented batch of pool swap events.
+
+    Attributes:
+        timestamps (np.ndarray): int64 epoch nanoseconds, sorted ascending.
+        price_before (np.ndarray): pool price [token1 / token0] before the swap.
+        price_after (np.ndarray): pool price [token1 / token0] after the swap.
+        amount (np.ndarray): swap amount in notional.
+        fee (np.ndarray): fee paid by the swap in notional.
+        liquidity (Optional[np.ndarray]): active pool liquidity at the swap,
+            the entity global state liquidity is used when omitted.
+    """
+    timestamps: np.ndarray
+    price_before: np.ndarray
+    price_after: np.ndarray
+    amount: np.ndarray
+    fee: np.ndarray
+    liquidity: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def slice(self, start: int, stop: int) -> 'SwapEvents':
+        """
+        Returns a view over [start, stop) events without copying the arrays.
+        """
+        return SwapEvents(
+            timestamps=self.timestamps[start:stop],
+            price_before=self.price_before[start:stop],
+            price_after=self.price_after[start:stop],
+            amount=self.amount[start:stop],
+            fee=self.fee[start:stop],
+            liquidity=None if self.liquidity is None else self.liquidity[start:stop],
+        )
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'SwapEvents':
+        """
+        Build events from a DataFrame indexed by timestamp with columns
+        price_before, price_after, amount, fee and optionally liquidity.
+        """
+        df = df.sort_index()
+        return cls(
+            timestamps=pd.DatetimeIndex(df.index).as_unit('ns').asi8,
+            price_before=df['price_before'].to_numpy(dtype=np.float64),
+            price_after=df['price_after'].to_numpy(dtype=np.float64),
+            amount=df['amount'].to_numpy(dtype=np.float64),
+            fee=df['fee'].to_numpy(dtype=np.float64),
+            liquidity=df['liquidity'].to_numpy(dtype=np.float64) if 'liquidity' in df else None,
+        )
+
+
+def _to_ns(timestamp: datetime) -> int:
+    return pd.Timestamp(timestamp).as_unit('ns').value
+
+
+class SwapReplayEngine:
+    """
+    Accrues fees of `UniswapV3LPEntity` positions from individual swap events.
+
+    A swap moving the price from `price_before` to `price_after` pays its fee
+    along the traversed sqrt-price path, so each position only receives the
+    part of the fee paid while the price was inside its range, scaled by the
+    position share of the pool liquidity (same share as `estimate_fee`).
+    Events are processed in vectorized batches of `batch_size`.
+    """
+    def __init__(self, entity: UniswapV3LPEntity, batch_size: int = 1 << 18):
+        self._entity: UniswapV3LPEntity = entity
+        self._batch_size: int = batch_size
+
+    def accrue(self, events: SwapEvents) -> float:
+        """
+        Accrue fees of all the events to the entity positions and cash.
+
+        Positions are assumed to stay unchanged over the events.
+
+        Args:
+            events (SwapEvents): swap events to replay
+
+        Returns:
+            float: total accrued fees
+        """
+        entity = self._entity
+        positions = entity.internal_state.positions
+        if not entity.is_position or not positions or len(events) == 0:
+            return 0.0
+
+        sqrt_lower = np.sqrt([position.price_lower for position in positions])
+        sqrt_upper = np.sqrt([position.price_upper for position in positions])
+        liquidity_delta = np.array([entity.get_position_liquidity_delta(position) for position in positions])
+        accrued = np.zeros(len(positions))
+
+        for start in range(0, len(events), self._batch_size):
+            batch = events.slice(start, start + self._batch_size)
+            s0 = np.sqrt(batch.price_before)
+            s1 = np.sqrt(batch.price_after)
+            lo = np.minimum(s0, s1)
+            hi = np.maximum(s0, s1)
+            path = hi - lo
+            pool_liquidity = entity.global_state.liquidity if batch.liquidity is None else batch.liquidity
+            for i in range(len(positions)):
+                overlap = np.clip(np.minimum(hi, sqrt_upper[i]) - np.maximum(lo, sqrt_lower[i]), 0, None)
+                # swaps that do not move the price pay the position only when it is in range
+                in_range = (sqrt_lower[i] < s0) & (s0 < sqrt_upper[i])
+                share = np.divide(overlap, path, out=in_range.astype(np.float64), where=path > 0)
+                fees = batch.fee * share * (liquidity_delta[i] / (pool_liquidity + liquidity_delta[i]))
+                accrued[i] += np.minimum(fees, batch.fee).sum()
+
+        for position, fees in zip(positions, accrued):
+            position.fees += fees
+        total = float(accrued.sum())
+        entity.internal_state.cash += total
+        return total
+
+    def run_strategy(self, strategy: BaseStrategy, observations: List[Observation],
+                     events: SwapEvents, entity_name: str = 'UNISWAP_V3') -> StrategyResult:
+        """
+        Run the strategy on bar observations with fees accrued from the swaps inside each bar.
+
+        For every observation the swaps in (previous timestamp, timestamp] are
+        replayed against the current positions, then the entity records the bar
+        state (history, journal) and is revalued at it, and the strategy decides
+        and executes its actions.
+
+        Args:
+            strategy (BaseStrategy): strategy registering `self._entity` under `entity_name`
+            observations (List[Observation]): bar observations
+            events (SwapEvents): swap events sorted by timestamp
+            entity_name (str): name of the replayed entity in the strategy
+
+        Returns:
+            StrategyResult: result in the same format as `BaseStrategy.run`
+        """
+        if strategy.get_entity(entity_name) is not self._entity:
+            raise ValueError(f"Entity {entity_name} of the strategy is not driven by this engine.")
+        bar_ends = np.array([_to_ns(observation.timestamp) for observation in observations], dtype=np.int64)
+        bounds = np.searchsorted(events.timestamps, bar_ends, side='right')
+
+        timestamps: List[datetime] = []
+        internal_states: List[Dict] = []
+        global_states: List[Dict] = []
+        balances: List[Dict[str, float]] = []
+        entities = strategy.get_all_available_entities()
+        start = 0
+        for observation, stop in zip(observations, bounds):
+            self.accrue(events.slice(start, stop))
+            start = stop
+            for name, state in observation.states.items():
+                if name == entity_name:
+                    self._entity.record_state(state)
+                    self._entity.revalue(state)
+                else:
+                    strategy.get_entity(name).update_state(state)
+            execute_actions(strategy, strategy.predict())
+
+            timestamps.append(observation.timestamp)
+            balances.append({name: entity.balance for name, entity in entities.items()})
+            internal_states.append({name: deepcopy(entity.internal_state) for name, entity in entities.items()})
+            global_states.append({name: entity.global_state for name, entity in entities.items()})
+        return StrategyResult(
+            timestamps=timestamps,
+            internal_states=internal_states,
+            global_states=global_states,
+            balances=balances
+        )
@@ -0,0 +1,224 @@
+import json
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from fractal.core.base import Observation
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Modified_entity.tick_math import get_sqrt_price_table, pool_sqrt_price, snap_range
+from Backtest_tools.registry import resolve_strategy, strategy_kwargs
+from Backtest_tools.execution import execute_actions
+from Backtest_tools.feature_store import FeatureStore
+from Backtest_tools.metrics import balance_metrics
+from Backtest_tools.monte_carlo import TauResetRule
+from Backtest_tools.range_index import RangeExitIndex, accrue_span
+
+
+def window_ends(n_observations: int, info_time: int) -> np.ndarray:
+    """
+    Indices of the observations where an INFO_TIME window completes (k * (INFO_TIME + 1) - 1).
+    """
+    return np.arange(info_time, n_observations, info_time + 1)
+
+
+class SweepPlanner:
+    """
+    Runs a parameter grid sharing the intermediate results of its points.
+
+    Every grid point is described by a `TauResetRule` and decomposed into
+    intermediates keyed by the parameters they depend on:
+
+    - window statistics and histograms: (INFO_TIME, U), (INFO_TIME, U, BINS),
+      kept in the `FeatureStore`;
+    - tau series, tau after each window: (INFO_TIME, U, C, ALPHA);
+    - rebalance schedule, the observations where the strategy rebalances:
+      TAU for the classic and distributed strategies (the distributed exit
+      only looks at the last center and TAU), the tau series key for the
+      volatility and merged ones.
+
+    Each intermediate is computed once per distinct key; the grid point tail
+    (bins weights, balances) replays only the schedule with the strategy's
+    own `_rebalance`, accruing the spans in between in bulk, so the results
+    are those of the step-by-step run.
+    """
+    def __init__(self, strategy: str, observations: List[Observation], pool: Dict[str, int],
+                 feature_store: Optional[FeatureStore] = None, entity_name: str = 'UNISWAP_V3'):
+        self.strategy: str = strategy
+        self.strategy_type, self.params_type = resolve_strategy(strategy)
+        self.pool: Dict[str, int] = pool
+        self.tick_spacing: int = pool.get('tick_spacing', 60)
+        self.align_ticks: bool = pool.get('align_ticks', self.strategy_type.align_ticks)
+        self.entity_name: str = entity_name
+        self.observations: List[Observation] = observations
+        self.feature_store: FeatureStore = feature_store or FeatureStore(observations, entity_name)
+        self.arrays = self.feature_store.arrays
+        self.index: RangeExitIndex = RangeExitIndex(self.arrays.price)
+        self._taus: Dict[Hashable, np.ndarray] = {}
+        self._schedules: Dict[Hashable, np.ndarray] = {}
+
+    def rule(self, params: Dict[str, Any]) -> TauResetRule:
+        return TauResetRule.from_params(self.strategy, params)
+
+    @staticmethod
+    def tau_key(rule: TauResetRule) -> Optional[Tuple]:
+        if rule.c is None:
+            return None
+        return rule.info_time, rule.u, rule.c, rule.alpha, rule.ddof
+
+    def schedule_key(self, rule: TauResetRule) -> Tuple:
+        tau = rule.tau if rule.c is None else self.tau_key(rule)
+        return rule.exit_from_center, tau
+
+    def plan(self, grid: List[Dict[str, Any]]) -> Dict[Tuple, List[Dict[str, Any]]]:
+        """
+        Grid points grouped by their shared rebalance schedule.
+        """
+        groups: Dict[Tuple, List[Dict[str, Any]]] = {}
+        for params in grid:
+            groups.setdefault(self.schedule_key(self.rule(params)), []).append(params)
+        return groups
+
+    def tau_series(self, rule: TauResetRule) -> np.ndarray:
+        """
+        tau set at each `window_ends` observation.
+        """
+        key = self.tau_key(rule)
+        if key not in self._taus:
+            ends = window_ends(len(self.arrays), rule.info_time)
+            stats = self.feature_store.window_stats(rule.info_time, rule.u)
+            std = stats.std_ddof1 if rule.ddof == 1 else stats.std
+            self._taus[key] = rule.c * (rule.alpha * std[ends] + (1 - rule.alpha) * stats.iqr[ends])
+        return self._taus[key]
+
+    def _tau_at(self, rule: TauResetRule, ends: np.ndarray, taus: np.ndarray, t: int) -> float:
+        i = np.searchsorted(ends, t, side='right') - 1
+        return taus[i] if i >= 0 else rule.tau
+
+    def _bounds(self, rule: TauResetRule, center: float, tau: float) -> Tuple[float, float]:
+        """
+        Range the exit is checked against: around the last center, or the
+        (tick-snapped) bounds of the opened position.
+        """
+        tick_spacing = self.tick_spacing
+        price_lower = center * 1.0001 ** (-tau * tick_spacing)
+        price_upper = center * 1.0001 ** (tau * tick_spacing)
+        if self.align_ticks and not rule.exit_from_center:
+            table = get_sqrt_price_table(tick_spacing)
+            token0_decimals, token1_decimals = self.pool['token0_decimals'], self.pool['token1_decimals']
+            tick_lower, tick_upper = snap_range(price_lower, price_upper, tick_spacing, token0_decimals, token1_decimals)
+            price_lower = pool_sqrt_price(table.sqrt_price_at(tick_upper), token0_decimals, token1_decimals)**2
+            price_upper = pool_sqrt_price(table.sqrt_price_at(tick_lower), token0_decimals, token1_decimals)**2
+        return float(price_lower), float(price_upper)
+
+    def schedule(self, rule: TauResetRule) -> np.ndarray:
+        """
+        Observation indices of the rebalances, the first opening included.
+        """
+        key = self.schedule_key(rule)
+        if key in self._schedules:
+            return self._schedules[key]
+        price = self.arrays.price
+        n = len(price)
+        ends = window_ends(n, rule.info_time) if rule.c is not None else np.empty(0, dtype=np.int64)
+        taus = self.tau_series(rule) if rule.c is not None else np.empty(0)
+        # the exit range moves with tau only when it is checked around the center
+        moving = rule.exit_from_center and rule.c is not None
+        events = []
+        t = 1
+        if n > 1:
+            events.append(t)
+            center, tau = price[t], self._tau_at(rule, ends, taus, t)
+            price_lower, price_upper = self._bounds(rule, center, tau)
+        while events:
+            k = np.searchsorted(ends, t, side='right')
+            next_window = int(ends[k]) if moving and k < len(ends) else n
+            j = self.index.first_exit(t, price_lower, price_upper)
+            if j < next_window:
+                events.append(j)
+                center, tau = price[j], self._tau_at(rule, ends, taus, j)
+                price_lower, price_upper = self._bounds(rule, center, tau)
+                t = j
+                continue
+            if next_window >= n:
+                break
+            t = next_window
+            tau = taus[k]
+            price_lower, price_upper = self._bounds(rule, center, tau)
+            if price[t] < price_lower or price[t] > price_upper:
+                events.append(t)
+                center = price[t]
+                price_lower, price_upper = self._bounds(rule, center, tau)
+        self._schedules[key] = np.asarray(events, dtype=np.int64)
+        return self._schedules[key]
+
+    def evaluate(self, params: Dict[str, Any]) -> np.ndarray:
+        """
+        Balance of the grid point after every observation.
+        """
+        rule = self.rule(params)
+        events = self.schedule(rule)
+        if rule.info_time is not None:
+            ends = window_ends(len(self.arrays), rule.info_time)
+        else:
+            ends = np.empty(0, dtype=np.int64)
+        taus = self.tau_series(rule) if rule.c is not None else None
+        histogram = (self.feature_store.histogram(rule.info_time, rule.u, rule.bins)
+                     if rule.histogram_weights else None)
+
+        strategy = self.strategy_type(params=self.params_type(**params),
+                                      **{**strategy_kwargs(self.pool), 'align_ticks': self.align_ticks})
+        entity = strategy.get_entity(self.entity_name)
+        states = [observation.states[self.entity_name] for observation in self.observations]
+        n = len(states)
+        balances = np.empty(n)
+        entity.update_state(states[0])
+        execute_actions(strategy, strategy._deposit_to_lp())
+        balances[0] = entity.balance
+        t = 0
+        for event in events.tolist() + [n]:
+            if event > t + 1:
+                balances[t + 1:event] = accrue_span(entity, self.arrays, t + 1, event)
+                entity.revalue(states[event - 1])
+            if event == n:
+                break
+            entity.update_state(states[event])
+            window = np.searchsorted(ends, event, side='right') - 1
+            if window >= 0:
+                if taus is not None:
+                    strategy.tau = taus[window]
+                if histogram is not None:
+                    strategy.distribution = list(histogram[ends[window]])
+            execute_actions(strategy, strategy._rebalance())
+            balances[event] = entity.balance
+            t = event
+        return balances
+
+    def run(self, grid: List[Dict[str, Any]]) -> pd.DataFrame:
+        """
+        Run the grid, schedule group by schedule group.
+
+        Returns:
+            pd.DataFrame: report in the `MultiStrategyRunner` format, rows labelled by the JSON of the params
+        """
+        labels, balances, rebalances = [], [], []
+        for group in self.plan(grid).values():
+            for params in group:
+                labels.append(json.dumps(params, sort_keys=True))
+                balances.append(self.evaluate(params))
+                rebalances.append(len(self.schedule(self.rule(params))))
+        balances = np.array(balances).reshape(len(labels), len(self.arrays))
+        metrics = balance_metrics(self.arrays.timestamps, balances)
+        market = balance_metrics(self.arrays.timestamps, self.arrays.price)
+        report = pd.DataFrame({
+            'final_balance': balances[:, -1],
+            'rebalances': np.asarray(rebalances, dtype=np.int64),
+            **metrics,
+        }, index=labels)
+        report.loc['MARKET'] = {'final_balance': np.nan, 'rebalances': 0,
+                                **{name: value[0] for name, value in market.items()}}
+        report['realized_vol'] = self.arrays.log_returns[1:].std(ddof=1)
+        return report
@@ -0,0 +1,183 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from fractal.core.base import Observation
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from Backtest_tools.registry import expand_grid, resolve_strategy, strategy_kwargs
+from Backtest_tools.metrics import balance_metrics
+from Backtest_tools.multi_runner import MultiStrategyRunner, StrategySpec
+
+
+@dataclass
+class Fold:
+    """
+    Represents one train/test split of the observations (half-open index ranges).
+
+    Attributes:
+        index (int): The fold number.
+        train_start (int): First train observation.
+        train_end (int): End of the train observations.
+        test_start (int): First test observation.
+        test_end (int): End of the test observations.
+    """
+    index: int
+    train_start: int
+    train_end: int
+    test_start: int
+    test_end: int
+
+
+def make_folds(n_observations: int, train_size: int, test_size: int, step: Optional[int] = None,
+               anchored: bool = False) -> List[Fold]:
+    """
+    Consecutive folds: train on `train_size` observations, test on the next `test_size`.
+
+    Args:
+        n_observations (int): number of observations
+        train_size (int): train length (the first train length when anchored)
+        test_size (int): test length
+        step (Optional[int]): shift between folds, `test_size` by default (tests do not overlap)
+        anchored (bool): keep every train starting at the first observation
+
+    Returns:
+        List[Fold]: folds, the last test is cut at the end of the observations
+    """
+    step = step or test_size
+    folds = []
+    test_start = train_size
+    while test_start < n_observations:
+        train_start = 0 if anchored else test_start - train_size
+        folds.append(Fold(len(folds), train_start, test_start, test_start, min(test_start + test_size, n_observations)))
+        test_start += step
+    return folds
+
+
+def _naive_timestamps(timestamps) -> np.ndarray:
+    index = pd.DatetimeIndex(timestamps)
+    return (index if index.tz is None else index.tz_convert(None)).to_numpy()
+
+
+def _run_fold(strategy: str, pool: Dict[str, int], grid: List[Dict[str, Any]], metric: str, fold: Fold,
+              observations: List[Observation]) -> Dict[str, Any]:
+    """
+    Grid search on the train part, then run the winner on warm-up + test.
+
+    `observations` holds the train observations followed by the warm-up and test ones.
+    """
+    strategy_type, params_type = resolve_strategy(strategy)
+    train = observations[:fold.train_end - fold.train_start]
+    test = observations[fold.train_end - fold.train_start:]
+    kwargs = strategy_kwargs(pool)
+
+    # the runner shares a FeatureStore of the train part with the grid instances
+    runner = MultiStrategyRunner([StrategySpec(str(i), strategy_type, params) for i, params in enumerate(grid)],
+                                 **kwargs)
+    report = runner.run(train).drop(index='MARKET')
+    best = int(report[metric].astype(float).idxmax())
+    train_metric = float(report.loc[str(best), metric])
+
+    if hasattr(strategy_type, 'feature_store'):
+        from Backtest_tools.feature_store import FeatureStore
+        kwargs['feature_store'] = FeatureStore(test)
+    result = strategy_type(params=params_type(**grid[best]), **kwargs).run(test)
+    offset = len(test) - (fold.test_end - fold.test_start)
+    return {
+        'fold': fold,
+        'params': grid[best],
+        'train_metric': train_metric,
+        'timestamps': np.array([observation.timestamp for observation in test[offset:]]),
+        'balances': np.array([sum(balance.values()) for balance in result.balances[offset:]]),
+    }
+
+
+@dataclass
+class WalkForwardResult:
+    """
+    Out-of-sample result of a walk-forward optimization.
+
+    Attributes:
+        folds (pd.DataFrame): One row per fold: ranges, chosen params, train metric and test metrics.
+        equity (pd.Series): Stitched out-of-sample equity curve indexed by timestamp.
+        metrics (Dict[str, float]): Metrics of the stitched curve.
+    """
+    folds: pd.DataFrame
+    equity: pd.Series
+    metrics: Dict[str, float]
+
+
+class WalkForwardOptimizer:
+    """
+    Walk-forward optimization of a tau strategy over consecutive train/test folds.
+
+    For every fold the whole grid is stepped in one pass over the train part
+    (MultiStrategyRunner), the best parameters by `metric` are run on the test
+    part and the test curves are chained into one out-of-sample equity curve,
+    each fold starting from the equity the previous one ended with. Folds are
+    independent and run in parallel processes.
+
+    Since the dynamic strategies need INFO_TIME observations before their first
+    window, the winner can be started `warmup` observations before the test
+    start; only the test part of its curve is kept.
+    """
+    def __init__(self, strategy: str, pool: Dict[str, int], grid: Dict[str, List[Any]], metric: str = 'sharpe',
+                 warmup: int = 0, max_workers: Optional[int] = None):
+        self.strategy: str = strategy
+        self.pool: Dict[str, int] = pool
+        self.grid: List[Dict[str, Any]] = expand_grid(grid)
+        self.metric: str = metric
+        self.warmup: int = warmup
+        self.max_workers: int = max_workers or os.cpu_count()
+
+    def run(self, observations: List[Observation], folds: List[Fold]) -> WalkForwardResult:
+        jobs = []
+        for fold in folds:
+            test_from = max(fold.test_start - self.warmup, fold.train_start)
+            jobs.append((fold, observations[fold.train_start:fold.train_end] + observations[test_from:fold.test_end]))
+
+        if self.max_workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as executor:
+                futures = [executor.submit(_run_fold, self.strategy, self.pool, self.grid, self.metric,
+                                           fold, fold_observations) for fold, fold_observations in jobs]
+                outcomes = [future.result() for future in futures]
+        else:
+            outcomes = [_run_fold(self.strategy, self.pool, self.grid, self.metric, fold, fold_observations)
+                        for fold, fold_observations in jobs]
+        return self._stitch(outcomes)
+
+    def _stitch(self, outcomes: List[Dict[str, Any]]) -> WalkForwardResult:
+        rows = []
+        timestamps = []
+        equity = []
+        level = None
+        for outcome in outcomes:
+            fold, balances = outcome['fold'], outcome['balances']
+            level = balances[0] if level is None else level
+            curve = balances / balances[0] * level
+            level = curve[-1]
+            timestamps.append(outcome['timestamps'])
+            equity.append(curve)
+            test_metrics = balance_metrics(_naive_timestamps(outcome['timestamps']), balances)
+            rows.append({
+                'fold': fold.index,
+                'train_start': fold.train_start, 'train_end': fold.train_end,
+                'test_start': fold.test_start, 'test_end': fold.test_end,
+                **outcome['params'],
+                f'train_{self.metric}': outcome['train_metric'],
+                **{f'test_{name}': float(value[0]) for name, value in test_metrics.items()},
+            })
+        index = pd.DatetimeIndex(np.concatenate(timestamps))
+        equity = pd.Series(np.concatenate(equity), index=index, name='equity')
+        metrics = balance_metrics(_naive_timestamps(index), equity.to_numpy())
+        return WalkForwardResult(
+            folds=pd.DataFrame(rows),
+            equity=equity,
+            metrics={name: float(value[0]) for name, value in metrics.items()},
+        )
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+@dataclass
+class Task:
+    """
+    Represents one leased grid point of a distributed sweep.
+
+    Attributes:
+        task_id (str): Content hash of the sweep id and payload.
+        sweep_id (str): The sweep the task belongs to.
+        payload (Dict): The backtest description (strategy, data, pool, params).
+        attempts (int): How many times the task has been leased, this lease included.
+    """
+    task_id: str
+    sweep_id: str
+    payload: Dict
+    attempts: int
+
+
+def task_id_of(sweep_id: str, payload: Dict) -> str:
+    return hashlib.sha1(json.dumps([sweep_id, payload], sort_keys=True, default=str).encode()).hexdigest()
+
+
+class SQLiteWorkQueue:
+    """
+    Work queue of a sweep in one SQLite file on storage shared by the coordinator and the workers.
+
+    Workers lease tasks for `lease_seconds`; a task whose lease expired (the
+    worker crashed or lost the storage) is handed out again. Results are keyed
+    by the task id and the first write wins, so a task finished twice after a
+    lease expiry or a resubmitted grid never duplicates results.
+
+    Every call opens its own short connection, so one queue object can be used
+    from several threads and processes. Use the default rollback journal (not
+    WAL) when the file is on a network filesystem.
+    """
+    def __init__(self, path: str, lease_seconds: float = 1800.0, max_attempts: int = 3, timeout: float = 60.0):
+        self.path: str = path
+        self.lease_seconds: float = lease_seconds
+        self.max_attempts: int = max_attempts
+        self._timeout: float = timeout
+        with self._connect() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    sweep_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker_id TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires);
+                CREATE TABLE IF NOT EXISTS results (
+                    task_id TEXT PRIMARY KEY,
+                    sweep_id TEXT NOT NULL,
+                    worker_id TEXT NOT NULL,
+                    finished_at REAL NOT NULL,
+                    result TEXT NOT NULL
+                );
+            """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.path, timeout=self._timeout, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as connection:
+            # take the write lock up front so two workers never lease the same task
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    def submit(self, sweep_id: str, payloads: List[Dict]) -> int:
+        """
+        Add the grid points of a sweep, points already in the queue are skipped.
+
+        Returns:
+            int: number of new tasks
+        """
+        rows = [(task_id_of(sweep_id, payload), sweep_id, json.dumps(payload, sort_keys=True, default=str))
+                for payload in payloads]
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                'INSERT OR IGNORE INTO tasks (task_id, sweep_id, payload) VALUES (?, ?, ?)', rows)
+            return connection.total_changes - before
+
+    def lease(self, worker_id: str, n: int = 1, sweep_id: Optional[str] = None) -> List[Task]:
+        """
+        Lease up to `n` pending or expired tasks.
+        """
+        now = time.time()
+        query = ("SELECT task_id, sweep_id, payload, attempts FROM tasks "
+                 "WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?))")
+        args = [now]
+        if sweep_id is not None:
+            query += ' AND sweep_id = ?'
+            args.append(sweep_id)
+        query += ' ORDER BY rowid LIMIT ?'
+        args.append(n)
+        with self._transaction() as connection:
+            rows = connection.execute(query, args).fetchall()
+            connection.executemany(
+                "UPDATE tasks SET status = 'leased', worker_id = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE task_id = ?",
+                [(worker_id, now + self.lease_seconds, task_id) for task_id, *_ in rows])
+        return [Task(task_id=task_id, sweep_id=sweep, payload=json.loads(payload), attempts=attempts + 1)
+                for task_id, sweep, payload, attempts in rows]
+
+    def heartbeat(self, task: Task, worker_id: str) -> bool:
+        """
+        Extend the lease of a running task.
+
+        Returns:
+            bool: False if the lease was lost (expired and taken by another worker, or finished)
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE task_id = ? AND worker_id = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, task.task_id, worker_id))
+            return cursor.rowcount == 1
+
+    def complete(self, task: Task, worker_id: str, result: Dict) -> bool:
+        """
+        Store the task result, idempotently.
+
+        Returns:
+            bool: True if this call wrote the result, False if it was already stored
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO results (task_id, sweep_id, worker_id, finished_at, result) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (task.task_id, task.sweep_id, worker_id, time.time(), json.dumps(result, default=float)))
+            connection.execute(
+                "UPDATE tasks SET status = 'done', lease_expires = NULL, error = NULL WHERE task_id = ?",
+                (task.task_id,))
+            return cursor.rowcount == 1
+
+    def fail(self, task: Task, worker_id: str, error: str) -> None:
+        """
+        Release a failed task, it is retried until `max_attempts` leases.
+        """
+        status = 'failed' if task.attempts >= self.max_attempts else 'pending'
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE tasks SET status = ?, lease_expires = NULL, error = ? "
+                "WHERE task_id = ? AND worker_id = ? AND status = 'leased'",
+                (status, error, task.task_id, worker_id))
+
+    def progress(self, sweep_id: Optional[str] = None) -> Dict[str, int]:
+        """
+        Number of tasks per status, expired leases are counted as 'expired'.
+        """
+        query = ("SELECT CASE WHEN status = 'leased' AND lease_expires < ? THEN 'expired' ELSE status END, "
+                 "COUNT(*) FROM tasks")
+        args = [time.time()]
+        if sweep_id is not None:
+            query += ' WHERE sweep_id = ?'
+            args.append(sweep_id)
+        with self._connect() as connection:
+            return dict(connection.execute(query + ' GROUP BY 1', args).fetchall())
+
+    def runs(self, sweep_id: str) -> List[Dict]:
+        """
+        Finished tasks of a sweep as {'params', 'metrics', 'meta'} dicts (the ResultsDB format).
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                'SELECT t.payload, r.result, r.worker_id, r.finished_at FROM results r JOIN tasks t USING (task_id) '
+                'WHERE r.sweep_id = ? ORDER BY t.rowid', (sweep_id,)).fetchall()
+        runs = []
+        for payload, result, worker_id, finished_at in rows:
+            payload = json.loads(payload)
+            runs.append({
+                'params': payload['params'],
+                'metrics': json.loads(result),
+                'meta': {'strategy': payload['strategy'], 'data': payload['data'],
+                         'worker_id': worker_id, 'finished_at': finished_at},
+            })
+        return runs
+
+    def results(self, sweep_id: str) -> List[Dict]:
+        """
+        Results of a sweep, each with its task params.
+        """
+        return [{**run['params'], **run['metrics'], 'worker_id': run['meta']['worker_id']}
+                for run in self.runs(sweep_id)]
+
+
+def default_worker_id() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def run_worker(queue: SQLiteWorkQueue, handler: Callable[[Dict], Dict], worker_id: Optional[str] = None,
+               sweep_id: Optional[str] = None, max_tasks: Optional[int] = None, idle_exit: bool = True,
+               poll_seconds: float = 5.0) -> int:
+    """
+    Lease and run tasks until the queue is drained (or `max_tasks` are done).
+
+    The lease of the running task is renewed from a background thread every
+    third of `lease_seconds`, so long backtests are not handed out twice.
+
+    Args:
+        queue (SQLiteWorkQueue): shared queue
+        handler (Callable[[Dict], Dict]): runs a task payload and returns its result
+        worker_id (Optional[str]): worker name, host:pid by default
+        sweep_id (Optional[str]): only lease tasks of this sweep
+        max_tasks (Optional[int]): stop after this many tasks
+        idle_exit (bool): return when there is nothing to lease instead of polling
+        poll_seconds (float): polling interval of an idle worker
+
+    Returns:
+        int: number of completed tasks
+    """
+    worker_id = worker_id or default_worker_id()
+    done = 0
+    while max_tasks is None or done < max_tasks:
+        tasks = queue.lease(worker_id, 1, sweep_id)
+        if not tasks:
+            if idle_exit:
+                break
+            time.sleep(poll_seconds)
+            continue
+        task = tasks[0]
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(queue.lease_seconds / 3):
+                if not queue.heartbeat(task, worker_id):
+                    break
+
+        heartbeat = threading.Thread(target=renew, daemon=True)
+        heartbeat.start()
+        try:
+            result = handler(task.payload)
+        except Exception as e:
+            queue.fail(task, worker_id, repr(e))
+            continue
+        finally:
+            stop.set()
+            heartbeat.join()
+        queue.complete(task, worker_id, result)
+        done += 1
+    return done
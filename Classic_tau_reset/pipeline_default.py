@@ -12,6 +12,8 @@ from fractal.core.pipeline import (
 
 from tau_strategy import TauResetStrategy
 from main_tau_strategy import build_observations
+from Backtest_tools.registry import with_defaults
+from Backtest_tools.early_stopping import StopRules, run_pipeline, with_early_stopping
 
 
 THE_GRAPH_API_KEY = os.getenv('THE_GRAPH_API_KEY')
@@ -31,9 +33,7 @@ if __name__ == '__main__':
     end_time = datetime(2025, 1, 1, tzinfo=UTC)
     fidelity = 'hour'
     experiment_name = f'rtau_{fidelity}_{ticker}_{pool_address}_{start_time.strftime("%Y-%m-%d")}_{end_time.strftime("%Y-%m-%d")}'
-    TauResetStrategy.token0_decimals = 6
-    TauResetStrategy.token1_decimals = 18
-    TauResetStrategy.tick_spacing = 60
+    strategy_type = with_defaults(TauResetStrategy, token0_decimals=6, token1_decimals=18, tick_spacing=60)
 
     # Define MLFlow and Experiment configurations
     mlflow_config: MLFlowConfig = MLFlowConfig(
@@ -42,8 +42,11 @@ if __name__ == '__main__':
     )
     observations = build_observations(ticker, pool_address, THE_GRAPH_API_KEY, start_time, end_time, fidelity=fidelity)
     assert len(observations) > 0
+    # small TAU rebalances constantly and loses the balance to trading fees: abort such runs,
+    # they are logged to mlflow with the tag pruned=true
+    stop_rules = StopRules(max_drawdown=0.5, max_rebalances_per_day=12, balance_floor=0.6)
     experiment_config: ExperimentConfig = ExperimentConfig(
-        strategy_type=TauResetStrategy,
+        strategy_type=with_early_stopping(strategy_type, stop_rules, observations=observations),
         backtest_observations=observations,
         window_size=24,
         params_grid=build_grid(),
@@ -53,4 +56,4 @@ if __name__ == '__main__':
         experiment_config=experiment_config,
         mlflow_config=mlflow_config
     )
-    pipeline.run()
\ No newline at end of file
+    run_pipeline(pipeline, build_grid())
\ No newline at end of file
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
 from fractal.core.base import (Action, ActionToTake, BaseStrategy,
                                BaseStrategyParams, NamedEntity)
@@ -19,9 +19,19 @@ class TauResetStrategy(BaseStrategy):
     token0_decimals: int = -1
     token1_decimals: int = -1
     tick_spacing: int = -1
+    align_ticks: bool = False  # snap position bounds to usable ticks of tick_spacing
+    intrabar: bool = False  # exit on the bar low/high, fees by the bar time in range
 
-    def __init__(self, params: TauResetParams, debug: bool = False, *args, **kwargs):
+    def __init__(self, params: TauResetParams, debug: bool = False, *args, token0_decimals: Optional[int] = None,
+                 token1_decimals: Optional[int] = None, tick_spacing: Optional[int] = None,
+                 align_ticks: Optional[bool] = None, intrabar: Optional[bool] = None, **kwargs):
         self._params: TauResetParams = None  # set for type hinting
+        # the pool config is per instance, the class attributes are only the defaults
+        self.token0_decimals: int = self.token0_decimals if token0_decimals is None else token0_decimals
+        self.token1_decimals: int = self.token1_decimals if token1_decimals is None else token1_decimals
+        self.tick_spacing: int = self.tick_spacing if tick_spacing is None else tick_spacing
+        self.align_ticks: bool = self.align_ticks if align_ticks is None else align_ticks
+        self.intrabar: bool = self.intrabar if intrabar is None else intrabar
         assert self.token0_decimals != -1 and self.token1_decimals != -1 and self.tick_spacing != -1
         super().__init__(params=params, debug=debug, *args, **kwargs)
         self.deposited_initial_funds = False
@@ -32,7 +42,9 @@ class TauResetStrategy(BaseStrategy):
             entity=UniswapV3LPEntity(
                 UniswapV3LPConfig(
                     token0_decimals=self.token0_decimals,
-                    token1_decimals=self.token1_decimals
+                    token1_decimals=self.token1_decimals,
+                    tick_spacing=self.tick_spacing if self.align_ticks else None,
+                    intrabar=self.intrabar,
                 )
             )
         ))
@@ -54,11 +66,33 @@ class TauResetStrategy(BaseStrategy):
 
         lower_bound, upper_bound = uniswap_entity.internal_state.positions[0].price_lower, uniswap_entity.internal_state.positions[0].price_upper
 
-        if current_price < lower_bound or current_price > upper_bound:
+        # with intrabar exits the bar low/high are checked instead of the close
+        low = high = current_price
+        if self.intrabar:
+            low = getattr(global_state, 'price_min', current_price)
+            high = getattr(global_state, 'price_max', current_price)
+        if low < lower_bound or high > upper_bound:
             self._debug(f"Rebalance {current_price} moved outside range [{lower_bound}, {upper_bound}].")
             return self._rebalance()
         return []
 
+    def idle_until(self, index, t: int) -> int:
+        """
+        First observation after `t` that needs `predict`: the price leaves the position range.
+
+        Used by `Backtest_tools.range_index.run_with_skips` with a `RangeExitIndex`.
+        """
+        uniswap_entity: UniswapV3LPEntity = self.get_entity('UNISWAP_V3')
+        if self.intrabar or not uniswap_entity.internal_state.positions:
+            return t + 1
+        position = uniswap_entity.internal_state.positions[0]
+        return index.first_exit(t, position.price_lower, position.price_upper)
+
+    def skip(self, prices) -> None:
+        """
+        Observations skipped by `run_with_skips`, the strategy keeps no price history.
+        """
+
     def _deposit_to_lp(self) -> List[ActionToTake]:
         return [ActionToTake(
             entity_name='UNISWAP_V3',
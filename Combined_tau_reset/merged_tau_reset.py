@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 
@@ -24,19 +24,37 @@ class MergedTauResetStrategy(BaseStrategy):
     token0_decimals: int = -1
     token1_decimals: int = -1
     tick_spacing: int = -1
+    align_ticks: bool = False  # snap position bounds to usable ticks of tick_spacing
+    intrabar: bool = False  # exit on the bar low/high, fees by the bar time in range
     previous_price: float = 0
     current_price: float = 0
     tick_counter: int = 0
     last_center : float = 0
     tau : float = 30
+    feature_store = None  # optional Backtest_tools.feature_store.FeatureStore shared by a sweep
 
-    def __init__(self, params: MergedTauResetParams, debug: bool = False, *args, **kwargs):
+    def __init__(self, params: MergedTauResetParams, debug: bool = False, *args, token0_decimals: Optional[int] = None,
+                 token1_decimals: Optional[int] = None, tick_spacing: Optional[int] = None,
+                 align_ticks: Optional[bool] = None, intrabar: Optional[bool] = None,
+                 feature_store=None, **kwargs):
         self._params: MergedTauResetParams = None  # set for type hinting
+        # the pool config is per instance, the class attributes are only the defaults
+        self.token0_decimals: int = self.token0_decimals if token0_decimals is None else token0_decimals
+        self.token1_decimals: int = self.token1_decimals if token1_decimals is None else token1_decimals
+        self.tick_spacing: int = self.tick_spacing if tick_spacing is None else tick_spacing
+        self.align_ticks: bool = self.align_ticks if align_ticks is None else align_ticks
+        self.intrabar: bool = self.intrabar if intrabar is None else intrabar
+        self.feature_store = self.feature_store if feature_store is None else feature_store
+        # run state starts on the instance, never shared through the class
+        self.previous_price: float = 0
+        self.current_price: float = 0
+        self.tick_counter: int = 0
+        self.last_center: float = 0
+        self.tau: float = type(self).tau
         assert self.token0_decimals != -1 and self.token1_decimals != -1 and self.tick_spacing != -1
         super().__init__(params=params, debug=debug, *args, **kwargs)
         self.deposited_initial_funds = False
         self.distribution = [1] * self._params.BINS
-        self.new_distribution  = []
 
     def set_up(self):
         self.register_entity(NamedEntity(
@@ -44,7 +62,10 @@ class MergedTauResetStrategy(BaseStrategy):
             entity=UniswapV3LPEntity(
                 UniswapV3LPConfig(
                     token0_decimals=self.token0_decimals,
-                    token1_decimals=self.token1_decimals
+                    token1_decimals=self.token1_decimals,
+                    tick_spacing=self.tick_spacing if self.align_ticks else None,
+                    intrabar=self.intrabar,
+                    history_capacity=self._params.INFO_TIME + 1,
                 )
             )
         ))
@@ -53,8 +74,18 @@ class MergedTauResetStrategy(BaseStrategy):
         self.current_price = self.previous_price
 
     def _update_dist_and_tau(self):
-        
-        prices = np.asarray(self.new_distribution, dtype=np.float64)
+        index = None
+        if self.feature_store is not None:
+            index = self.feature_store.index_of(self.get_entity('UNISWAP_V3').global_state)
+        if index is not None:
+            stats = self.feature_store.window_stats(self._params.INFO_TIME, self._params.U)
+            self.tau = self._params.C * (self._params.ALPHA * stats.std[index] + (1 - self._params.ALPHA) * stats.iqr[index])
+            hist = self.feature_store.histogram(self._params.INFO_TIME, self._params.U, self._params.BINS)
+            self.distribution = list(hist[index])
+            return
+
+        # the INFO_TIME window is kept by the entity, a view without copies
+        prices = self.get_entity('UNISWAP_V3').history.window('price', self._params.INFO_TIME + 1)
 
         if self._params.U == 1:
             prices = np.log(prices[1:]) - np.log(prices[:-1])
@@ -77,7 +108,13 @@ class MergedTauResetStrategy(BaseStrategy):
         tick_spacing = self.tick_spacing
         price_lower = self.last_center * 1.0001 ** (-tau * tick_spacing)
         price_upper = self.last_center * 1.0001 ** (tau * tick_spacing)
-        if self.current_price > price_upper or self.current_price < price_lower:
+        # with intrabar exits the bar low/high are checked instead of the close
+        low = high = self.current_price
+        if self.intrabar:
+            global_state = self.get_entity('UNISWAP_V3').global_state
+            low = getattr(global_state, 'price_min', low)
+            high = getattr(global_state, 'price_max', high)
+        if high > price_upper or low < price_lower:
             return True
         return False
     
@@ -87,10 +124,8 @@ class MergedTauResetStrategy(BaseStrategy):
         self.previous_price = self.current_price
         self.current_price = global_state.price  # Get the current market price
         self.tick_counter += 1
-        self.new_distribution.append(self.current_price)
         if self.tick_counter > self._params.INFO_TIME:
             self._update_dist_and_tau()
-            self.new_distribution = []
             self.tick_counter = 0
 
         if not uniswap_entity._internal_state.positions and not self.deposited_initial_funds:
@@ -107,6 +142,46 @@ class MergedTauResetStrategy(BaseStrategy):
             return self._rebalance()
         return []
 
+    def idle_until(self, index, t: int) -> int:
+        """
+        First observation after `t` that needs `predict`: the price leaves the
+        range around the last center or the INFO_TIME window is complete.
+
+        Used by `Backtest_tools.range_index.run_with_skips` with a `RangeExitIndex`.
+        """
+        uniswap_entity: UniswapV3LPEntity = self.get_entity('UNISWAP_V3')
+        if self.intrabar or not uniswap_entity._internal_state.positions:
+            return t + 1
+        next_window = t + self._params.INFO_TIME + 1 - self.tick_counter
+        tau = self.tau
+        price_lower = self.last_center * 1.0001 ** (-tau * self.tick_spacing)
+        price_upper = self.last_center * 1.0001 ** (tau * self.tick_spacing)
+        return min(index.first_exit(t, price_lower, price_upper), next_window)
+
+    def skip(self, prices: np.ndarray) -> None:
+        """
+        Record the prices of the observations skipped by `run_with_skips`
+        (they are pushed to the entity history by the runner).
+        """
+        prices = np.asarray(prices).tolist()
+        self.tick_counter += len(prices)
+        self.previous_price = self.current_price if len(prices) == 1 else prices[-2]
+        self.current_price = prices[-1]
+
+    @classmethod
+    def irrelevant_params(cls, params: Dict[str, Any], n_observations: Optional[int] = None) -> Tuple[str, ...]:
+        """
+        Parameters that do not change a run of `n_observations` with `params`,
+        grid points differing only in them are run once (Backtest_tools/grid_canonical.py).
+
+        Tau and the distribution are first updated after INFO_TIME + 1
+        observations; before that the ladder is uniform with the default tau.
+        U also sets the series of tau, so it matters with a single bin too.
+        """
+        if n_observations is not None and params['INFO_TIME'] >= n_observations:
+            return ('ALPHA', 'C', 'INFO_TIME', 'U')
+        return ()
+
     def _deposit_to_lp(self) -> List[ActionToTake]:
         return [ActionToTake(
             entity_name='UNISWAP_V3',
@@ -114,38 +189,27 @@ class MergedTauResetStrategy(BaseStrategy):
         )]
 
     def _rebalance(self) -> List[ActionToTake]:
-        actions = []
         entity: UniswapV3LPEntity = self.get_entity('UNISWAP_V3')
 
-        if entity.internal_state.positions:
-            actions.append(
-                ActionToTake(entity_name='UNISWAP_V3', action=Action(action='close_position', args={}))
-            )
-            self._debug("Liquidity withdrawn from the current range.")
-
         tau = self.tau
         reference_price: float = entity.global_state.price
         tick_spacing = self.tick_spacing
         price_lower = reference_price * 1.0001 ** (-tau * tick_spacing)
         price_upper = reference_price * 1.0001 ** (tau * tick_spacing)
         self.last_center = reference_price
-        delta = price_upper - price_lower
-
-        for i in range(self._params.BINS):
-            partial_cash = lambda obj: obj.get_entity('UNISWAP_V3').internal_state.cash * \
-                (self.distribution[i] / sum(self.distribution))
-            partial_lower = price_lower + i * (delta / self._params.BINS)
-            partial_upper = price_lower + (i + 1) * (delta / self._params.BINS)
-            actions.append(ActionToTake(
-                entity_name='UNISWAP_V3',
-                action=Action(
-                    action='open_position',
-                    args={
-                        'amount_in_notional': partial_cash,
-                        'price_lower': partial_lower,
-                        'price_upper': partial_upper
-                    }
-                )
-            ))
+        bounds = np.linspace(price_lower, price_upper, self._params.BINS + 1)
+
+        # close the current ladder (if any) and reopen all bins in one action
+        action = ActionToTake(
+            entity_name='UNISWAP_V3',
+            action=Action(
+                action='rebalance',
+                args={
+                    'price_lower': bounds[:-1],
+                    'price_upper': bounds[1:],
+                    'weights': np.asarray(self.distribution, dtype=np.float64)
+                }
+            )
+        )
         self._debug(f"New position opened with range [{price_lower}, {price_upper}].")
-        return actions
\ No newline at end of file
+        return [action]
@@ -12,6 +12,10 @@ from fractal.core.pipeline import (
 
 from dist_tau_reset import DistTauResetStrategy
 from main_dist_tau_reset import build_observations
+from Backtest_tools.registry import with_defaults
+from Backtest_tools.feature_store import FeatureStore
+from Backtest_tools.early_stopping import StopRules, run_pipeline, with_early_stopping
+from Backtest_tools.grid_canonical import canonicalize, params_label
 
 
 THE_GRAPH_API_KEY = os.getenv('THE_GRAPH_API_KEY')
@@ -35,9 +39,6 @@ if __name__ == '__main__':
     end_time = datetime(2025, 1, 1, tzinfo=UTC)
     fidelity = 'hour'
     experiment_name = f'rtau_{fidelity}_{ticker}_{pool_address}_{start_time.strftime("%Y-%m-%d")}_{end_time.strftime("%Y-%m-%d")}'
-    DistTauResetStrategy.token0_decimals = 6
-    DistTauResetStrategy.token1_decimals = 18
-    DistTauResetStrategy.tick_spacing = 60
 
     # Define MLFlow and Experiment configurations
     mlflow_config: MLFlowConfig = MLFlowConfig(
@@ -46,15 +47,27 @@ if __name__ == '__main__':
     )
     observations = build_observations(ticker, pool_address, THE_GRAPH_API_KEY, start_time, end_time, fidelity=fidelity)
     assert len(observations) > 0
+    # window statistics depend only on the prices, INFO_TIME, U and BINS: compute them once per sweep
+    feature_store = FeatureStore(observations)
+    feature_store.precompute(build_grid())
+    strategy_type = with_defaults(DistTauResetStrategy, token0_decimals=6, token1_decimals=18, tick_spacing=60,
+                                  feature_store=feature_store)
+    # grid points the strategy declares equivalent are run once and logged to mlflow for every member
+    classes = canonicalize(strategy_type, list(build_grid()), len(observations))
+    runs = [equivalence.params for equivalence in classes]
+    equivalents = {params_label(equivalence.params): equivalence.members[1:] for equivalence in classes}
+    # small TAU with many BINS rebalances constantly and loses the balance to trading fees: abort such runs,
+    # they are logged to mlflow with the tag pruned=true
+    stop_rules = StopRules(max_drawdown=0.5, max_rebalances_per_day=12, balance_floor=0.6)
     experiment_config: ExperimentConfig = ExperimentConfig(
-        strategy_type=DistTauResetStrategy,
+        strategy_type=with_early_stopping(strategy_type, stop_rules, observations=observations),
         backtest_observations=observations,
         window_size=12,
-        params_grid=build_grid(),
+        params_grid=runs,
         debug=True,
     )
     pipeline: DefaultPipeline = DefaultPipeline(
         experiment_config=experiment_config,
         mlflow_config=mlflow_config
     )
-    pipeline.run()
\ No newline at end of file
+    run_pipeline(pipeline, runs, equivalents)
\ No newline at end of file
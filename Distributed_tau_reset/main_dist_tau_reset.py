@@ -1,66 +1,22 @@
 import os
+import sys
 
 from typing import List
 from datetime import datetime, UTC
-
-import pandas as pd
+from pathlib import Path
 
 from fractal.loaders.base_loader import LoaderType
-from fractal.loaders.thegraph.uniswap_v3 import (
-    UniswapV3EthereumPoolHourDataLoader, EthereumUniswapV3Loader, UniswapV3EthereumPoolMinuteDataLoader
-)
-from fractal.loaders.binance import BinanceHourPriceLoader, BinanceMinutePriceLoader
-from fractal.loaders.structs import PriceHistory, PoolHistory
+from fractal.loaders.thegraph.uniswap_v3 import EthereumUniswapV3Loader
 
 from fractal.core.base import Observation
-from fractal.core.entities import UniswapV3LPGlobalState
 from dist_tau_reset import DistTauResetParams, DistTauResetStrategy
+sys.path.append(str(Path(__file__).parent.parent))
+from Backtest_tools.observations import build_observations
 
 
 THE_GRAPH_API_KEY = os.getenv('THE_GRAPH_API_KEY')
 
 
-def get_observations(
-        pool_data: PoolHistory, price_data: PriceHistory,
-        start_time: datetime = None, end_time: datetime = None
-    ) -> List[Observation]:
-    observations_df: pd.DataFrame = pool_data.join(price_data)
-    observations_df = observations_df.dropna()
-    observations_df = observations_df.loc[start_time:end_time]
-    if start_time is None:
-        start_time = observations_df.index.min()
-    if end_time is None:
-        end_time = observations_df.index.max()
-    observations_df = observations_df[observations_df.tvl > 0]
-    observations_df = observations_df.sort_index()
-    return [
-        Observation(
-            timestamp=timestamp,
-            states={
-                'UNISWAP_V3': UniswapV3LPGlobalState(price=price, tvl=tvls, volume=volume, fees=fees, liquidity=liquidity),
-            }
-        ) for timestamp, (tvls, volume, fees, liquidity, price) in observations_df.iterrows()
-    ]
-
-
-def build_observations(
-        ticker: str, pool_address: str, api_key: str,
-        start_time: datetime = None, end_time: datetime = None, fidelity: str = 'hour',
-    ) -> List[Observation]:
-    if fidelity == 'hour':
-        pool_data: PoolHistory = UniswapV3EthereumPoolHourDataLoader(
-            api_key, pool_address, loader_type=LoaderType.CSV).read(with_run=True)
-        binance_prices: PriceHistory = BinanceHourPriceLoader(ticker, loader_type=LoaderType.CSV).read(with_run=True)
-    elif fidelity == 'minute':
-        pool_data: PoolHistory = UniswapV3EthereumPoolMinuteDataLoader(
-            api_key, pool_address, loader_type=LoaderType.CSV).read(with_run=True)
-        binance_prices: PriceHistory = BinanceMinutePriceLoader(ticker, loader_type=LoaderType.CSV,
-                                                                start_time=start_time, end_time=end_time).read(with_run=True)
-    else:
-        raise ValueError("Fidelity must be either 'hour' or 'minute'.")
-    return get_observations(pool_data, binance_prices, start_time, end_time)
-
-
 if __name__ == '__main__':
     # Set up
     ticker: str = 'ETHUSDT'
@@ -73,10 +29,8 @@ if __name__ == '__main__':
 
     # Init the strategy
     params: DistTauResetParams = DistTauResetParams(BINS=3, INFO_TIME=24*30, U=1, INITIAL_BALANCE=1_000_000)
-    DistTauResetStrategy.token0_decimals = token0_decimals
-    DistTauResetStrategy.token1_decimals = token1_decimals
-    DistTauResetStrategy.tick_spacing = 60
-    strategy: DistTauResetStrategy = DistTauResetStrategy(debug=True, params=params)
+    strategy: DistTauResetStrategy = DistTauResetStrategy(debug=True, params=params, token0_decimals=token0_decimals,
+                                                          token1_decimals=token1_decimals, tick_spacing=60)
 
     # Build observations
     entities = strategy.get_all_available_entities().keys()
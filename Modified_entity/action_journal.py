@@ -0,0 +1,80 @@
+import json
+import os
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+
+ACTIONS = ('deposit', 'withdraw', 'open_position', 'close_position', 'rebalance')
+EVENT_DTYPE = np.dtype([('t', '<i4'), ('action', 'u1'), ('amount', '<f8'), ('cash', '<f8'),
+                        ('first_range', '<i4'), ('n_ranges', '<i4')])
+RANGE_DTYPE = np.dtype([('price_lower', '<f8'), ('price_upper', '<f8'), ('sqrt_lower', '<f8'),
+                        ('sqrt_upper', '<f8'), ('share', '<f8')])
+
+
+class ActionJournal:
+    """
+    Compact record of the actions a UniswapV3LPEntity executed, by observation index.
+
+    An event holds the observation index `t` (advanced by `update_state`),
+    the action code (index in ACTIONS), its notional amount and the entity
+    cash before it. Opened ranges are stored once, after tick snapping, with
+    the sqrt bounds the entity revalues them with and the `share` of the
+    cash deposited into each (of the cash after closing for rebalance).
+    Everything a run decided is in the journal, so it can be repriced under
+    other trading and pool fees (Backtest_tools/repricing.py) as long as
+    the decisions depend only on prices. `meta` keeps the entity settings
+    of the recorded run.
+    """
+    def __init__(self, **meta):
+        self.meta: Dict[str, Any] = meta
+        self.t: int = -1
+        self._events: List[tuple] = []
+        self._ranges: List[tuple] = []
+
+    @classmethod
+    def attach(cls, entity) -> 'ActionJournal':
+        """
+        Start recording the actions of an entity (`entity.journal`).
+        """
+        journal = cls(trading_fee=entity.trading_fee, fees_rate=entity.fees_rate,
+                      token0_decimals=entity.token0_decimals, token1_decimals=entity.token1_decimals,
+                      tick_spacing=entity.tick_spacing, intrabar=entity.intrabar)
+        entity.journal = journal
+        return journal
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def step(self, n: int = 1) -> None:
+        self.t += n
+
+    def record(self, action: str, amount: float, cash: float, price_lower: Sequence[float] = (),
+               price_upper: Sequence[float] = (), sqrt_lower: Sequence[float] = (),
+               sqrt_upper: Sequence[float] = (), shares: Sequence[float] = ()) -> None:
+        self._events.append((self.t, ACTIONS.index(action), amount, cash, len(self._ranges), len(shares)))
+        self._ranges.extend(zip(price_lower, price_upper, sqrt_lower, sqrt_upper, shares))
+
+    @property
+    def events(self) -> np.ndarray:
+        return np.array(self._events, dtype=EVENT_DTYPE)
+
+    @property
+    def ranges(self) -> np.ndarray:
+        return np.array(self._ranges, dtype=RANGE_DTYPE)
+
+    def save(self, path: str) -> None:
+        # write then rename, so a reader never sees a half-written journal
+        tmp_path = f'{path}.tmp.npz'
+        np.savez(tmp_path, events=self.events, ranges=self.ranges, t=np.array(self.t),
+                 meta=np.array(json.dumps(self.meta)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'ActionJournal':
+        with np.load(path) as data:
+            journal = cls(**json.loads(str(data['meta'])))
+            journal.t = int(data['t'])
+            journal._events = data['events'].tolist()
+            journal._ranges = data['ranges'].tolist()
+        return journal
@@ -0,0 +1,218 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class SlottedState:
+    """
+    Base for compact `__slots__` states.
+
+    Instances have no per-object `__dict__`; the `__dict__` property rebuilds
+    one on demand so fractal code reading `state.__dict__` (observation type
+    validation, `StrategyResult.to_dataframe`) keeps working. `_fields` holds
+    the slots of the whole class hierarchy, so subclasses can add slots.
+    """
+    __slots__ = ()
+    _fields: tuple = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = tuple(name for klass in reversed(cls.__mro__) for name in klass.__dict__.get('__slots__', ()))
+
+    @property
+    def __dict__(self) -> Dict:
+        return {name: getattr(self, name) for name in self._fields}
+
+    def __getstate__(self) -> Dict:
+        return self.__dict__
+
+    def __setstate__(self, state: Dict) -> None:
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self._fields)
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+
+class CompactGlobalState(SlottedState):
+    """
+    Frozen slotted variant of `UniswapV3LPGlobalState`.
+
+    Attributes:
+        tvl (float): The total value locked.
+        volume (float): The trading volume.
+        fees (float): The trading fees.
+        liquidity (float): The pool liquidity.
+        price (float): The pool price [token1 / token0].
+    """
+    __slots__ = ('tvl', 'volume', 'fees', 'liquidity', 'price')
+
+    def __init__(self, tvl: float = 0.0, volume: float = 0.0, fees: float = 0.0,
+                 liquidity: float = 0.0, price: float = 0.0):
+        object.__setattr__(self, 'tvl', tvl)
+        object.__setattr__(self, 'volume', volume)
+        object.__setattr__(self, 'fees', fees)
+        object.__setattr__(self, 'liquidity', liquidity)
+        object.__setattr__(self, 'price', price)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is frozen")
+
+    def __hash__(self) -> int:
+        return hash(tuple(getattr(self, name) for name in self._fields))
+
+
+class CompactBarState(CompactGlobalState):
+    """
+    Global state of several consecutive observations merged into one bar.
+
+    `price`, `liquidity` and `tvl` are the values of the last merged
+    observation (the close), `fees` and `volume` are summed over the bar.
+
+    Attributes:
+        price_min (float): The lowest price of the bar.
+        price_max (float): The highest price of the bar.
+        count (int): Number of merged observations.
+        price_open (Optional[float]): The first price of the bar, None if unknown.
+    """
+    __slots__ = ('price_min', 'price_max', 'count', 'price_open')
+
+    def __init__(self, tvl: float = 0.0, volume: float = 0.0, fees: float = 0.0, liquidity: float = 0.0,
+                 price: float = 0.0, price_min: float = 0.0, price_max: float = 0.0, count: int = 1,
+                 price_open: Optional[float] = None):
+        super().__init__(tvl=tvl, volume=volume, fees=fees, liquidity=liquidity, price=price)
+        object.__setattr__(self, 'price_min', price_min)
+        object.__setattr__(self, 'price_max', price_max)
+        object.__setattr__(self, 'count', count)
+        object.__setattr__(self, 'price_open', price_open)
+
+
+class CompactPosition(SlottedState):
+    """
+    Slotted variant of `Position`, mutable because positions are revalued in place.
+    """
+    __slots__ = ('token0_amount', 'token1_amount', 'fees', 'price_lower', 'price_upper',
+                 'liquidity', 'tick_lower', 'tick_upper')
+
+    def __init__(self, token0_amount: float = 0.0, token1_amount: float = 0.0, fees: float = 0.0,
+                 price_lower: float = 0.0, price_upper: float = 0.0, liquidity: float = 0.0,
+                 tick_lower: Optional[int] = None, tick_upper: Optional[int] = None):
+        self.token0_amount = token0_amount
+        self.token1_amount = token1_amount
+        self.fees = fees
+        self.price_lower = price_lower
+        self.price_upper = price_upper
+        self.liquidity = liquidity
+        self.tick_lower = tick_lower
+        self.tick_upper = tick_upper
+
+
+class CompactInternalState(SlottedState):
+    """
+    Slotted variant of `UniswapV3LPInternalState`.
+    """
+    __slots__ = ('positions', 'cash')
+
+    def __init__(self, positions: List[CompactPosition] = None, cash: float = 0.0):
+        self.positions = [] if positions is None else positions
+        self.cash = cash
+
+
+class StateHistory:
+    """
+    Column storage of a global states history.
+
+    One numpy array per field instead of one object per observation; with
+    `dtype=np.float32` the history takes half the memory of float64 columns.
+    Items are materialized on access as `CompactGlobalState` of Python floats.
+    """
+    FIELDS = CompactGlobalState.__slots__
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns: Dict[str, np.ndarray] = columns
+
+    @classmethod
+    def from_states(cls, states: List, dtype=np.float64) -> 'StateHistory':
+        return cls({
+            name: np.fromiter((getattr(state, name) for state in states), dtype=dtype, count=len(states))
+            for name in cls.FIELDS
+        })
+
+    def __len__(self) -> int:
+        return len(self.columns['price'])
+
+    def __getitem__(self, i: int) -> CompactGlobalState:
+        return CompactGlobalState(**{name: float(column[i]) for name, column in self.columns.items()})
+
+    def __iter__(self):
+        rows = zip(*(column.tolist() for column in self.columns.values()))
+        names = list(self.columns)
+        for row in rows:
+            yield CompactGlobalState(**dict(zip(names, row)))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values())
+
+
+class StateRingBuffer:
+    """
+    Fixed-capacity history of the most recent global states (price, fees, liquidity).
+
+    Every column is a mirrored numpy buffer of twice the capacity: each value
+    is written at `i` and `i + capacity`, so the last `k <= capacity` values
+    are always one contiguous slice and `window` returns a read-only view
+    without copying. Pushing is O(1) and nothing grows with the run length.
+    """
+    FIELDS = ('price', 'fees', 'liquidity')
+
+    def __init__(self, capacity: int, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity: int = capacity
+        self._columns: Dict[str, np.ndarray] = {name: np.zeros(2 * capacity, dtype=dtype) for name in self.FIELDS}
+        self._head: int = 0  # next write position in [0, capacity)
+        self.count: int = 0  # number of pushed states, not capped
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def push(self, state) -> None:
+        i, j = self._head, self._head + self.capacity
+        for name, column in self._columns.items():
+            column[i] = column[j] = getattr(state, name)
+        self._head = (self._head + 1) % self.capacity
+        self.count += 1
+
+    def extend(self, **columns: np.ndarray) -> None:
+        """
+        Push many states at once from column arrays of equal length (price=..., fees=..., liquidity=...).
+        """
+        n = len(columns['price'])
+        if n > self.capacity:
+            columns = {name: values[n - self.capacity:] for name, values in columns.items()}
+            self._head = (self._head + n - self.capacity) % self.capacity
+            self.count += n - self.capacity
+            n = self.capacity
+        positions = (self._head + np.arange(n)) % self.capacity
+        for name, column in self._columns.items():
+            column[positions] = column[positions + self.capacity] = columns[name]
+        self._head = (self._head + n) % self.capacity
+        self.count += n
+
+    def window(self, name: str, k: int) -> np.ndarray:
+        """
+        The last `k` values of a field, oldest first, as a read-only view.
+        """
+        if k > len(self):
+            raise ValueError(f"Only {len(self)} states in the buffer, {k} requested")
+        end = self._head + self.capacity
+        view = self._columns[name][end - k:end]
+        view.flags.writeable = False
+        return view
+
@@ -0,0 +1,203 @@
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+
+
+MIN_TICK: int = -887272
+MAX_TICK: int = 887272
+MIN_SQRT_RATIO: int = 4295128739
+MAX_SQRT_RATIO: int = 1461446703485210103287273052203988822378723970342
+Q96: int = 2 ** 96
+
+LOG_BASE: float = np.log(1.0001)
+
+# TickMath.getSqrtRatioAtTick multipliers: 2**128 / sqrt(1.0001) ** (2 ** i)
+_RATIO_MULTIPLIERS = (
+    (0x2, 0xfff97272373d413259a46990580e213a),
+    (0x4, 0xfff2e50f5f656932ef12357cf3c7fdcc),
+    (0x8, 0xffe5caca7e10e4e61c3624eaa0941cd0),
+    (0x10, 0xffcb9843d60f6159c9db58835c926644),
+    (0x20, 0xff973b41fa98c081472e6896dfb254c0),
+    (0x40, 0xff2ea16466c96a3843ec78b326b52861),
+    (0x80, 0xfe5dee046a99a2a811c461f1969c3053),
+    (0x100, 0xfcbe86c7900a88aedcffc83b479aa3a4),
+    (0x200, 0xf987a7253ac413176f2b074cf7815e54),
+    (0x400, 0xf3392b0822b70005940c7a398e4b70f3),
+    (0x800, 0xe7159475a2c29b7443b29c7fa6e889d9),
+    (0x1000, 0xd097f3bdfd2022b8845ad8f792aa5825),
+    (0x2000, 0xa9f746462d870fdf8a65dc1f90e061e5),
+    (0x4000, 0x70d869a156d2a1b890bb3df62baf32f7),
+    (0x8000, 0x31be135f97d08fd981231505542fcfa6),
+    (0x10000, 0x9aa508b5b7a84e1c677de54f3e99bc9),
+    (0x20000, 0x5d6af8dedb81196699c329225ee604),
+    (0x40000, 0x2216e584f5fa1ea926041bedfe98),
+    (0x80000, 0x48a170391f7dc42444e8fa2),
+)
+
+
+def get_sqrt_ratio_at_tick(tick: int) -> int:
+    """
+    Exact port of Uniswap V3 TickMath.getSqrtRatioAtTick.
+
+    Args:
+        tick (int): tick in [MIN_TICK, MAX_TICK]
+
+    Returns:
+        int: sqrt(1.0001 ** tick) as a Q64.96 number, rounded up like on-chain
+    """
+    tick = int(tick)
+    abs_tick = abs(tick)
+    if abs_tick > MAX_TICK:
+        raise ValueError(f"tick must be in [{MIN_TICK}, {MAX_TICK}] - {tick}")
+    ratio = 0xfffcb933bd6fad37aa2d162d1a594001 if abs_tick & 0x1 else 0x100000000000000000000000000000000
+    for mask, multiplier in _RATIO_MULTIPLIERS:
+        if abs_tick & mask:
+            ratio = (ratio * multiplier) >> 128
+    if tick > 0:
+        ratio = ((1 << 256) - 1) // ratio
+    # Q128.128 -> Q64.96, rounding up
+    return (ratio >> 32) + (0 if ratio % (1 << 32) == 0 else 1)
+
+
+def get_tick_at_sqrt_ratio(sqrt_price_x96: int) -> int:
+    """
+    Returns the greatest tick whose sqrt ratio is <= sqrt_price_x96 (TickMath.getTickAtSqrtRatio).
+    """
+    if not MIN_SQRT_RATIO <= sqrt_price_x96 < MAX_SQRT_RATIO:
+        raise ValueError("sqrt_price_x96 is out of the [MIN_SQRT_RATIO, MAX_SQRT_RATIO) range")
+    lo, hi = MIN_TICK, MAX_TICK
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if get_sqrt_ratio_at_tick(mid) <= sqrt_price_x96:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def price_to_tick(price):
+    """
+    Returns floor(log_1.0001(price)) for a scalar or an array of prices.
+    """
+    ticks = np.floor(np.log(price) / LOG_BASE)
+    # fix float rounding right at the tick boundaries
+    ticks = np.where(np.power(1.0001, ticks) > price, ticks - 1, ticks)
+    ticks = np.where(np.power(1.0001, ticks + 1) <= price, ticks + 1, ticks)
+    if np.ndim(ticks) == 0:
+        return int(ticks)
+    return ticks.astype(np.int64)
+
+
+def tick_to_price(tick):
+    """
+    Returns 1.0001 ** tick for a scalar or an array of ticks.
+    """
+    return np.power(1.0001, np.asarray(tick, dtype=np.float64))
+
+
+def pool_tick(price, token0_decimals: int, token1_decimals: int):
+    """
+    On-chain tick of entity prices (token0 per token1, decimals adjusted).
+
+    The pool price is token1 per token0 in raw units, so the axis is inverted
+    and shifted by the decimals: tick = -log_1.0001(price) + log_1.0001(10 ** (d1 - d0)),
+    rounded down like TickMath.getTickAtSqrtRatio.
+    """
+    return price_to_tick(10.0 ** (token1_decimals - token0_decimals) / np.asarray(price, dtype=np.float64))
+
+
+def pool_sqrt_price(sqrt_ratio, token0_decimals: int, token1_decimals: int):
+    """
+    sqrt of the entity price at on-chain sqrt ratios sqrt(1.0001 ** tick) (SqrtPriceTable values).
+    """
+    return 10.0 ** ((token1_decimals - token0_decimals) / 2) / sqrt_ratio
+
+
+def snap_range(price_lower, price_upper, tick_spacing: int, token0_decimals: int, token1_decimals: int,
+               nearest: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Snap entity price bounds to usable on-chain ticks.
+
+    The bounds are mapped to the pool tick axis (`pool_tick`), so `price_upper`
+    gives the lower tick and `price_lower` the upper one. By default the
+    lower tick is rounded down and the upper tick up to a multiple of
+    `tick_spacing`, so the snapped range covers the requested one. With
+    `nearest=True` both are rounded to the nearest usable tick, which keeps
+    shared edges of adjacent ranges (ladders) shared.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: lower and upper on-chain ticks
+    """
+    raw_lower = 10.0 ** (token1_decimals - token0_decimals) / np.asarray(price_upper, dtype=np.float64)
+    raw_upper = 10.0 ** (token1_decimals - token0_decimals) / np.asarray(price_lower, dtype=np.float64)
+    if nearest:
+        tick_lower = np.round(np.log(raw_lower) / LOG_BASE / tick_spacing).astype(np.int64) * tick_spacing
+        tick_upper = np.round(np.log(raw_upper) / LOG_BASE / tick_spacing).astype(np.int64) * tick_spacing
+    else:
+        tick_lower = np.floor_divide(price_to_tick(raw_lower), tick_spacing) * tick_spacing
+        # the smallest tick at or above the raw upper price
+        tick_upper = price_to_tick(raw_upper)
+        tick_upper = tick_upper + (tick_to_price(tick_upper) < raw_upper)
+        tick_upper = -np.floor_divide(-tick_upper, tick_spacing) * tick_spacing
+    tick_upper = np.where(tick_upper <= tick_lower, tick_lower + tick_spacing, tick_upper)
+    return tick_lower, tick_upper
+
+
+class SqrtPriceTable:
+    """
+    Precomputed sqrt prices of all the usable ticks for a tick spacing.
+
+    Lookups are array indexing: `(tick - min_tick) // tick_spacing`. With
+    `exact=True` the table is built from the on-chain Q64.96 values
+    (`get_sqrt_ratio_at_tick`), otherwise from float powers of 1.0001.
+    """
+    def __init__(self, tick_spacing: int, exact: bool = False):
+        self.tick_spacing: int = tick_spacing
+        self.min_tick: int = -(-MIN_TICK // tick_spacing) * tick_spacing
+        self.max_tick: int = (MAX_TICK // tick_spacing) * tick_spacing
+        self.exact: bool = exact
+        ticks = np.arange(self.min_tick, self.max_tick + 1, tick_spacing, dtype=np.int64)
+        if exact:
+            self.sqrt_price_x96 = [get_sqrt_ratio_at_tick(tick) for tick in ticks]
+            self.sqrt_price = np.array([value / Q96 for value in self.sqrt_price_x96], dtype=np.float64)
+        else:
+            self.sqrt_price_x96 = None
+            self.sqrt_price = np.exp(ticks * (LOG_BASE / 2))
+        self._sqrt_price_list = self.sqrt_price.tolist()
+
+    def __reduce__(self):
+        # pickled (checkpointed entities) as a reference to the shared table of the process
+        return get_sqrt_price_table, (self.tick_spacing, self.exact)
+
+    def _index(self, tick):
+        index = (np.asarray(tick, dtype=np.int64) - self.min_tick) // self.tick_spacing
+        if np.any(np.asarray(tick) % self.tick_spacing != 0):
+            raise ValueError(f"tick must be a multiple of the tick spacing {self.tick_spacing}")
+        return index
+
+    def sqrt_price_at(self, tick):
+        """
+        Returns sqrt(1.0001 ** tick) for a usable tick or an array of them.
+        """
+        if isinstance(tick, (int, np.integer)):
+            if tick % self.tick_spacing != 0:
+                raise ValueError(f"tick must be a multiple of the tick spacing {self.tick_spacing}")
+            return self._sqrt_price_list[(tick - self.min_tick) // self.tick_spacing]
+        return self.sqrt_price[self._index(tick)]
+
+    def sqrt_price_x96_at(self, tick: int) -> int:
+        """
+        Returns the exact Q64.96 sqrt price of a usable tick.
+        """
+        if self.sqrt_price_x96 is None:
+            return get_sqrt_ratio_at_tick(tick)
+        return self.sqrt_price_x96[int(self._index(tick))]
+
+
+@lru_cache(maxsize=None)
+def get_sqrt_price_table(tick_spacing: int, exact: bool = False) -> SqrtPriceTable:
+    """
+    Returns the shared table for the tick spacing, tables are built once per process.
+    """
+    return SqrtPriceTable(tick_spacing, exact)
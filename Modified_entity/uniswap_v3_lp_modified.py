@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import List
+from typing import List, Optional, Tuple
 import numpy as np
 
 from fractal.core.base.entity import EntityException
@@ -7,6 +7,12 @@ from fractal.core.entities.models.uniswap_v3_fees import (estimate_fee,
                                                           get_liquidity_delta)
 from fractal.core.entities.pool import BasePoolEntity
 
+from Modified_entity.action_journal import ActionJournal
+from Modified_entity.compact_states import (CompactGlobalState, CompactInternalState, CompactPosition,
+                                             StateRingBuffer)
+from Modified_entity.tick_math import (get_sqrt_price_table, pool_sqrt_price, price_to_tick as _price_to_tick,
+                                       snap_range, tick_to_price as _tick_to_price)
+
 
 @dataclass
 class UniswapV3LPGlobalState:
@@ -34,6 +40,9 @@ class Position:
     price_lower: float = 0.0
     price_upper: float = 0.0
     liquidity: float = 0.0
+    # on-chain ticks of tick-aligned positions, the pool axis is inverted: tick_upper bounds price_lower
+    tick_lower: Optional[int] = None
+    tick_upper: Optional[int] = None
 
 
 @dataclass
@@ -54,6 +63,32 @@ class UniswapV3LPInternalState:
     cash: float = 0.0
 
 
+def bar_time_in_range(price_open: float, price_high: float, price_low: float, price_close: float,
+                      price_lower: float, price_upper: float) -> float:
+    """
+    Estimated share of a bar spent strictly inside (price_lower, price_upper).
+
+    The price path is taken as open -> low -> high -> close for a rising bar
+    and open -> high -> low -> close otherwise, moving at constant speed, so
+    the share is the length of the path inside the range over its total length.
+
+    Returns:
+        float: share of the bar in range, in [0, 1]
+    """
+    if price_close >= price_open:
+        path = (price_open, price_low, price_high, price_close)
+    else:
+        path = (price_open, price_high, price_low, price_close)
+    total = inside = 0.0
+    for a, b in zip(path[:-1], path[1:]):
+        low, high = (a, b) if a <= b else (b, a)
+        total += high - low
+        inside += max(0.0, min(high, price_upper) - max(low, price_lower))
+    if total == 0.0:
+        return 1.0 if price_lower < price_close < price_upper else 0.0
+    return inside / total
+
+
 @dataclass
 class UniswapV3LPConfig:
     """
@@ -64,11 +99,23 @@ class UniswapV3LPConfig:
         token0_decimals (int): The token0 decimals.
         token1_decimals (int): The token1 decimals.
         trading_fee (float): The trading fee while opening/closing a position.
+        tick_spacing (Optional[int]): If set, position bounds are snapped to usable ticks.
+        exact_sqrt_prices (bool): Build the sqrt price table from exact Q64.96 values.
+        compact_states (bool): Use the slotted states and positions from compact_states.py.
+        intrabar (bool): For bar states (CompactBarState) accrue fees by the estimated
+            time in range within the bar (`bar_time_in_range`) instead of the close price status.
+        history_capacity (Optional[int]): If set, the entity keeps the last global states
+            in a `StateRingBuffer` of this capacity (`entity.history`).
     """
     fees_rate: float = 0.005
     token0_decimals: int = 18
     token1_decimals: int = 18
     trading_fee: float = 0.003
+    tick_spacing: Optional[int] = None
+    exact_sqrt_prices: bool = False
+    compact_states: bool = True
+    intrabar: bool = False
+    history_capacity: Optional[int] = None
 
 
 class UniswapV3LPEntity(BasePoolEntity):
@@ -78,16 +125,32 @@ class UniswapV3LPEntity(BasePoolEntity):
     It maintains single position in the V3 pool.
     """
     def __init__(self, config: UniswapV3LPConfig, *args, **kwargs):
+        self.compact_states: bool = config.compact_states
+        self._position_type = CompactPosition if config.compact_states else Position
         super().__init__(*args, **kwargs)
         self.is_position: bool = False
         self.fees_rate: float = config.fees_rate
         self.token0_decimals: int = config.token0_decimals
         self.token1_decimals: int = config.token1_decimals
         self.trading_fee: float = config.trading_fee
+        self.tick_spacing: Optional[int] = config.tick_spacing
+        self.intrabar: bool = config.intrabar
+        self.history: Optional[StateRingBuffer] = None
+        if config.history_capacity is not None:
+            self.history = StateRingBuffer(config.history_capacity)
+        # set by `ActionJournal.attach` to record the actions for repricing
+        self.journal: Optional[ActionJournal] = None
+        self.sqrt_price_table = None
+        if self.tick_spacing is not None:
+            self.sqrt_price_table = get_sqrt_price_table(self.tick_spacing, config.exact_sqrt_prices)
 
     def _initialize_states(self):
-        self._internal_state = UniswapV3LPInternalState()
-        self._global_state = UniswapV3LPGlobalState()
+        if self.compact_states:
+            self._internal_state = CompactInternalState()
+            self._global_state = CompactGlobalState()
+        else:
+            self._internal_state = UniswapV3LPInternalState()
+            self._global_state = UniswapV3LPGlobalState()
 
     def action_deposit(self, amount_in_notional: float) -> None:
         """
@@ -96,6 +159,8 @@ class UniswapV3LPEntity(BasePoolEntity):
         Args:
             amount_in_notional (float): The amount to deposit.
         """
+        if self.journal is not None:
+            self.journal.record('deposit', amount_in_notional, self._internal_state.cash)
         self._internal_state.cash += amount_in_notional
 
     def action_withdraw(self, amount_in_notional: float) -> None:
@@ -107,6 +172,8 @@ class UniswapV3LPEntity(BasePoolEntity):
         """
         if amount_in_notional > self._internal_state.cash:
             raise EntityException("Insufficient funds to withdraw.")
+        if self.journal is not None:
+            self.journal.record('withdraw', amount_in_notional, self._internal_state.cash)
         self._internal_state.cash -= amount_in_notional
 
     def action_open_position(self, amount_in_notional: float, price_lower: float, price_upper: float) -> None:
@@ -120,7 +187,11 @@ class UniswapV3LPEntity(BasePoolEntity):
         """
         if amount_in_notional > self._internal_state.cash:
             raise EntityException("Insufficient funds to open position.")
-        new_position = Position()
+        tick_lower = tick_upper = None
+        if self.tick_spacing is not None:
+            tick_lower, tick_upper, price_lower, price_upper = self._snap_to_ticks(price_lower, price_upper)
+            tick_lower, tick_upper, price_lower, price_upper = (
+                int(tick_lower), int(tick_upper), float(price_lower), float(price_upper))
         self._internal_state.cash -= amount_in_notional
         amount_in_position = amount_in_notional
         self.is_position = True
@@ -130,6 +201,12 @@ class UniswapV3LPEntity(BasePoolEntity):
             price_upper=price_upper,
             price_lower=price_lower,
         )
+        new_position.tick_lower = tick_lower
+        new_position.tick_upper = tick_upper
+        if self.journal is not None:
+            cash = self._internal_state.cash + amount_in_notional
+            self._record_positions('open_position', amount_in_notional, cash, [new_position],
+                                   [amount_in_notional / cash])
         self._internal_state.positions.append(new_position)
 
     def action_close_position(self):
@@ -138,12 +215,82 @@ class UniswapV3LPEntity(BasePoolEntity):
         """
         if not self.is_position:
             raise EntityException("No position to close.")
+        if self.journal is not None:
+            self.journal.record('close_position', 0.0, self._internal_state.cash)
         cash = self.balance * (1 - self.trading_fee)
-        print(cash)
         self.is_position = False
         self._internal_state.positions.clear()
         self._internal_state.cash = cash
 
+    def action_rebalance(self, price_lower: np.ndarray, price_upper: np.ndarray, weights: np.ndarray) -> None:
+        """
+        Close all positions and reopen the whole ladder of ranges in one step.
+
+        The cash after closing is split between the ranges proportionally to weights,
+        ranges with zero weight are not opened.
+
+        Args:
+            price_lower (np.ndarray): The lower prices of the ranges.
+            price_upper (np.ndarray): The upper prices of the ranges.
+            weights (np.ndarray): The non-negative weights of the ranges.
+        """
+        price_lower = np.asarray(price_lower, dtype=np.float64)
+        price_upper = np.asarray(price_upper, dtype=np.float64)
+        weights = np.asarray(weights, dtype=np.float64)
+        if not price_lower.shape == price_upper.shape == weights.shape:
+            raise EntityException("price_lower, price_upper and weights must have the same shape.")
+        if np.any(weights < 0) or weights.sum() <= 0:
+            raise EntityException("weights must be non-negative with a positive sum.")
+        tick_lower = tick_upper = np.full(len(weights), None)
+        if self.tick_spacing is not None:
+            tick_lower, tick_upper, price_lower, price_upper = self._snap_to_ticks(
+                price_lower, price_upper, nearest=True)
+            tick_lower, tick_upper = tick_lower.tolist(), tick_upper.tolist()
+
+        cash_before = self._internal_state.cash
+        if self.is_position:
+            self._internal_state.cash = self.balance * (1 - self.trading_fee)
+            self._internal_state.positions.clear()
+            self.is_position = False
+
+        mask = weights > 0
+        ticks = [(tl, tu) for tl, tu, m in zip(tick_lower, tick_upper, mask) if m]
+        amounts = self._internal_state.cash * weights[mask] / weights.sum()
+        token0, token1, liquidity = self.calculate_positions_from_notional(
+            deposit_amounts_in_notional=amounts,
+            price_current=self._global_state.price,
+            price_lower=price_lower[mask],
+            price_upper=price_upper[mask],
+        )
+        self._internal_state.cash -= amounts.sum()
+        positions = [
+            self._position_type(
+                token0_amount=float(t0),
+                token1_amount=float(t1),
+                price_lower=float(pl),
+                price_upper=float(pu),
+                liquidity=float(L),
+                tick_lower=tl,
+                tick_upper=tu,
+            ) for t0, t1, pl, pu, L, (tl, tu) in zip(
+                token0, token1, price_lower[mask], price_upper[mask], liquidity, ticks)
+        ]
+        if self.journal is not None:
+            self._record_positions('rebalance', float(amounts.sum()), cash_before, positions,
+                                   weights[mask] / weights.sum())
+        self._internal_state.positions.extend(positions)
+        self.is_position = True
+
+    def _record_positions(self, action: str, amount: float, cash: float, positions: List[Position],
+                          shares) -> None:
+        sqrt_bounds = [(position.price_lower**0.5, position.price_upper**0.5) if position.tick_lower is None else
+                       self.tick_sqrt_prices(position.tick_lower, position.tick_upper) for position in positions]
+        self.journal.record(action, amount, cash,
+                            price_lower=[position.price_lower for position in positions],
+                            price_upper=[position.price_upper for position in positions],
+                            sqrt_lower=[float(lower) for lower, _ in sqrt_bounds],
+                            sqrt_upper=[float(upper) for _, upper in sqrt_bounds], shares=shares)
+
     def update_state(self, state: UniswapV3LPGlobalState) -> None:
         """
         Update the state of the LP entity.
@@ -151,6 +298,37 @@ class UniswapV3LPEntity(BasePoolEntity):
         1. Update the global state.
         2. Update token0 and token1 amounts following Uniswap V3 formula.
         3. Calculate fees and add to cash balance.
+        4. Record the state in the history ring buffer and advance the action journal (if any).
+
+        Args:
+            state (UniswapV3LPGlobalState): The state of the pool.
+        """
+        self.record_state(state)
+        self.revalue(state)
+        if not self.is_position:
+            return
+
+        self._internal_state.cash += sum(self.calculate_fees(position) for position in self._internal_state.positions)
+
+    def record_state(self, state: UniswapV3LPGlobalState) -> None:
+        """
+        Push the state to the history ring buffer and advance the action journal (if any).
+
+        Called by `update_state`; engines that only `revalue` the entity call it themselves.
+
+        Args:
+            state (UniswapV3LPGlobalState): The state of the pool.
+        """
+        if self.history is not None:
+            self.history.push(state)
+        if self.journal is not None:
+            self.journal.step()
+
+    def revalue(self, state: UniswapV3LPGlobalState) -> None:
+        """
+        Update the global state and token0 and token1 amounts without accruing fees.
+
+        Used by engines that accrue fees themselves (e.g. from swap events).
 
         Args:
             state (UniswapV3LPGlobalState): The state of the pool.
@@ -159,21 +337,24 @@ class UniswapV3LPEntity(BasePoolEntity):
         if not self.is_position:
             return
         p = state.price
+        sqrt_p = p**0.5
 
         for position in self._internal_state.positions:
             pl = position.price_lower
             pu = position.price_upper
+            if position.tick_lower is None:
+                sqrt_pl, sqrt_pu = pl**0.5, pu**0.5
+            else:
+                sqrt_pl, sqrt_pu = self.tick_sqrt_prices(position.tick_lower, position.tick_upper)
             if p <= pl:
                 position.token0_amount = 0
-                position.token1_amount = position.liquidity * (1 / (pl**0.5) - 1 / (pu**0.5))
+                position.token1_amount = position.liquidity * (1 / sqrt_pl - 1 / sqrt_pu)
             elif pl < p < pu:
-                position.token0_amount = position.liquidity * (p**0.5 - pl**0.5)
-                position.token1_amount = position.liquidity * (1 / (p**0.5) - 1 / (pu**0.5))
+                position.token0_amount = position.liquidity * (sqrt_p - sqrt_pl)
+                position.token1_amount = position.liquidity * (1 / sqrt_p - 1 / sqrt_pu)
             else:
-                position.token0_amount = position.liquidity * (pu**0.5 - pl**0.5)
+                position.token0_amount = position.liquidity * (sqrt_pu - sqrt_pl)
                 position.token1_amount = 0
-            print(self.calculate_fees(position))
-            self._internal_state.cash += self.calculate_fees(position)
 
     @property
     def balance(self) -> float:
@@ -185,11 +366,12 @@ class UniswapV3LPEntity(BasePoolEntity):
         """
         if not self.is_position:
             return self._internal_state.cash
-        return (
-            sum(self._internal_state.positions[i].token0_amount for i in range(len(self._internal_state.positions))) 
-            + sum(self._internal_state.positions[i].token1_amount for i in range(len(self._internal_state.positions))) * self._global_state.price
-            + self._internal_state.cash
-        )
+        token0_amount = 0.0
+        token1_amount = 0.0
+        for position in self._internal_state.positions:
+            token0_amount += position.token0_amount
+            token1_amount += position.token1_amount
+        return token0_amount + token1_amount * self._global_state.price + self._internal_state.cash
 
     def get_desired_token0_amount(
         self, deposit_amount: float, price_current: float, price_lower: float, price_upper: float
@@ -250,7 +432,7 @@ class UniswapV3LPEntity(BasePoolEntity):
         if price_lower <= 0:
             raise EntityException("price_lower must be positive")
         
-        new_position = Position()
+        new_position = self._position_type()
 
         token1_amount = deposit_amount * (1 - self.trading_fee)
         liquidity = deposit_amount / (1 / (price_current**0.5) - 1 / (price_upper**0.5))
@@ -299,7 +481,7 @@ class UniswapV3LPEntity(BasePoolEntity):
             L = deposit_amount_in_notional / (1/sqrt_lower - 1/sqrt_upper) / price_current
             token0_amount = 0.0
             token1_amount = deposit_amount_in_notional / price_current
-            return Position(
+            return self._position_type(
                 token0_amount=token0_amount,
                 token1_amount=token1_amount,
                 price_lower=price_lower,
@@ -310,7 +492,7 @@ class UniswapV3LPEntity(BasePoolEntity):
             token0_amount = deposit_amount_in_notional
             token1_amount = 0.0
             L = token0_amount / (sqrt_upper - sqrt_lower)
-            return Position(
+            return self._position_type(
                 token0_amount=token0_amount,
                 token1_amount=token1_amount,
                 price_lower=price_lower,
@@ -338,6 +520,62 @@ class UniswapV3LPEntity(BasePoolEntity):
     
 
 
+    def calculate_positions_from_notional(
+        self,
+        deposit_amounts_in_notional: np.ndarray,
+        price_current: float,
+        price_lower: np.ndarray,
+        price_upper: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorized `calculate_position_from_notional` for a ladder of ranges.
+
+        Args:
+            deposit_amounts_in_notional (np.ndarray): Deposited amounts in token1
+            price_current (float): Current price (token1/token0)
+            price_lower (np.ndarray): Lower price bounds
+            price_upper (np.ndarray): Upper price bounds
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: token0 amounts, token1 amounts and liquidities
+        """
+        if price_current <= 0:
+            raise EntityException("price_current must be positive")
+        if np.any(price_lower <= 0):
+            raise EntityException("price_lower must be positive")
+        if np.any(price_lower >= price_upper):
+            raise EntityException("price_lower must be less than price_upper")
+        if np.any(deposit_amounts_in_notional <= 0):
+            raise EntityException("deposit_amount must be positive")
+
+        sqrt_current = np.sqrt(price_current)
+        sqrt_lower = np.sqrt(price_lower)
+        sqrt_upper = np.sqrt(price_upper)
+        below = price_current <= price_lower
+        above = price_current >= price_upper
+        inside = ~(below | above)
+        token0 = np.zeros_like(deposit_amounts_in_notional)
+        token1 = np.zeros_like(deposit_amounts_in_notional)
+        liquidity = np.zeros_like(deposit_amounts_in_notional)
+
+        # range above the price: only token1
+        deposit = deposit_amounts_in_notional[below] * (1 - self.trading_fee)
+        token1[below] = deposit / price_current
+        liquidity[below] = deposit / (1 / sqrt_lower[below] - 1 / sqrt_upper[below]) / price_current
+
+        # range below the price: only token0
+        token0[above] = deposit_amounts_in_notional[above]
+        liquidity[above] = token0[above] / (sqrt_upper[above] - sqrt_lower[above])
+
+        # price inside the range: split by the Uniswap V3 ratio
+        ratio = (sqrt_current - sqrt_lower[inside]) / (1 / sqrt_current - 1 / sqrt_upper[inside])
+        deposit = deposit_amounts_in_notional[inside] / (ratio + price_current)
+        token1[inside] = deposit * (1 - self.trading_fee)
+        liquidity[inside] = deposit / (1 / sqrt_current - 1 / sqrt_upper[inside])
+        token0[inside] = liquidity[inside] * (sqrt_current - sqrt_lower[inside])
+
+        return token0, token1, liquidity
+
     def calculate_fees(self, position: Position) -> float:
         """
 
@@ -349,36 +587,77 @@ class UniswapV3LPEntity(BasePoolEntity):
             float: acc fees for position
         """
 
+        state = self._global_state
+        p = state.price
+
+        share = 1.0
+        if self.intrabar and getattr(state, 'price_min', None) is not None:
+            price_open = p if state.price_open is None else state.price_open
+            share = bar_time_in_range(price_open, state.price_max, state.price_min, p,
+                                      position.price_lower, position.price_upper)
+            if share == 0.0:
+                return 0
+        # if price is out of range then fees are 0
+        elif p <= position.price_lower or p >= position.price_upper:
+            return 0
+
+        fees = estimate_fee(
+            liquidity_delta=self.get_position_liquidity_delta(position),
+            liquidity=state.liquidity,
+            fees=state.fees,
+        )
+
+        return min(fees, state.fees) * share
+
+    def get_position_liquidity_delta(self, position: Position) -> float:
+        """
+        Returns the position liquidity in the units of the pool liquidity.
+
+        Args:
+            position (Position): position at the current global state price
+
+        Returns:
+            float: position liquidity delta
+        """
         # revert prices cuase we need token0/token1 price
         # and our model works with token1/token0 price
-        p = self._global_state.price
-        pl = position.price_lower
-        pu = position.price_upper
-
-        delta_liquidity = get_liquidity_delta(
-            P=(1 / p),
-            lower_price=(1 / pu),
-            upper_price=(1 / pl),
+        return get_liquidity_delta(
+            P=(1 / self._global_state.price),
+            lower_price=(1 / position.price_upper),
+            upper_price=(1 / position.price_lower),
             amount0=position.token0_amount,
             amount1=position.token1_amount,
             token0_decimal=self.token0_decimals,
             token1_decimal=self.token1_decimals,
         )
 
-        # if price is out of range then fees are 0
-        if p <= pl or p >= pu:
-            return 0
+    def _snap_to_ticks(
+        self, price_lower, price_upper, nearest: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Snap bounds to usable on-chain ticks (outwards, or to the nearest ones for ladders).
 
-        fees = estimate_fee(
-            liquidity_delta=delta_liquidity,
-            liquidity=self._global_state.liquidity,
-            fees=self._global_state.fees,
-        )
-        
-        return min(fees, self._global_state.fees)
+        Returns:
+            Tuple: lower ticks, upper ticks, lower prices, upper prices
+        """
+        tick_lower, tick_upper = snap_range(price_lower, price_upper, self.tick_spacing,
+                                            self.token0_decimals, self.token1_decimals, nearest)
+        sqrt_lower, sqrt_upper = self.tick_sqrt_prices(tick_lower, tick_upper)
+        return tick_lower, tick_upper, sqrt_lower**2, sqrt_upper**2
+
+    def tick_sqrt_prices(self, tick_lower, tick_upper):
+        """
+        sqrt of the entity price bounds of on-chain ticks, from the sqrt price table.
+
+        Returns:
+            Tuple: sqrt of the lower price (at tick_upper) and of the upper price (at tick_lower)
+        """
+        table = self.sqrt_price_table
+        return (pool_sqrt_price(table.sqrt_price_at(tick_upper), self.token0_decimals, self.token1_decimals),
+                pool_sqrt_price(table.sqrt_price_at(tick_lower), self.token0_decimals, self.token1_decimals))
 
-    def price_to_tick(self, price: float) -> float:
-        return np.floor(np.log(price) / np.log(1.0001))
+    def price_to_tick(self, price: float) -> int:
+        return _price_to_tick(price)
 
-    def tick_to_price(self, tick: float) -> float:
-        return 1.0001**tick
\ No newline at end of file
+    def tick_to_price(self, tick: int) -> float:
+        return _tick_to_price(tick)
\ No newline at end of file
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
 
 from fractal.core.base import (Action, ActionToTake, BaseStrategy,
                                BaseStrategyParams, NamedEntity)
@@ -21,16 +23,31 @@ class VolTauResetStrategy(BaseStrategy):
     token0_decimals: int = -1
     token1_decimals: int = -1
     tick_spacing: int = -1
+    align_ticks: bool = False  # snap position bounds to usable ticks of tick_spacing
+    intrabar: bool = False  # exit on the bar low/high, fees by the bar time in range
     tau: int = 30
     time: int = 0
+    feature_store = None  # optional Backtest_tools.feature_store.FeatureStore shared by a sweep
     
 
-    def __init__(self, params: VolTauResetParams, debug: bool = False, *args, **kwargs):
+    def __init__(self, params: VolTauResetParams, debug: bool = False, *args, token0_decimals: Optional[int] = None,
+                 token1_decimals: Optional[int] = None, tick_spacing: Optional[int] = None,
+                 align_ticks: Optional[bool] = None, intrabar: Optional[bool] = None,
+                 feature_store=None, **kwargs):
         self._params: VolTauResetParams = None  # set for type hinting
+        # the pool config is per instance, the class attributes are only the defaults
+        self.token0_decimals: int = self.token0_decimals if token0_decimals is None else token0_decimals
+        self.token1_decimals: int = self.token1_decimals if token1_decimals is None else token1_decimals
+        self.tick_spacing: int = self.tick_spacing if tick_spacing is None else tick_spacing
+        self.align_ticks: bool = self.align_ticks if align_ticks is None else align_ticks
+        self.intrabar: bool = self.intrabar if intrabar is None else intrabar
+        self.feature_store = self.feature_store if feature_store is None else feature_store
+        # run state starts on the instance, never shared through the class
+        self.tau: float = type(self).tau
+        self.time: int = 0
         assert self.token0_decimals != -1 and self.token1_decimals != -1 and self.tick_spacing != -1
         super().__init__(params=params, debug=debug, *args, **kwargs)
         self.deposited_initial_funds = False
-        self.distribution = []
 
     def set_up(self):
         self.register_entity(NamedEntity(
@@ -38,14 +55,26 @@ class VolTauResetStrategy(BaseStrategy):
             entity=UniswapV3LPEntity(
                 UniswapV3LPConfig(
                     token0_decimals=self.token0_decimals,
-                    token1_decimals=self.token1_decimals
+                    token1_decimals=self.token1_decimals,
+                    tick_spacing=self.tick_spacing if self.align_ticks else None,
+                    intrabar=self.intrabar,
+                    history_capacity=self._params.INFO_TIME + 1,
                 )
             )
         ))
         assert isinstance(self.get_entity('UNISWAP_V3'), UniswapV3LPEntity)
 
     def _recalculate_tau(self):
-        prices = np.array(self.distribution)
+        index = None
+        if self.feature_store is not None:
+            index = self.feature_store.index_of(self.get_entity('UNISWAP_V3').global_state)
+        if index is not None:
+            stats = self.feature_store.window_stats(self._params.INFO_TIME, 1)
+            self.tau = self._params.C * (self._params.ALPHA * stats.std_ddof1[index] + (1 - self._params.ALPHA) * stats.iqr[index])
+            return
+
+        # the INFO_TIME window is kept by the entity, a view without copies
+        prices = self.get_entity('UNISWAP_V3').history.window('price', self._params.INFO_TIME + 1)
         prices = np.log(prices[1:]) - np.log(prices[:-1])
         Q1 = np.percentile(prices, 25)
         Q3 = np.percentile(prices, 75)
@@ -59,11 +88,9 @@ class VolTauResetStrategy(BaseStrategy):
         uniswap_entity: UniswapV3LPEntity = self.get_entity('UNISWAP_V3')
         global_state = uniswap_entity.global_state
         current_price = global_state.price  # Get the current market price
-        self.distribution.append(current_price)
         self.time += 1
         if self.time > self._params.INFO_TIME:
             self._recalculate_tau()
-            self.distribution = []
             self.time = 0
 
         # Check if we need to deposit funds into the LP before proceeding
@@ -77,14 +104,53 @@ class VolTauResetStrategy(BaseStrategy):
             return self._rebalance()
 
         # Calculate the boundaries of the price range (bucket)
-        lower_bound, upper_bound = uniswap_entity.internal_state.price_lower, uniswap_entity.internal_state.price_upper
+        lower_bound, upper_bound = uniswap_entity.internal_state.positions[0].price_lower, uniswap_entity.internal_state.positions[0].price_upper
 
         # If the price moves outside the range, reallocate liquidity
-        if current_price < lower_bound or current_price > upper_bound:
+        # with intrabar exits the bar low/high are checked instead of the close
+        low = high = current_price
+        if self.intrabar:
+            low = getattr(global_state, 'price_min', current_price)
+            high = getattr(global_state, 'price_max', current_price)
+        if low < lower_bound or high > upper_bound:
             self._debug(f"Rebalance {current_price} moved outside range [{lower_bound}, {upper_bound}].")
             return self._rebalance()
         return []
 
+    def idle_until(self, index, t: int) -> int:
+        """
+        First observation after `t` that needs `predict`: the price leaves the
+        position range or the INFO_TIME window is complete.
+
+        Used by `Backtest_tools.range_index.run_with_skips` with a `RangeExitIndex`.
+        """
+        uniswap_entity: UniswapV3LPEntity = self.get_entity('UNISWAP_V3')
+        if self.intrabar or not uniswap_entity.is_position:
+            return t + 1
+        next_window = t + self._params.INFO_TIME + 1 - self.time
+        position = uniswap_entity.internal_state.positions[0]
+        return min(index.first_exit(t, position.price_lower, position.price_upper), next_window)
+
+    def skip(self, prices: np.ndarray) -> None:
+        """
+        Advance the window counter over the observations skipped by `run_with_skips`
+        (their prices are pushed to the entity history by the runner).
+        """
+        self.time += len(prices)
+
+    @classmethod
+    def irrelevant_params(cls, params: Dict[str, Any], n_observations: Optional[int] = None) -> Tuple[str, ...]:
+        """
+        Parameters that do not change a run of `n_observations` with `params`,
+        grid points differing only in them are run once (Backtest_tools/grid_canonical.py).
+
+        Tau is first recalculated after INFO_TIME + 1 observations, before that
+        the default tau is used whatever C and ALPHA.
+        """
+        if n_observations is not None and params['INFO_TIME'] >= n_observations:
+            return ('ALPHA', 'C', 'INFO_TIME')
+        return ()
+
     def _deposit_to_lp(self) -> List[ActionToTake]:
         return [ActionToTake(
             entity_name='UNISWAP_V3',
@@ -0,0 +1,37 @@
+import sys
+from datetime import datetime, timedelta, UTC
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pytest
+
+from fractal.core.base import Observation
+from fractal.core.entities import UniswapV3LPGlobalState
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+POOL = dict(token0_decimals=6, token1_decimals=18, tick_spacing=60)
+
+
+def make_observations(n: int = 500, seed: int = 0, start_price: float = 3000.0,
+                      liquidity_noise: float = 0.0) -> List[Observation]:
+    """
+    Hourly observations of a random-walk pool price with random fees.
+    """
+    rng = np.random.default_rng(seed)
+    prices = start_price * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    fees = rng.uniform(500, 1500, n)
+    liquidity = 1e18 * np.exp(rng.normal(0, liquidity_noise, n))
+    t0 = datetime(2024, 1, 1, tzinfo=UTC)
+    return [
+        Observation(timestamp=t0 + timedelta(hours=i), states={
+            'UNISWAP_V3': UniswapV3LPGlobalState(price=float(p), tvl=1e8, volume=1e6, fees=float(f),
+                                                 liquidity=float(l))})
+        for i, (p, f, l) in enumerate(zip(prices, fees, liquidity))
+    ]
+
+
+@pytest.fixture
+def observations() -> List[Observation]:
+    return make_observations(600, seed=3)
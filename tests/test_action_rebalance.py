@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from Modified_entity.uniswap_v3_lp_modified import UniswapV3LPConfig, UniswapV3LPEntity, UniswapV3LPGlobalState
+
+from tests.conftest import POOL
+
+LOWER = np.array([2800.0, 2900.0, 3000.0, 3100.0])
+UPPER = np.array([2900.0, 3000.0, 3100.0, 3200.0])
+WEIGHTS = np.array([0.2, 0.0, 0.5, 0.3])
+
+
+def entity_at(price: float) -> UniswapV3LPEntity:
+    entity = UniswapV3LPEntity(UniswapV3LPConfig(token0_decimals=POOL['token0_decimals'],
+                                                 token1_decimals=POOL['token1_decimals']))
+    move(entity, 3000.0)
+    entity.action_deposit(1_000_000)
+    entity.action_open_position(400_000, 2950.0, 3050.0)
+    move(entity, price)
+    return entity
+
+
+def move(entity: UniswapV3LPEntity, price: float) -> None:
+    entity.update_state(UniswapV3LPGlobalState(price=price, tvl=1e8, volume=1e6, fees=500.0, liquidity=1e18))
+
+
+def sequential_rebalance(entity: UniswapV3LPEntity) -> None:
+    entity.action_close_position()
+    amounts = entity.internal_state.cash * WEIGHTS / WEIGHTS.sum()
+    for price_lower, price_upper, amount in zip(LOWER, UPPER, amounts):
+        if amount > 0:
+            # the last amount may exceed the remaining cash by a rounding error
+            entity.action_open_position(min(amount, entity.internal_state.cash), price_lower, price_upper)
+
+
+@pytest.mark.parametrize('price', [2700.0, 3050.0, 3300.0])
+def test_rebalance_equals_close_and_opens(price):
+    expected, got = entity_at(price), entity_at(price)
+    sequential_rebalance(expected)
+    got.action_rebalance(LOWER, UPPER, WEIGHTS)
+
+    assert got.internal_state.cash == pytest.approx(expected.internal_state.cash, abs=1e-6)
+    assert got.balance == pytest.approx(expected.balance, rel=1e-12)
+    assert len(got.internal_state.positions) == len(expected.internal_state.positions) == 3
+    for position, reference in zip(got.internal_state.positions, expected.internal_state.positions):
+        for name in ('price_lower', 'price_upper', 'token0_amount', 'token1_amount', 'liquidity'):
+            assert getattr(position, name) == pytest.approx(getattr(reference, name), rel=1e-12, abs=1e-12)
+    # both stay equal as the price moves on
+    for price in (2850.0, 3150.0):
+        move(expected, price)
+        move(got, price)
+        assert got.balance == pytest.approx(expected.balance, rel=1e-12)
@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+from Backtest_tools.backtest_service import BacktestService
+from Volatility_tau_reset.vol_tau_reset import VolTauResetParams, VolTauResetStrategy
+
+from tests.conftest import POOL
+
+PARAMS = dict(C=5000, ALPHA=0.5, INFO_TIME=97, INITIAL_BALANCE=1_000_000)
+
+
+def request(start_time='2024-01-01', **params):
+    return {'strategy': 'volatility', 'pool': POOL, 'params': dict(PARAMS, **params),
+            'data': {'ticker': 'ETHUSDT', 'pool_address': '0xpool', 'start_time': start_time, 'fidelity': 'hour'}}
+
+
+@pytest.fixture
+def gate():
+    return threading.Event()
+
+
+@pytest.fixture
+def loads():
+    return []
+
+
+@pytest.fixture
+def service(observations, gate, loads):
+    def loader(config):
+        # hold the first job until the duplicates are submitted
+        gate.wait(30)
+        loads.append(config.data)
+        return observations
+
+    service = BacktestService(max_workers=2, loader=loader)
+    yield service
+    service.shutdown()
+
+
+def test_identical_jobs_run_once_and_are_cached(service, observations, gate, loads):
+    job = service.submit(request())
+    # an identical active job, also with the dates written differently, is the same job
+    assert service.submit(request()) is job
+    assert service.submit(request(start_time='2024-01-01T00:00:00+00:00')) is job
+    other = service.submit(request(C=3000))
+    assert other is not job
+    gate.set()
+    assert job.done.wait(30) and other.done.wait(30)
+    assert job.status == 'done', job.error
+    strategy = VolTauResetStrategy(params=VolTauResetParams(**PARAMS), **POOL)
+    expected = strategy.run(observations).balances[-1]['UNISWAP_V3']
+    assert job.result['final_balance'] == pytest.approx(expected, rel=1e-12)
+
+    cached = service.submit(request())
+    assert cached.cached and cached.status == 'done' and cached.job_id != job.job_id
+    assert cached.result == job.result
+    # the data section was loaded once for both jobs
+    assert len(loads) == 1
+    assert service.status()['cached_results'] == 2
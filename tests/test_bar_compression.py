@@ -0,0 +1,54 @@
+import pytest
+
+from Backtest_tools.bar_compression import compress_observations
+from Classic_tau_reset.tau_strategy import TauResetParams, TauResetStrategy
+from Modified_entity.action_journal import ActionJournal
+from Volatility_tau_reset.vol_tau_reset import VolTauResetParams, VolTauResetStrategy
+
+from tests.conftest import POOL, make_observations
+
+
+@pytest.fixture
+def varying_liquidity():
+    # pool liquidity changing every 24 observations
+    observations = make_observations(2000, seed=5, liquidity_noise=0.5)
+    for i, observation in enumerate(observations):
+        observation.states['UNISWAP_V3'].liquidity = observations[i - i % 24].states['UNISWAP_V3'].liquidity
+    return observations
+
+
+def run(observations):
+    strategy = TauResetStrategy(params=TauResetParams(TAU=5, INITIAL_BALANCE=1_000_000), align_ticks=True, **POOL)
+    journal = ActionJournal.attach(strategy.get_entity('UNISWAP_V3'))
+    result = strategy.run(observations)
+    return result.balances[-1]['UNISWAP_V3'], [event['action'] for event in journal.events]
+
+
+def test_exact_fees_match_full_run(varying_liquidity):
+    bars = compress_observations(varying_liquidity, **POOL)
+    assert len(bars) < len(varying_liquidity)
+    assert sum(bar.states['UNISWAP_V3'].count for bar in bars) == len(varying_liquidity)
+    balance, rebalances = run(varying_liquidity)
+    compressed_balance, compressed_rebalances = run(bars)
+    assert compressed_rebalances == rebalances
+    assert compressed_balance == pytest.approx(balance, rel=1e-9)
+
+
+def test_lossy_compression_drifts(varying_liquidity):
+    bars = compress_observations(varying_liquidity, **POOL, exact_fees=False)
+    assert len(bars) < len(compress_observations(varying_liquidity, **POOL))
+    balance, rebalances = run(varying_liquidity)
+    lossy_balance, lossy_rebalances = run(bars)
+    assert lossy_rebalances == rebalances
+    assert lossy_balance != pytest.approx(balance, rel=1e-6)
+
+
+def test_windowed_strategy_is_not_preserved(varying_liquidity):
+    # INFO_TIME counts bars on compressed observations: the guarantee stops at window-free strategies
+    def run_volatility(observations):
+        strategy = VolTauResetStrategy(params=VolTauResetParams(C=5000, ALPHA=0.5, INFO_TIME=48,
+                                                                INITIAL_BALANCE=1_000_000), align_ticks=True, **POOL)
+        return strategy.run(observations).balances[-1]['UNISWAP_V3']
+
+    bars = compress_observations(varying_liquidity, **POOL)
+    assert run_volatility(bars) != pytest.approx(run_volatility(varying_liquidity), rel=1e-6)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from Backtest_tools.checkpoint import IncrementalRunner
+from Backtest_tools.registry import resolve_strategy
+
+from tests.conftest import POOL
+
+# INFO_TIME=97 leaves the checkpoint at observation 517 in the middle of a window
+GRID = {
+    'classic': dict(TAU=10),
+    'distributed': dict(TAU=20, BINS=3, INFO_TIME=97, U=1),
+    'volatility': dict(C=5000, ALPHA=0.5, INFO_TIME=97),
+    'merged': dict(C=5000, ALPHA=0.5, BINS=3, U=1, INFO_TIME=97),
+}
+
+
+@pytest.mark.parametrize('strategy', sorted(GRID))
+def test_resume_equals_full_run(observations, tmp_path, strategy):
+    strategy_type, params_type = resolve_strategy(strategy)
+    params = params_type(**GRID[strategy], INITIAL_BALANCE=1_000_000)
+    make = lambda: strategy_type(params=params, align_ticks=True, **POOL)
+    expected = np.array([balance['UNISWAP_V3'] for balance in make().run(observations).balances])
+
+    path = str(tmp_path / 'run.ckpt')
+    IncrementalRunner(make, path).run(observations[:517])
+    runner = IncrementalRunner(make, path)
+    history = runner.run(observations)
+    assert runner.resumed_from == 517
+    np.testing.assert_array_equal(history['balance'].to_numpy(), expected)
+
+
+def test_resume_rejects_changed_history(observations, tmp_path):
+    strategy_type, params_type = resolve_strategy('classic')
+    make = lambda: strategy_type(params=params_type(TAU=10, INITIAL_BALANCE=1_000_000), **POOL)
+    path = str(tmp_path / 'run.ckpt')
+    IncrementalRunner(make, path).run(observations[:517])
+    with pytest.raises(ValueError):
+        IncrementalRunner(make, path).run(observations[5:])
@@ -0,0 +1,53 @@
+import pytest
+
+from Backtest_tools.cli import config_from_dict, run_command, sweep_command
+from Backtest_tools.walk_forward import WalkForwardOptimizer, make_folds
+from Volatility_tau_reset.vol_tau_reset import VolTauResetStrategy
+
+from tests.conftest import POOL
+
+GRID = {'C': [3000, 5000], 'ALPHA': [0.5], 'INFO_TIME': [24], 'INITIAL_BALANCE': [1_000_000]}
+
+
+def class_defaults():
+    return {name: VolTauResetStrategy.__dict__.get(name)
+            for name in ('token0_decimals', 'token1_decimals', 'tick_spacing', 'feature_store')}
+
+
+@pytest.fixture
+def config():
+    return config_from_dict({'strategy': 'volatility', 'pool': POOL, 'grid': GRID,
+                             'params': {'C': 5000, 'ALPHA': 0.5, 'INFO_TIME': 24, 'INITIAL_BALANCE': 1_000_000}})
+
+
+def test_cli_leaves_the_strategy_class_alone(config, observations):
+    defaults = class_defaults()
+    report = sweep_command(config, observations)
+    assert len(report.drop(index='MARKET')) == 2
+    run_command(config, observations)
+    assert class_defaults() == defaults
+
+
+@pytest.mark.parametrize('metric', ['sharpe', 'missing'])
+def test_walk_forward_leaves_the_strategy_class_alone(observations, metric):
+    defaults = class_defaults()
+    optimizer = WalkForwardOptimizer('volatility', POOL, GRID, metric=metric, warmup=25, max_workers=1)
+    folds = make_folds(len(observations), 300, 100)
+    if metric == 'missing':
+        # a failing serial fold must not leave its feature store behind
+        with pytest.raises(KeyError):
+            optimizer.run(observations, folds)
+    else:
+        assert len(optimizer.run(observations, folds).folds) == len(folds)
+    assert class_defaults() == defaults
+
+
+@pytest.mark.parametrize('sweep', [{}, {'threads': 2}, {'planner': True}])
+def test_sweep_paths_keep_align_ticks(observations, sweep):
+    raw = {'strategy': 'classic', 'pool': dict(POOL, align_ticks=True), 'sweep': sweep,
+           'grid': {'TAU': [5], 'INITIAL_BALANCE': [1_000_000]}, 'params': {'TAU': 5, 'INITIAL_BALANCE': 1_000_000}}
+    expected = run_command(config_from_dict(raw), observations).balances[-1]['UNISWAP_V3']
+    unaligned = run_command(config_from_dict(dict(raw, pool=POOL)), observations).balances[-1]['UNISWAP_V3']
+    assert expected != pytest.approx(unaligned, rel=1e-9)
+    report = sweep_command(config_from_dict(raw), observations)
+    assert report.drop(index='MARKET')['final_balance'].iloc[0] == pytest.approx(expected, rel=1e-12)
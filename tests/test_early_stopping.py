@@ -0,0 +1,33 @@
+import pytest
+
+from fractal.core.launcher import Launcher
+
+from Backtest_tools.early_stopping import RunPruned, StopRules, with_early_stopping
+from Backtest_tools.registry import with_defaults
+from Classic_tau_reset.tau_strategy import TauResetParams, TauResetStrategy
+
+from tests.conftest import POOL
+
+# fires on the first step of every guarded run
+ALWAYS = StopRules(balance_floor=2.0)
+
+
+def launcher(observations, guarded):
+    strategy_type = with_early_stopping(with_defaults(TauResetStrategy, **POOL), ALWAYS, observations=guarded)
+    return Launcher(strategy_type, TauResetParams(TAU=10, INITIAL_BALANCE=1_000_000))
+
+
+def test_only_the_backtest_run_is_guarded(observations):
+    runner = launcher(observations, observations)
+    # the window runs of the pipeline's scenario stage are not pruned
+    results = runner.run_scenario(observations, window_size=12)
+    assert len(results) == len(range(0, len(observations) - 11, 24))
+    assert runner.last_created_instance.stop_guard is None
+    with pytest.raises(RunPruned) as pruned:
+        runner.run_strategy(observations)
+    assert pruned.value.reason == 'balance_floor' and pruned.value.t == 0
+
+
+def test_every_run_is_guarded_by_default(observations):
+    with pytest.raises(RunPruned):
+        launcher(observations, None).run_scenario(observations, window_size=12)
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from Backtest_tools.fee_growth import FeeGrowthIndex
+from Backtest_tools.observations import ObservationArrays
+from Modified_entity.tick_math import pool_tick
+
+from tests.conftest import POOL, make_observations
+
+
+@pytest.mark.parametrize('stride', [1, 7])
+def test_growth_inside_matches_brute_force(stride):
+    arrays = ObservationArrays.from_observations(make_observations(2000, seed=1, liquidity_noise=0.3))
+    ticks = pool_tick(arrays.price, POOL['token0_decimals'], POOL['token1_decimals'])
+    growth = arrays.fees / arrays.liquidity
+    index = FeeGrowthIndex(arrays, POOL['tick_spacing'], POOL['token0_decimals'], POOL['token1_decimals'], stride)
+    # differences of prefix sums: the rounding error scales with the total growth
+    tolerance = 3e-13 * growth.sum()
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        t0, t1 = sorted(rng.integers(0, len(arrays) + 1, 2))
+        tick_lower = int(rng.integers(ticks.min() - 600, ticks.max() + 600)) // 60 * 60
+        tick_upper = tick_lower + 60 * int(rng.integers(1, 40))
+        inside = (ticks[t0:t1] >= tick_lower) & (ticks[t0:t1] < tick_upper)
+        expected = growth[t0:t1][inside].sum()
+        assert index.growth_inside(t0, t1, tick_lower, tick_upper) == pytest.approx(expected, rel=3e-13, abs=tolerance)
+    assert index.growth_global(0, len(arrays)) == pytest.approx(growth.sum(), rel=3e-13)
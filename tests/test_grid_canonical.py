@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from Backtest_tools.grid_canonical import canonicalize
+from Backtest_tools.registry import expand_grid, resolve_strategy
+
+from tests.conftest import POOL
+
+# INFO_TIME of 600 and more never fills a window of the 600 observations
+GRIDS = {
+    'distributed': dict(TAU=[10], BINS=[1, 3], INFO_TIME=[47, 600, 5000], U=[0, 1], INITIAL_BALANCE=[1_000_000]),
+    'volatility': dict(C=[3000, 5000], ALPHA=[0, 1], INFO_TIME=[97, 600, 9000], INITIAL_BALANCE=[1_000_000]),
+    'merged': dict(C=[3000, 5000], ALPHA=[0, 1], BINS=[1, 3], INFO_TIME=[97, 600], U=[0, 1],
+                   INITIAL_BALANCE=[1_000_000]),
+}
+
+
+@pytest.mark.parametrize('strategy', sorted(GRIDS))
+def test_equivalent_points_have_identical_balances(observations, strategy):
+    strategy_type, params_type = resolve_strategy(strategy)
+    grid = expand_grid(GRIDS[strategy])
+    classes = canonicalize(strategy_type, grid, len(observations))
+    assert len(classes) < len(grid)
+    for equivalence in classes:
+        if len(equivalence.members) == 1:
+            continue
+        runs = [strategy_type(params=params_type(**params), **POOL).run(observations) for params in equivalence.members]
+        expected = np.array([balance['UNISWAP_V3'] for balance in runs[0].balances])
+        for result in runs[1:]:
+            np.testing.assert_array_equal([balance['UNISWAP_V3'] for balance in result.balances], expected)
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, UTC
+
+import pytest
+
+from fractal.core.base import Observation
+
+from Classic_tau_reset.tau_strategy import TauResetParams, TauResetStrategy
+from Modified_entity.action_journal import ACTIONS, ActionJournal
+from Modified_entity.compact_states import CompactBarState
+from Modified_entity.uniswap_v3_lp_modified import bar_time_in_range
+
+from tests.conftest import POOL
+
+
+@pytest.mark.parametrize('bar, expected', [
+    # rising: open -> low -> high -> close, 5 + 30 + 5 of 60 inside
+    ((100.0, 130.0, 90.0, 120.0), 40 / 60),
+    # falling: open -> high -> low -> close, 15 + 30 + 5 of 70 inside
+    ((110.0, 130.0, 90.0, 100.0), 50 / 70),
+    # flat inside the range
+    ((100.0, 100.0, 100.0, 100.0), 1.0),
+    # fully above the range
+    ((130.0, 140.0, 128.0, 135.0), 0.0),
+])
+def test_bar_time_in_range(bar, expected):
+    assert bar_time_in_range(*bar, price_lower=95.0, price_upper=125.0) == pytest.approx(expected, rel=1e-12)
+
+
+def test_flat_bar_on_a_bound_is_out_of_range():
+    assert bar_time_in_range(95.0, 95.0, 95.0, 95.0, price_lower=95.0, price_upper=125.0) == 0.0
+
+
+@pytest.mark.parametrize('intrabar', [False, True])
+def test_intrabar_exit_on_the_low(intrabar):
+    # TAU=10 opens [~2825, ~3185] at 3000; the third bar dips to 2700 and closes in range at 3000
+    t0 = datetime(2024, 1, 1, tzinfo=UTC)
+    bars = [(3000.0, 3000.0, 3000.0), (3000.0, 3000.0, 3000.0), (3000.0, 2700.0, 3050.0)]
+    observations = [
+        Observation(timestamp=t0 + timedelta(hours=i), states={'UNISWAP_V3': CompactBarState(
+            tvl=1e8, volume=1e6, fees=1000.0, liquidity=1e18, price=close, price_min=low, price_max=high,
+            count=1, price_open=3000.0)})
+        for i, (close, low, high) in enumerate(bars)
+    ]
+    strategy = TauResetStrategy(params=TauResetParams(TAU=10, INITIAL_BALANCE=1_000_000), intrabar=intrabar, **POOL)
+    journal = ActionJournal.attach(strategy.get_entity('UNISWAP_V3'))
+    strategy.run(observations)
+    closes = journal.events[journal.events['action'] == ACTIONS.index('close_position')]
+    assert closes['t'].tolist() == ([2] if intrabar else [])
@@ -0,0 +1,69 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+from fractal.core.base import Observation
+from fractal.core.base.observations import ObservationsStorage
+
+from Backtest_tools.bar_compression import compress_observations
+from Backtest_tools.live_runtime import LiveRuntime, decode_observation, encode_observation
+from Backtest_tools.pyramid import ObservationPyramid
+from Classic_tau_reset.tau_strategy import TauResetParams, TauResetStrategy
+from Modified_entity.compact_states import CompactBarState, CompactGlobalState
+
+from tests.conftest import POOL
+
+
+def roundtrip(observations):
+    return [decode_observation(encode_observation(observation)) for observation in observations]
+
+
+def test_plain_states_roundtrip(observations):
+    decoded = roundtrip(observations[:50])
+    assert all(type(observation.states['UNISWAP_V3']) is CompactGlobalState for observation in decoded)
+    assert [o.states['UNISWAP_V3'].price for o in decoded] == [o.states['UNISWAP_V3'].price for o in observations[:50]]
+
+
+def test_bar_states_roundtrip(observations):
+    frame = pd.DataFrame([dict(vars(o.states['UNISWAP_V3'])) for o in observations],
+                         index=pd.DatetimeIndex([o.timestamp for o in observations]))
+    bars = ObservationPyramid.from_frame(frame, fidelities=('1d',)).observations('1d')
+    bars += compress_observations(observations, **POOL)
+    decoded = roundtrip(bars)
+    for bar, observation in zip(bars, decoded):
+        state = observation.states['UNISWAP_V3']
+        assert type(state) is CompactBarState
+        assert vars(state) == vars(bar.states['UNISWAP_V3'])
+        assert observation.timestamp == bar.timestamp
+
+
+class ListStorage(ObservationsStorage):
+    def __init__(self):
+        self.observations = []
+
+    def write(self, observation):
+        self.observations.append(observation)
+
+    def read(self, start_time=None, end_time=None):
+        return self.observations
+
+
+def test_runtime_stores_and_validates_observations(observations):
+    storage = ListStorage()
+    strategy = TauResetStrategy(params=TauResetParams(TAU=10, INITIAL_BALANCE=1_000_000),
+                                observations_storage=storage, **POOL)
+    report = asyncio.run(LiveRuntime(strategy).run(feed(observations[:100])))
+    assert storage.observations == observations[:100]
+    expected = TauResetStrategy(params=TauResetParams(TAU=10, INITIAL_BALANCE=1_000_000), **POOL).run(observations[:100])
+    assert report.ticks[-1].balance == expected.balances[-1]['UNISWAP_V3']
+    unknown = Observation(timestamp=observations[100].timestamp,
+                          states={'BINANCE': observations[100].states['UNISWAP_V3']})
+    with pytest.raises(ValueError):
+        asyncio.run(LiveRuntime(strategy).on_observation(unknown))
+    assert len(storage.observations) == 100
+
+
+async def feed(observations):
+    for observation in observations:
+        yield observation
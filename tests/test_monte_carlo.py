@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from Backtest_tools.monte_carlo import MonteCarloEngine, MonteCarloPaths, TauResetRule
+from Backtest_tools.observations import ObservationArrays
+from Backtest_tools.registry import resolve_strategy
+
+from tests.conftest import POOL
+
+GRID = {
+    'classic': dict(TAU=5),
+    'distributed': dict(TAU=10, BINS=4, INFO_TIME=24, U=0),
+    'volatility': dict(C=5000, ALPHA=0.5, INFO_TIME=48),
+    'merged': dict(C=5000, ALPHA=0.5, BINS=3, U=1, INFO_TIME=48),
+}
+
+
+@pytest.mark.parametrize('align_ticks', [False, True])
+@pytest.mark.parametrize('strategy', sorted(GRID))
+def test_historical_path_matches_backtest(observations, strategy, align_ticks):
+    strategy_type, params_type = resolve_strategy(strategy)
+    params = dict(GRID[strategy], INITIAL_BALANCE=1_000_000)
+    result = strategy_type(params=params_type(**params), align_ticks=align_ticks, **POOL).run(observations)
+    expected = np.array([balance['UNISWAP_V3'] for balance in result.balances])
+    engine = MonteCarloEngine(MonteCarloPaths.historical(ObservationArrays.from_observations(observations)),
+                              POOL['token0_decimals'], POOL['token1_decimals'], POOL['tick_spacing'],
+                              align_ticks=align_ticks)
+    np.testing.assert_allclose(engine.simulate(TauResetRule.from_params(strategy, params))[0], expected, rtol=1e-12)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from Backtest_tools.feature_store import FeatureStore
+from Backtest_tools.multi_runner import MultiStrategyRunner, StrategySpec, ThreadedStrategyRunner
+from Classic_tau_reset.tau_strategy import TauResetParams, TauResetStrategy
+from Distributed_tau_reset.dist_tau_reset import DistTauResetParams, DistTauResetStrategy
+from Volatility_tau_reset.vol_tau_reset import VolTauResetParams, VolTauResetStrategy
+from Combined_tau_reset.merged_tau_reset import MergedTauResetParams, MergedTauResetStrategy
+
+from tests.conftest import POOL
+
+SPECS = [
+    StrategySpec('classic', TauResetStrategy, TauResetParams(TAU=10, INITIAL_BALANCE=1_000_000)),
+    StrategySpec('distributed', DistTauResetStrategy,
+                 DistTauResetParams(TAU=10, BINS=3, INFO_TIME=48, U=1, INITIAL_BALANCE=1_000_000)),
+    StrategySpec('volatility', VolTauResetStrategy,
+                 VolTauResetParams(C=5000, ALPHA=0.5, INFO_TIME=48, INITIAL_BALANCE=1_000_000)),
+    StrategySpec('merged', MergedTauResetStrategy,
+                 MergedTauResetParams(C=5000, ALPHA=0.5, BINS=3, U=1, INFO_TIME=24, INITIAL_BALANCE=1_000_000)),
+]
+
+
+@pytest.mark.parametrize('runner_type', [MultiStrategyRunner, ThreadedStrategyRunner])
+def test_instances_share_the_feature_store(observations, runner_type):
+    runner = runner_type(SPECS, **POOL)
+    report = runner.run(observations)
+    assert isinstance(runner.feature_store, FeatureStore)
+    assert runner.features is runner.feature_store.arrays
+    for name in ('distributed', 'volatility', 'merged'):
+        assert runner.strategies[name].feature_store is runner.feature_store
+    assert runner.feature_store.index_of(observations[-1].states['UNISWAP_V3']) == len(observations) - 1
+    # the windows were read from the store, precomputed once for all the instances
+    assert set(runner.feature_store._stats) == {(48, 1), (24, 1)}
+    for spec in SPECS:
+        alone = spec.strategy_type(params=spec.params, **POOL)
+        expected = alone.run(observations).balances[-1]['UNISWAP_V3']
+        assert report.loc[spec.name, 'final_balance'] == pytest.approx(expected, rel=1e-9)
+
+
+def test_given_feature_store_is_used(observations):
+    feature_store = FeatureStore(observations)
+    runner = MultiStrategyRunner(SPECS, **POOL, feature_store=feature_store)
+    runner.run(observations)
+    assert runner.feature_store is feature_store
+    assert runner.strategies['volatility'].feature_store is feature_store
+    assert np.isfinite(runner.features.log_returns[1:]).all()
@@ -0,0 +1,37 @@
+from datetime import datetime, UTC
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Backtest_tools.pyramid import COLUMNS, ObservationPyramid
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(4)
+    n = 3 * 24 * 60
+    index = pd.date_range(datetime(2024, 1, 1, tzinfo=UTC), periods=n, freq='1min')
+    return pd.DataFrame({
+        'price': 3000 * np.exp(np.cumsum(rng.normal(0, 0.0005, n))),
+        'fees': rng.uniform(5, 25, n), 'volume': rng.uniform(1e4, 2e4, n),
+        'liquidity': 1e18 * np.exp(rng.normal(0, 0.1, n)), 'tvl': rng.uniform(9e7, 1e8, n),
+    }, index=index)
+
+
+def test_save_load_round_trip(frame, tmp_path):
+    pyramid = ObservationPyramid.from_frame(frame, ['1m', '1h', '1d'])
+    path = str(tmp_path / 'pool.npz')
+    pyramid.save(path)
+    loaded = ObservationPyramid.load(path)
+    assert list(loaded.levels) == ['1m', '1h', '1d'] and loaded.tz == 'UTC'
+    for fidelity, level in pyramid.levels.items():
+        for name in ('timestamps',) + COLUMNS:
+            np.testing.assert_array_equal(getattr(loaded.levels[fidelity], name), getattr(level, name))
+    hourly = loaded.observations('hour', datetime(2024, 1, 2, tzinfo=UTC), datetime(2024, 1, 2, 23, tzinfo=UTC))
+    assert len(hourly) == 24 and hourly[0].timestamp == pd.Timestamp('2024-01-02', tz='UTC')
+    state = hourly[0].states['UNISWAP_V3']
+    bar = frame.loc['2024-01-02 00:00':'2024-01-02 00:59']
+    assert state.count == 60 and state.price == bar['price'].iloc[-1] and state.price_open == bar['price'].iloc[0]
+    assert (state.price_min, state.price_max) == (bar['price'].min(), bar['price'].max())
+    assert state.fees == pytest.approx(bar['fees'].sum(), rel=1e-12)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from Backtest_tools.range_index import RangeExitIndex, run_with_skips
+from Backtest_tools.registry import resolve_strategy
+
+from tests.conftest import POOL
+
+GRID = {
+    'classic': dict(TAU=10),
+    'distributed': dict(TAU=10, BINS=3, INFO_TIME=48, U=1),
+    'volatility': dict(C=5000, ALPHA=0.5, INFO_TIME=48),
+    'merged': dict(C=5000, ALPHA=0.5, BINS=3, U=1, INFO_TIME=24),
+}
+
+
+def test_first_exit():
+    prices = np.array([10.0, 10.5, 9.8, 10.2, 11.5, 10.0, 8.0])
+    index = RangeExitIndex(prices)
+    assert index.first_exit(0, 9.5, 11.0) == 4
+    assert index.first_exit(4, 9.5, 12.0) == 6
+    assert index.first_exit(0, 7.0, 12.0) == len(prices)
+
+
+@pytest.mark.parametrize('align_ticks', [False, True])
+@pytest.mark.parametrize('strategy', sorted(GRID))
+def test_skips_match_full_run(observations, strategy, align_ticks):
+    strategy_type, params_type = resolve_strategy(strategy)
+    params = params_type(**GRID[strategy], INITIAL_BALANCE=1_000_000)
+    result = strategy_type(params=params, align_ticks=align_ticks, **POOL).run(observations)
+    expected = np.array([balance['UNISWAP_V3'] for balance in result.balances])
+    skipped = run_with_skips(strategy_type(params=params, align_ticks=align_ticks, **POOL), observations)
+    np.testing.assert_allclose(skipped.balances, expected, rtol=1e-12)
+    if strategy == 'classic':
+        assert skipped.steps < len(observations) // 2
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from Backtest_tools.registry import resolve_strategy
+from Backtest_tools.repricing import CostSettings, RepricingEngine
+from Modified_entity.action_journal import ActionJournal
+
+from tests.conftest import POOL
+
+GRID = {
+    'classic': dict(TAU=10),
+    'distributed': dict(TAU=20, BINS=3, INFO_TIME=97, U=1),
+    'volatility': dict(C=5000, ALPHA=0.5, INFO_TIME=97),
+    'merged': dict(C=5000, ALPHA=0.5, BINS=3, U=1, INFO_TIME=97),
+}
+
+
+def run(strategy, observations, align_ticks, trading_fee=None):
+    strategy_type, params_type = resolve_strategy(strategy)
+    instance = strategy_type(params=params_type(**GRID[strategy], INITIAL_BALANCE=1_000_000),
+                             align_ticks=align_ticks, **POOL)
+    entity = instance.get_entity('UNISWAP_V3')
+    if trading_fee is not None:
+        entity.trading_fee = trading_fee
+    journal = ActionJournal.attach(entity)
+    result = instance.run(observations)
+    return np.array([balance['UNISWAP_V3'] for balance in result.balances]), journal
+
+
+@pytest.mark.parametrize('align_ticks', [False, True])
+@pytest.mark.parametrize('strategy', sorted(GRID))
+def test_recorded_settings_reproduce_the_run(observations, tmp_path, strategy, align_ticks):
+    expected, journal = run(strategy, observations, align_ticks)
+    journal.save(str(tmp_path / 'journal.npz'))
+    engine = RepricingEngine.from_observations(ActionJournal.load(str(tmp_path / 'journal.npz')), observations)
+    balances = engine.reprice([CostSettings(), CostSettings(trading_fee=0.001)])
+    # the same operations in a different order: a few ulps
+    np.testing.assert_allclose(balances[0], expected, rtol=2e-15)
+    cheaper, _ = run(strategy, observations, align_ticks, trading_fee=0.001)
+    np.testing.assert_allclose(balances[1], cheaper, rtol=1e-12)
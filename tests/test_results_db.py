@@ -0,0 +1,49 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Backtest_tools.results_db import ResultsDB
+
+
+def sharpe(tau: int, bins: int) -> float:
+    return tau / 10 - bins / 4
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ResultsDB(str(tmp_path / 'results.db'))
+    runs = [{'params': {'TAU': tau, 'BINS': bins}, 'metrics': {'sharpe': sharpe(tau, bins), 'final_balance': 1e6 + tau}}
+            for tau, bins in itertools.product([10, 20, 30], [1, 2, 4])]
+    assert db.record_many('sweep', 'distributed', runs) == 9
+    # another sweep and a re-recorded run (replaced, not duplicated)
+    db.record('other', 'distributed', {'TAU': 99, 'BINS': 1}, {'sharpe': 100.0})
+    db.record('sweep', 'distributed', {'TAU': 30, 'BINS': 1}, {'sharpe': sharpe(30, 1), 'final_balance': 1e6 + 30})
+    return db
+
+
+def test_top_k(db):
+    top = db.top_k('sharpe', k=2, sweep_id='sweep')
+    assert top[['TAU', 'BINS']].values.tolist() == [[30, 1], [30, 2]]
+    assert top['sharpe'].tolist() == [sharpe(30, 1), sharpe(30, 2)]
+    assert db.top_k('sharpe', k=1, sweep_id='sweep', where={'BINS': 4})['TAU'].tolist() == [30]
+    assert db.top_k('sharpe', k=1)['TAU'].tolist() == [99]
+
+
+def test_marginals(db):
+    marginals = db.marginals('BINS', 'sharpe', sweep_id='sweep').set_index('BINS')
+    assert marginals.index.tolist() == [1, 2, 4]
+    for bins in (1, 2, 4):
+        values = [sharpe(tau, bins) for tau in (10, 20, 30)]
+        assert marginals.loc[bins, 'sharpe_mean'] == pytest.approx(np.mean(values))
+        assert marginals.loc[bins, 'sharpe_max'] == pytest.approx(max(values))
+        assert marginals.loc[bins, 'sharpe_count'] == 3
+    assert db.sweeps().set_index('sweep_id')['runs'].to_dict() == {'other': 1, 'sweep': 9}
+
+
+def test_heatmap(db):
+    heatmap = db.heatmap('TAU', 'BINS', 'sharpe', sweep_id='sweep')
+    expected = pd.DataFrame([[sharpe(tau, bins) for tau in (10, 20, 30)] for bins in (1, 2, 4)],
+                            index=[1, 2, 4], columns=[10, 20, 30])
+    np.testing.assert_allclose(heatmap.loc[[1, 2, 4], [10, 20, 30]].to_numpy(), expected.to_numpy())
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Backtest_tools.registry import resolve_strategy
+from Backtest_tools.swap_replay import SwapEvents, SwapReplayEngine
+from Modified_entity.action_journal import ActionJournal
+from Modified_entity.uniswap_v3_lp_modified import UniswapV3LPConfig, UniswapV3LPEntity, UniswapV3LPGlobalState
+from tests.conftest import POOL
+
+WINDOWED = [
+    ('distributed', dict(TAU=20, BINS=3, INFO_TIME=48, U=1, INITIAL_BALANCE=1e6)),
+    ('volatility', dict(C=5000, ALPHA=0.5, INFO_TIME=48, INITIAL_BALANCE=1e6)),
+    ('merged', dict(C=5000, ALPHA=0.5, BINS=3, U=1, INFO_TIME=48, INITIAL_BALANCE=1e6)),
+]
+
+
+def linear_swaps(observations, k: int = 10) -> SwapEvents:
+    # k swaps per bar walking the price from the previous close to the close, paying the bar fees
+    timestamps, price_before, price_after, fee = [], [], [], []
+    for previous, current in zip(observations[:-1], observations[1:]):
+        path = np.linspace(previous.states['UNISWAP_V3'].price, current.states['UNISWAP_V3'].price, k + 1)
+        timestamps.extend(pd.date_range(previous.timestamp, current.timestamp, periods=k + 1)[1:])
+        price_before.extend(path[:-1])
+        price_after.extend(path[1:])
+        fee.extend([current.states['UNISWAP_V3'].fees / k] * k)
+    return SwapEvents.from_dataframe(pd.DataFrame(
+        {'price_before': price_before, 'price_after': price_after, 'amount': 0.0, 'fee': fee},
+        index=pd.DatetimeIndex(timestamps)))
+
+
+@pytest.mark.parametrize('name, params', WINDOWED)
+def test_windowed_strategies_replay_swaps(observations, name, params):
+    strategy_type, params_type = resolve_strategy(name)
+    reference = strategy_type(params=params_type(**params), **POOL)
+    reference_journal = ActionJournal.attach(reference.get_entity('UNISWAP_V3'))
+    reference.run(observations)
+
+    strategy = strategy_type(params=params_type(**params), **POOL)
+    entity = strategy.get_entity('UNISWAP_V3')
+    journal = ActionJournal.attach(entity)
+    result = SwapReplayEngine(entity).run_strategy(strategy, observations, linear_swaps(observations))
+
+    assert len(result.balances) == len(observations)
+    assert entity.history.count == len(observations)
+    assert journal.t == len(observations) - 1
+    # the decisions only depend on prices, the fees come from the swaps
+    assert np.array_equal(journal.events['t'], reference_journal.events['t'])
+    assert np.array_equal(journal.events['action'], reference_journal.events['action'])
+
+
+@pytest.fixture
+def ladder():
+    # 3 bins [2800, 2900], [2900, 3000], [3000, 3100] opened at 2950, without tick snapping
+    entity = UniswapV3LPEntity(UniswapV3LPConfig(token0_decimals=POOL['token0_decimals'],
+                                                 token1_decimals=POOL['token1_decimals']))
+    entity.update_state(UniswapV3LPGlobalState(price=2950.0, tvl=1e8, volume=1e6, fees=0.0, liquidity=1e18))
+    entity.action_deposit(1_000_000)
+    entity.action_rebalance(np.array([2800.0, 2900.0, 3000.0]), np.array([2900.0, 3000.0, 3100.0]), np.ones(3))
+    return entity
+
+
+def swap(price_before: float, price_after: float, fee: float = 100.0) -> SwapEvents:
+    return SwapEvents.from_dataframe(pd.DataFrame(
+        {'price_before': [price_before], 'price_after': [price_after], 'amount': 0.0, 'fee': [fee]},
+        index=pd.DatetimeIndex(['2024-01-01'])))
+
+
+def shares(entity) -> np.ndarray:
+    delta = np.array([entity.get_position_liquidity_delta(position) for position in entity.internal_state.positions])
+    return delta / (entity.global_state.liquidity + delta)
+
+
+def accrue(entity, events: SwapEvents):
+    cash = entity.internal_state.cash
+    total = SwapReplayEngine(entity).accrue(events)
+    assert entity.internal_state.cash - cash == pytest.approx(total, rel=1e-12)
+    return total, np.array([position.fees for position in entity.internal_state.positions])
+
+
+def test_accrue_credits_the_crossed_bins_by_overlap(ladder):
+    expected_shares = shares(ladder)
+    total, fees = accrue(ladder, swap(2950.0, 3050.0))
+    path = np.sqrt(3050.0) - np.sqrt(2950.0)
+    overlap = np.array([0.0, np.sqrt(3000.0) - np.sqrt(2950.0), np.sqrt(3050.0) - np.sqrt(3000.0)])
+    np.testing.assert_allclose(fees, 100.0 * overlap / path * expected_shares, rtol=1e-12)
+    assert fees[0] == 0.0
+    assert total == pytest.approx(fees.sum(), rel=1e-12)
+
+
+def test_accrue_outside_the_ladder_credits_nothing(ladder):
+    total, fees = accrue(ladder, swap(3200.0, 3300.0))
+    assert total == 0.0 and not fees.any()
+
+
+def test_accrue_zero_move_credits_its_bin(ladder):
+    expected_shares = shares(ladder)
+    _, fees = accrue(ladder, swap(2950.0, 2950.0))
+    np.testing.assert_allclose(fees, [0.0, 100.0 * expected_shares[1], 0.0], rtol=1e-12)
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from Backtest_tools.registry import resolve_strategy
+from Backtest_tools.sweep_planner import SweepPlanner
+
+from tests.conftest import POOL
+
+GRID = {
+    'classic': [dict(TAU=5), dict(TAU=20)],
+    'distributed': [dict(TAU=10, BINS=3, INFO_TIME=48, U=1), dict(TAU=10, BINS=5, INFO_TIME=24, U=0)],
+    'volatility': [dict(C=5000, ALPHA=0.5, INFO_TIME=48), dict(C=3000, ALPHA=1, INFO_TIME=24)],
+    'merged': [dict(C=5000, ALPHA=0.5, BINS=3, U=1, INFO_TIME=24), dict(C=3000, ALPHA=0, BINS=5, U=0, INFO_TIME=48)],
+}
+
+
+@pytest.mark.parametrize('align_ticks', [False, True])
+@pytest.mark.parametrize('strategy', sorted(GRID))
+def test_planner_matches_step_by_step_run(observations, strategy, align_ticks):
+    strategy_type, params_type = resolve_strategy(strategy)
+    grid = [dict(params, INITIAL_BALANCE=1_000_000) for params in GRID[strategy]]
+    planner = SweepPlanner(strategy, observations, dict(POOL, align_ticks=align_ticks))
+    for params in grid:
+        result = strategy_type(params=params_type(**params), align_ticks=align_ticks, **POOL).run(observations)
+        expected = np.array([balance['UNISWAP_V3'] for balance in result.balances])
+        np.testing.assert_allclose(planner.evaluate(params), expected, rtol=1e-12)
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from Modified_entity.tick_math import (Q96, get_sqrt_ratio_at_tick, get_tick_at_sqrt_ratio, pool_sqrt_price,
+                                       pool_tick, snap_range)
+from Modified_entity.uniswap_v3_lp_modified import UniswapV3LPConfig, UniswapV3LPEntity, UniswapV3LPGlobalState
+
+from tests.conftest import POOL
+
+DECIMALS = POOL['token0_decimals'], POOL['token1_decimals']
+
+
+@pytest.mark.parametrize('price', [0.5, 1850.25, 3000.0, 64_000.0])
+def test_pool_tick_matches_chain(price):
+    # raw token1/token0 price of the pool for an entity price (token0 per token1)
+    sqrt_price_x96 = int(np.sqrt(10.0 ** (DECIMALS[1] - DECIMALS[0]) / price) * Q96)
+    assert pool_tick(price, *DECIMALS) == get_tick_at_sqrt_ratio(sqrt_price_x96)
+
+
+def test_usdc_weth_tick():
+    # USDC (6) / WETH (18) pool at 3000 USDC per WETH
+    assert pool_tick(3000.0, *DECIMALS) == 196256
+
+
+def test_snap_range_covers_on_pool_axis():
+    rng = np.random.default_rng(0)
+    price_lower = rng.uniform(100, 5000, 200)
+    price_upper = price_lower * rng.uniform(1.001, 1.5, 200)
+    tick_lower, tick_upper = snap_range(price_lower, price_upper, 60, *DECIMALS)
+    assert np.all(tick_lower % 60 == 0) and np.all(tick_upper % 60 == 0)
+    assert np.all(tick_lower <= pool_tick(price_upper, *DECIMALS))
+    sqrt_lower = pool_sqrt_price(np.sqrt(1.0001 ** tick_upper), *DECIMALS)
+    sqrt_upper = pool_sqrt_price(np.sqrt(1.0001 ** tick_lower), *DECIMALS)
+    assert np.all(sqrt_lower**2 <= price_lower * (1 + 1e-12))
+    assert np.all(sqrt_upper**2 >= price_upper * (1 - 1e-12))
+
+
+@pytest.mark.parametrize('exact', [False, True])
+def test_entity_bounds_on_chain_ticks(exact):
+    entity = UniswapV3LPEntity(UniswapV3LPConfig(**POOL, exact_sqrt_prices=exact))
+    entity.update_state(UniswapV3LPGlobalState(price=3000.0, tvl=1e8, volume=1e6, fees=1000.0, liquidity=1e18))
+    entity.action_deposit(1_000_000)
+    entity.action_open_position(1_000_000, 2900.0, 3100.0)
+    position = entity.internal_state.positions[0]
+    assert position.tick_lower <= pool_tick(3000.0, *DECIMALS) < position.tick_upper
+    # outwards on the pool axis: the upper price rounds the lower tick down, the lower price the upper tick up
+    assert position.tick_lower == pool_tick(3100.0, *DECIMALS) // 60 * 60
+    assert position.tick_upper == -(-(pool_tick(2900.0, *DECIMALS) + 1) // 60) * 60
+    if exact:
+        expected = [pool_sqrt_price(get_sqrt_ratio_at_tick(tick) / Q96, *DECIMALS)
+                    for tick in (position.tick_upper, position.tick_lower)]
+        assert entity.tick_sqrt_prices(position.tick_lower, position.tick_upper) == tuple(expected)
+    assert position.price_lower == pytest.approx(2900.0, rel=0.006)
+    assert position.price_upper == pytest.approx(3100.0, rel=0.006)
@@ -0,0 +1,47 @@
+import pytest
+
+from Backtest_tools import work_queue
+from Backtest_tools.work_queue import SQLiteWorkQueue
+
+PAYLOADS = [{'strategy': 'classic', 'data': {}, 'pool': {}, 'params': {'TAU': tau, 'INITIAL_BALANCE': 1_000_000}}
+            for tau in (5, 10, 20)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(work_queue.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = SQLiteWorkQueue(str(tmp_path / 'queue.db'), lease_seconds=60)
+    assert queue.submit('sweep', PAYLOADS) == 3
+    # resubmitting the grid adds nothing
+    assert queue.submit('sweep', PAYLOADS) == 0
+    return queue
+
+
+def test_expired_lease_is_handed_out_again(queue, clock):
+    [crashed] = queue.lease('a')
+    clock[0] += 30
+    assert queue.heartbeat(crashed, 'a')
+    clock[0] += 61
+    assert queue.progress('sweep') == {'expired': 1, 'pending': 2}
+    [retried] = queue.lease('b')
+    assert retried.task_id == crashed.task_id and retried.attempts == 2
+    # the first worker lost its lease
+    assert not queue.heartbeat(crashed, 'a')
+    assert [task.payload['params']['TAU'] for task in queue.lease('c', n=5)] == [10, 20]
+
+
+def test_first_write_wins(queue, clock):
+    [crashed] = queue.lease('a')
+    clock[0] += 61
+    [retried] = queue.lease('b')
+    assert queue.complete(retried, 'b', {'final_balance': 1.5e6})
+    # the late result of the expired lease is dropped
+    assert not queue.complete(crashed, 'a', {'final_balance': -1.0})
+    assert queue.results('sweep') == [{'TAU': 5, 'INITIAL_BALANCE': 1_000_000, 'final_balance': 1.5e6, 'worker_id': 'b'}]
+    assert queue.progress('sweep') == {'done': 1, 'pending': 2}